@@ -70,35 +70,49 @@ const cachedGet = async (url, params = {}) => {
   }
 };
 
+// Where each dashboard collection comes from when /dashboard/ cannot provide it
+const DASHBOARD_COLLECTIONS = {
+  topics: '/topics/',
+  peers: '/peers/',
+  requests: '/peers/requests/',
+  shared: '/shared-topics/'
+};
+
 // API service methods
 export const apiService = {
   // Fetch all dashboard data with intelligent caching
   fetchDashboardData: async () => {
+    console.log('Fetching dashboard data...');
+    
+    // Single round trip: the backend returns every collection at once
+    let data = {};
+    const errors = [];
     try {
-      console.log('Fetching dashboard data...');
-      
-      // Use Promise.allSettled to prevent one failed request from blocking others
-      const results = await Promise.allSettled([
-        cachedGet('/topics/'),
-        cachedGet('/peers/'),
-        cachedGet('/peers/requests/'),
-        cachedGet('/shared-topics/')
-      ]);
-      
-      // Process results
-      const [topicsResult, peersResult, requestsResult, sharedResult] = results;
-      
-      return {
-        topics: topicsResult.status === 'fulfilled' ? topicsResult.value : [],
-        peers: peersResult.status === 'fulfilled' ? peersResult.value : [],
-        requests: requestsResult.status === 'fulfilled' ? requestsResult.value : [],
-        shared: sharedResult.status === 'fulfilled' ? sharedResult.value : [],
-        errors: results.filter(r => r.status === 'rejected').map(r => r.reason)
-      };
+      data = await cachedGet('/dashboard/');
     } catch (error) {
-      console.error('Error in fetchDashboardData:', error);
-      throw error;
+      console.error('Error in fetchDashboardData, loading collections separately:', error);
+      errors.push(error);
     }
+    
+    // Any collection the dashboard did not return is fetched on its own, with
+    // Promise.allSettled so one failed request does not block the others
+    const missing = Object.keys(DASHBOARD_COLLECTIONS).filter(name => !Array.isArray(data[name]));
+    const results = await Promise.allSettled(missing.map(name => cachedGet(DASHBOARD_COLLECTIONS[name])));
+    const collections = {};
+    missing.forEach((name, index) => {
+      collections[name] = results[index].status === 'fulfilled' ? results[index].value : [];
+    });
+    const failed = results.filter(r => r.status === 'rejected').map(r => r.reason);
+    
+    return {
+      topics: data.topics,
+      peers: data.peers,
+      requests: data.requests,
+      shared: data.shared,
+      ...collections,
+      // Only report the dashboard failure if the fallback did not recover from it
+      errors: failed.length ? [...errors, ...failed] : []
+    };
   },
   
   // Individual cached endpoints
@@ -113,6 +127,7 @@ export const apiService = {
     const response = await api.post('/topics/', data);
     // Invalidate topics cache
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -120,6 +135,7 @@ export const apiService = {
     const response = await api.put(`/topics/${id}/`, data);
     // Invalidate topics cache
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -127,6 +143,7 @@ export const apiService = {
     const response = await api.delete(`/topics/${id}/`);
     // Invalidate topics cache
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -134,6 +151,7 @@ export const apiService = {
     const response = await api.post('/cards/', data);
     // Invalidate topics cache since cards are included
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -141,6 +159,7 @@ export const apiService = {
     const response = await api.put(`/cards/${id}/`, data);
     // Invalidate topics cache
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -148,6 +167,7 @@ export const apiService = {
     const response = await api.delete(`/cards/${id}/`);
     // Invalidate topics cache
     cache.delete(createCacheKey('/topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -156,6 +176,7 @@ export const apiService = {
     // Invalidate peer-related caches
     cache.delete(createCacheKey('/peers/'));
     cache.delete(createCacheKey('/peers/requests/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -164,6 +185,7 @@ export const apiService = {
     // Invalidate peer-related caches
     cache.delete(createCacheKey('/peers/'));
     cache.delete(createCacheKey('/peers/requests/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -171,6 +193,7 @@ export const apiService = {
     const response = await api.post(`/peers/${id}/reject/`);
     // Invalidate peer requests cache
     cache.delete(createCacheKey('/peers/requests/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -180,6 +203,7 @@ export const apiService = {
     cache.delete(createCacheKey('/peers/'));
     cache.delete(createCacheKey('/peers/requests/'));
     cache.delete(createCacheKey('/shared-topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -187,6 +211,7 @@ export const apiService = {
     const response = await api.post(`/topics/${topicId}/share/`, data);
     // Invalidate shared topics cache
     cache.delete(createCacheKey('/shared-topics/'));
+    cache.delete(createCacheKey('/dashboard/'));
     return response.data;
   },
   
@@ -0,0 +1,170 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter, deque
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import TopicShare, ShareAccess, ShareAccessDaily
+
+logger = logging.getLogger(__name__)
+
+
+class AccessLogBuffer:
+    """
+    In-memory buffer of shared-topic access events, written with bulk_create.
+
+    Recording an event never touches the database. The buffer is flushed from a
+    background thread once it holds ACCESS_LOG_BATCH_SIZE events or its oldest
+    event is ACCESS_LOG_FLUSH_INTERVAL seconds old, and once more at exit. A
+    timer started with the first buffered event flushes it on time even if no
+    further request arrives.
+
+    The buffer lives in the worker process and nothing else drains it.
+    gunicorn's worker_exit and worker_abort hooks (gunicorn.conf.py) flush it
+    when a worker stops or times out; a worker killed outright (SIGKILL, the
+    OOM killer) loses at most ACCESS_LOG_FLUSH_INTERVAL seconds of events,
+    and never more than ACCESS_LOG_MAX_BUFFER.
+    """
+
+    def __init__(self):
+        self._events = deque()
+        self._lock = threading.Lock()
+        self._flushing = False
+        self._first_event_at = None
+        self._timer = None
+        self.dropped = 0
+
+    @property
+    def batch_size(self):
+        return getattr(settings, 'ACCESS_LOG_BATCH_SIZE', 100)
+
+    @property
+    def flush_interval(self):
+        return getattr(settings, 'ACCESS_LOG_FLUSH_INTERVAL', 10)
+
+    @property
+    def max_buffer(self):
+        return getattr(settings, 'ACCESS_LOG_MAX_BUFFER', 1000)
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, topic_id, peer_id, access_type='view_topic'):
+        """Queue an access by ``peer_id`` to the topic ``topic_id`` shared with them"""
+        with self._lock:
+            if len(self._events) >= self.max_buffer:
+                self._events.popleft()
+                self.dropped += 1
+            self._events.append((topic_id, peer_id, access_type, timezone.now()))
+            if self._first_event_at is None:
+                self._first_event_at = time.monotonic()
+                self._start_timer()
+
+            due = (
+                len(self._events) >= self.batch_size
+                or time.monotonic() - self._first_event_at >= self.flush_interval
+            )
+            if not due or self._flushing:
+                return
+            self._flushing = True
+
+        threading.Thread(target=self._flush_in_background, name='access-log-flush', daemon=True).start()
+
+    def _start_timer(self):
+        # Called with the lock held, for the event that starts a new batch
+        self._timer = threading.Timer(self.flush_interval, self._flush_on_time)
+        self._timer.name = 'access-log-timer'
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _flush_on_time(self):
+        with self._lock:
+            self._timer = None
+            if self._flushing or not self._events:
+                return
+            self._flushing = True
+        self._flush_in_background()
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # Under the lock, like every other read and write of the flag
+            with self._lock:
+                self._flushing = False
+            # Background threads get their own connection; don't leak it
+            connection.close()
+
+    def flush(self):
+        """Write every buffered event and return how many rows were inserted"""
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+            self._first_event_at = None
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not events:
+            return 0
+
+        try:
+            return self._write(events)
+        except Exception:
+            logger.exception("Failed to flush %d share access events", len(events))
+            return 0
+
+    def _write(self, events):
+        topic_ids = {event[0] for event in events}
+        peer_ids = {event[1] for event in events}
+        share_ids = {
+            (topic_id, peer_id): share_id
+            for topic_id, peer_id, share_id in TopicShare.objects.filter(
+                topic_id__in=topic_ids,
+                peer_id__in=peer_ids
+            ).values_list('topic_id', 'peer_id', 'id')
+        }
+
+        # Events for shares deleted in the meantime are dropped
+        rows = [
+            ShareAccess(topic_share_id=share_ids[(topic_id, peer_id)], access_type=access_type, accessed_at=accessed_at)
+            for topic_id, peer_id, access_type, accessed_at in events
+            if (topic_id, peer_id) in share_ids
+        ]
+        with transaction.atomic():
+            ShareAccess.objects.bulk_create(rows, batch_size=self.batch_size)
+            add_to_daily_rollups(rows)
+        return len(rows)
+
+
+def add_to_daily_rollups(rows):
+    """Add freshly written ShareAccess rows to the per-day counters"""
+    totals = Counter(
+        (row.topic_share_id, timezone.localdate(row.accessed_at), row.access_type)
+        for row in rows
+    )
+    ShareAccessDaily.objects.bulk_create(
+        [
+            ShareAccessDaily(topic_share_id=share_id, day=day, access_type=access_type)
+            for share_id, day, access_type in totals
+        ],
+        ignore_conflicts=True
+    )
+    # One increment per (share, day, type) group, which is a handful per flush
+    for (share_id, day, access_type), count in totals.items():
+        ShareAccessDaily.objects.filter(
+            topic_share_id=share_id,
+            day=day,
+            access_type=access_type
+        ).update(count=F('count') + count)
+
+
+buffer = AccessLogBuffer()
+record = buffer.record
+flush = buffer.flush
+
+atexit.register(flush)
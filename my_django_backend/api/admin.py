@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccess
+from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccess, ShareAccessDaily
 
 @admin.register(Topic)
 class TopicAdmin(admin.ModelAdmin):
@@ -28,4 +28,9 @@ class TopicShareAdmin(admin.ModelAdmin):
 @admin.register(ShareAccess)
 class ShareAccessAdmin(admin.ModelAdmin):
     list_display = ['topic_share', 'access_type', 'accessed_at']
-    list_filter = ['access_type', 'accessed_at']
\ No newline at end of file
+    list_filter = ['access_type', 'accessed_at']
+
+@admin.register(ShareAccessDaily)
+class ShareAccessDailyAdmin(admin.ModelAdmin):
+    list_display = ['topic_share', 'day', 'access_type', 'count']
+    list_filter = ['access_type', 'day']
\ No newline at end of file
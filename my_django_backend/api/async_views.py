@@ -0,0 +1,198 @@
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+
+from . import access_log, authz
+from .models import Card, PeerRelationship, Topic, UserDataVersion
+from .readers import ValuesReader
+from .renderers import ORJSONRenderer
+from .serializers import PeerRelationshipSerializer, SharedTopicSerializer, TopicSerializer
+
+# Async versions of the dashboard's hot reads, for ASGI servers: a request
+# waiting on the database holds no worker thread. Output, ETags, throttling
+# and status codes match the synchronous endpoints; lists are unpaginated
+# and always use the full representation (no ?cursor=, ?fields= or ?omit=).
+
+
+def jwt_user(request, allow_query_token=False):
+    """
+    The user of the request's Bearer JWT, or None. With ``allow_query_token``
+    a ?token= parameter is accepted too, for EventSource clients that cannot
+    set headers.
+    """
+    authenticator = JWTAuthentication()
+    try:
+        authenticated = authenticator.authenticate(request)
+        if authenticated is not None:
+            return authenticated[0]
+        if allow_query_token and request.GET.get('token'):
+            return authenticator.get_user(authenticator.get_validated_token(request.GET['token']))
+    except (InvalidToken, exceptions.AuthenticationFailed):
+        pass
+    return None
+
+
+authenticate = sync_to_async(jwt_user)
+
+
+async def _rows(queryset):
+    return [row async for row in queryset]
+
+
+async def _version(user_id):
+    version = await UserDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).afirst()
+    return version or 0
+
+
+def _etag(user_id, version):
+    # Same format as etags.user_etag(), so either endpoint revalidates the other's ETag
+    return f'"{user_id}.{version}.json"'
+
+
+class AsyncReadView(View):
+    """
+    Base of the async read endpoints: authenticates the JWT, applies the
+    default DRF throttles, and answers If-None-Match from the user's data
+    version before reading anything.
+
+    Subclasses implement ``read(user, **kwargs)``, returning the response
+    data or None for a 404, and may set ``not_found`` to DRF's message.
+    Those guarding objects other users own override ``allowed``, which runs
+    before the ETag check so a 304 never outlives the user's access.
+    """
+    http_method_names = ['get']
+    not_found = None
+
+    def json(self, data, status_code=status.HTTP_200_OK, **headers):
+        return HttpResponse(
+            ORJSONRenderer().render(data), status=status_code, content_type='application/json', headers=headers
+        )
+
+    def throttled(self, request):
+        """DRF's Throttled error if a default throttle refuses the request, else None"""
+        waits = [
+            throttle.wait()
+            for throttle in (throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES)
+            if not throttle.allow_request(request, self)
+        ]
+        if not waits:
+            return None
+        return exceptions.Throttled(max((wait for wait in waits if wait is not None), default=None))
+
+    async def get(self, request, **kwargs):
+        user = await authenticate(request)
+        if user is None:
+            return self.json(
+                {'detail': exceptions.NotAuthenticated.default_detail}, status.HTTP_401_UNAUTHORIZED,
+                **{'WWW-Authenticate': JWTAuthentication().authenticate_header(request)}
+            )
+        request.user = user
+
+        throttled = await sync_to_async(self.throttled)(request)
+        if throttled is not None:
+            headers = {'Retry-After': str(throttled.wait)} if throttled.wait else {}
+            return self.json({'detail': throttled.detail}, throttled.status_code, **headers)
+
+        if not await self.allowed(user, **kwargs):
+            return self.json({'detail': self.not_found}, status.HTTP_404_NOT_FOUND)
+
+        # The version is read first: a matching client needs no rows at all,
+        # and, as in the sync views, the ETag can only be older than the body
+        etag = _etag(user.pk, await _version(user.pk))
+        if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+        if etag in if_none_match or '*' in if_none_match:
+            return self.finish(request, HttpResponse(status=status.HTTP_304_NOT_MODIFIED), etag)
+        data = await self.read(user, **kwargs)
+
+        if data is None:
+            return self.json({'detail': self.not_found}, status.HTTP_404_NOT_FOUND)
+        return self.finish(request, self.json(data), etag)
+
+    def finish(self, request, response, etag):
+        response['ETag'] = etag
+        patch_vary_headers(response, ['Accept', 'Authorization'])
+        return response
+
+    async def allowed(self, user, **kwargs):
+        """Whether ``user`` may read the object at all, whatever their ETag"""
+        return True
+
+
+class TopicReadMixin:
+    """
+    Topics with their cards, in two queries. They run one after the other:
+    the async ORM sends both to the request's one thread-sensitive
+    executor, so there is one connection and nothing to overlap.
+    """
+    serializer_class = TopicSerializer
+
+    @classmethod
+    def reader(cls):
+        return ValuesReader(cls.serializer_class())
+
+    async def read_topics(self, topics, cards):
+        reader = self.reader()
+        topic_rows = await _rows(reader.values(topics))
+        card_rows = await _rows(reader.children('cards', cards))
+        return reader.render(topic_rows, children={'cards': card_rows})
+
+
+class TopicListView(TopicReadMixin, AsyncReadView):
+    async def read(self, user):
+        return await self.read_topics(Topic.objects.filter(user=user), Card.objects.filter(topic__user=user))
+
+
+class TopicDetailView(TopicReadMixin, AsyncReadView):
+    not_found = 'No Topic matches the given query.'
+
+    async def read(self, user, pk):
+        topics = await self.read_topics(
+            Topic.objects.filter(pk=pk, user=user), Card.objects.filter(topic_id=pk, topic__user=user)
+        )
+        return topics[0] if topics else None
+
+
+class SharedTopicListView(TopicReadMixin, AsyncReadView):
+    serializer_class = SharedTopicSerializer
+
+    async def read(self, user):
+        shared = list(await sync_to_async(authz.shared_topic_ids)(user.id))
+        return await self.read_topics(Topic.objects.filter(id__in=shared), Card.objects.filter(topic_id__in=shared))
+
+
+class SharedTopicDetailView(TopicReadMixin, AsyncReadView):
+    serializer_class = SharedTopicSerializer
+    not_found = 'No Topic matches the given query.'
+
+    async def get(self, request, **kwargs):
+        response = await super().get(request, **kwargs)
+        # Logged through the in-memory buffer, like the synchronous endpoint
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            access_log.record(kwargs['pk'], request.user.id, 'view_topic')
+        return response
+
+    async def allowed(self, user, pk):
+        return await sync_to_async(authz.can_view_shared_topic)(user.id, pk)
+
+    async def read(self, user, pk):
+        topics = await self.read_topics(Topic.objects.filter(pk=pk), Card.objects.filter(topic_id=pk))
+        return topics[0] if topics else None
+
+
+class PeerListView(AsyncReadView):
+    async def read(self, user):
+        reader = ValuesReader(PeerRelationshipSerializer())
+        return reader.render(await _rows(reader.values(PeerRelationship.objects.filter(edges__user=user))))
+
+
+class PeerRequestListView(AsyncReadView):
+    async def read(self, user):
+        reader = ValuesReader(PeerRelationshipSerializer())
+        pending = PeerRelationship.objects.filter(addressee=user, status='pending')
+        return reader.render(await _rows(reader.values(pending)))
@@ -0,0 +1,80 @@
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from .cache import is_shared
+from .models import PeerEdge, TopicShare
+
+# Each user's accepted peers and active shared topics, kept as sorted int64
+# arrays so permission checks are a cache read plus a binary search. Without
+# a cache every worker shares, revoking access in one worker would leave the
+# others authorizing from their copy, so the sets are then read every time.
+PEERS_KEY = 'authz:peers:{}'
+SHARED_KEY = 'authz:shared:{}'
+
+
+def get_cache():
+    """The cache of the id sets, or None when it is not shared by every worker"""
+    alias = getattr(settings, 'AUTHZ_CACHE_ALIAS', 'default')
+    return caches[alias] if is_shared(alias) else None
+
+
+def _cached_ids(key, load):
+    cache = get_cache()
+    if cache is None:
+        return array('q', sorted(load()))
+    ids = cache.get(key)
+    if ids is None:
+        ids = array('q', sorted(load()))
+        cache.set(key, ids, getattr(settings, 'AUTHZ_CACHE_TIMEOUT', 600))
+    return ids
+
+
+def _contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def peer_ids(user_id):
+    """Sorted ids of the user's accepted peers"""
+    return _cached_ids(
+        PEERS_KEY.format(user_id),
+        lambda: PeerEdge.objects.filter(user_id=user_id).values_list('peer_id', flat=True)
+    )
+
+
+def shared_topic_ids(user_id):
+    """Sorted ids of the topics actively shared with the user"""
+    return _cached_ids(
+        SHARED_KEY.format(user_id),
+        lambda: TopicShare.objects.filter(peer_id=user_id, is_active=True).values_list('topic_id', flat=True)
+    )
+
+
+def is_peer(user_id, other_id):
+    return _contains(peer_ids(user_id), other_id)
+
+
+def can_view_shared_topic(user_id, topic_id):
+    return _contains(shared_topic_ids(user_id), topic_id)
+
+
+def _delete(keys):
+    cache = get_cache()
+    if not keys or cache is None:
+        return
+    cache.delete_many(keys)
+    # Drop anything re-read from the pre-commit state once the write lands
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_peers(user_ids):
+    _delete([PEERS_KEY.format(user_id) for user_id in user_ids if user_id is not None])
+
+
+def invalidate_shared_topics(user_ids):
+    _delete([SHARED_KEY.format(user_id) for user_id in user_ids if user_id is not None])
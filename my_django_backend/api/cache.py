@@ -0,0 +1,131 @@
+import hashlib
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+# Each user's cached responses are grouped into scopes that are invalidated
+# independently: a card edit must not throw away the cached peer list.
+TOPICS = 'topics'
+SHARED = 'shared'
+PEERS = 'peers'
+ALL_SCOPES = (TOPICS, SHARED, PEERS)
+
+# Alias of the response cache unless RESPONSE_CACHE_ALIAS names another
+DEFAULT_ALIAS = 'responses'
+
+# Backends holding a separate copy in every worker process
+PROCESS_LOCAL_BACKENDS = ('django.core.cache.backends.locmem.LocMemCache',)
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def is_shared(alias):
+    """
+    Whether every worker sees the same cache ``alias``: a shared backend, or
+    a process-local one with a single worker (WEB_CONCURRENCY, as gunicorn
+    counts them). Otherwise a write only invalidates the copy in the worker
+    that handled it.
+    """
+    backend = settings.CACHES[alias]['BACKEND']
+    return backend not in PROCESS_LOCAL_BACKENDS or getattr(settings, 'WEB_CONCURRENCY', 1) <= 1
+
+
+def alias():
+    return getattr(settings, 'RESPONSE_CACHE_ALIAS', DEFAULT_ALIAS)
+
+
+def get_cache():
+    """The response cache, or None when it is not shared by every worker"""
+    return caches[alias()] if is_shared(alias()) else None
+
+
+def cache_stats():
+    """Hit/miss counters of the response cache in this process"""
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _count(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+def _generation_key(user_id, scope):
+    return f'api:gen:{user_id}:{scope}'
+
+
+def _generations(user_id, scopes):
+    """
+    Current generation token of each scope.
+
+    Tokens are random rather than counters, so a generation key that was
+    evicted can never be recreated with a value that matches old entries.
+    """
+    cache = get_cache()
+    keys = [_generation_key(user_id, scope) for scope in scopes]
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            cache.add(key, uuid.uuid4().hex, timeout=None)
+            tokens[key] = cache.get(key)
+    return [tokens[key] for key in keys]
+
+
+def invalidate(user_ids, scopes=ALL_SCOPES):
+    """Drop the cached responses of the given users for the given scopes"""
+    keys = [
+        _generation_key(user_id, scope)
+        for user_id in user_ids if user_id is not None
+        for scope in scopes
+    ]
+    cache = get_cache()
+    if not keys or cache is None:
+        return
+    cache.delete_many(keys)
+    # A read racing the open transaction may have re-cached the old rows
+    # under a fresh generation; drop that again once the write is visible.
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def response_key(request, endpoint, scopes):
+    generations = _generations(request.user.pk, scopes)
+    renderer = getattr(request, 'accepted_renderer', None)
+    variant = f"{request.get_full_path()}|{renderer.format if renderer else ''}|{'|'.join(generations)}"
+    digest = hashlib.sha1(variant.encode()).hexdigest()
+    return f'api:resp:{request.user.pk}:{endpoint}:{digest}'
+
+
+def cached_response(request, endpoint, scopes, handler, *args, **kwargs):
+    """Serve ``handler``'s data from the response cache, filling it on a miss; just run it without the cache"""
+    cache = get_cache()
+    if cache is None:
+        return handler(request, *args, **kwargs)
+    key = response_key(request, endpoint, scopes)
+    data = cache.get(key)
+    if data is not None:
+        _count('hits')
+        return Response(data)
+
+    _count('misses')
+    response = handler(request, *args, **kwargs)
+    if response.status_code == status.HTTP_200_OK:
+        cache.set(key, response.data, getattr(settings, 'RESPONSE_CACHE_TIMEOUT', 300))
+    return response
+
+
+class CachedReadMixin:
+    """Cache list and retrieve responses per user, invalidated through ``cache_scopes``"""
+    cache_scopes = ALL_SCOPES
+
+    def list(self, request, *args, **kwargs):
+        return cached_response(request, f'{self.basename}-list', self.cache_scopes, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return cached_response(request, f'{self.basename}-detail', self.cache_scopes, super().retrieve, *args, **kwargs)
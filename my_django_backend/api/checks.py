@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+from . import cache as response_cache
+from .cache import is_shared
+
+# Policies under which a full Redis evicts keys instead of refusing writes.
+# Every cached response and id set is stored with a timeout, so the volatile
+# policies evict them as well as the allkeys ones.
+EVICTING_POLICIES = (
+    'allkeys-lru', 'allkeys-lfu', 'allkeys-random', 'volatile-lru', 'volatile-lfu', 'volatile-random', 'volatile-ttl',
+)
+HINT = "Set maxmemory and maxmemory-policy allkeys-lru on the Redis server behind REDIS_URL."
+
+
+def redis_memory_config(location):
+    """Redis' maxmemory settings, or None when they cannot be read (managed Redis often disables CONFIG)"""
+    import redis
+    try:
+        return redis.Redis.from_url(location).config_get('maxmemory*')
+    except redis.RedisError:
+        return None
+
+
+@register(Tags.caches, deploy=True)
+def check_response_cache_is_bounded(app_configs, **kwargs):
+    """
+    The LocMem response cache is capped by MAX_ENTRIES; in Redis, entries
+    only have their timeout, so the server must evict when memory runs out.
+    """
+    cache = settings.CACHES.get(response_cache.alias(), {})
+    if not cache.get('BACKEND', '').endswith('.RedisCache'):
+        return []
+    location = cache['LOCATION']
+    if not isinstance(location, str):
+        location = location[0]
+    memory = redis_memory_config(location.split(',')[0])
+    if memory is None:
+        return [Warning("Could not read the maxmemory settings of the response cache's Redis", hint=HINT, id='api.W002')]
+    if not int(memory.get('maxmemory', 0)) or memory.get('maxmemory-policy') not in EVICTING_POLICIES:
+        return [Warning(
+            f"The response cache's Redis has maxmemory {memory.get('maxmemory')} and policy "
+            f"{memory.get('maxmemory-policy')}; per-user responses will grow it without bound",
+            hint=HINT, id='api.W001',
+        )]
+    return []
+
+
+@register(Tags.caches, deploy=True)
+def check_authz_cache_is_shared(app_configs, **kwargs):
+    """
+    Permission checks skip a cache the workers do not share; with several
+    workers on LocMem that is every check, so a deploy must use Redis.
+    """
+    alias = getattr(settings, 'AUTHZ_CACHE_ALIAS', 'default')
+    if is_shared(alias):
+        return []
+    return [Error(
+        f"The authorization cache {alias!r} is local to each of {getattr(settings, 'WEB_CONCURRENCY', 1)} workers, so revoked "
+        f"access would outlive it in the others; permission checks query the database every time instead",
+        hint="Point REDIS_URL at a Redis server, or run a single worker (WEB_CONCURRENCY=1).", id='api.E001',
+    )]
@@ -0,0 +1,68 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, Q, Sum
+
+from .models import COMPLETED_PROGRESS, Card, Topic
+
+# Topic.card_count etc. are maintained from deltas: each card contributes one
+# to card_count, its progress to progress_sum, and one to completed_count and
+# starred_count when it is completed or starred.
+COUNTER_FIELDS = Topic.COUNTER_FIELDS
+
+
+def contribution(progress, starred):
+    """The counter values one card adds to its topic"""
+    return (1, int(progress >= COMPLETED_PROGRESS), int(bool(starred)), progress)
+
+
+class CounterDeltas:
+    """Per-topic counter changes collected from card writes and applied with F() updates"""
+
+    def __init__(self):
+        self.deltas = defaultdict(lambda: [0] * len(COUNTER_FIELDS))
+
+    def add(self, topic_id, progress, starred, sign=1):
+        totals = self.deltas[topic_id]
+        for index, value in enumerate(contribution(progress, starred)):
+            totals[index] += sign * value
+
+    def add_card(self, card, sign=1):
+        self.add(card.topic_id, card.progress, card.starred, sign)
+
+    def apply(self):
+        """One UPDATE per topic whose counters changed; concurrent writers cannot lose increments"""
+        for topic_id, totals in self.deltas.items():
+            changes = {field: F(field) + delta for field, delta in zip(COUNTER_FIELDS, totals) if delta}
+            if changes:
+                # update() skips Topic signals; card receivers record the change
+                Topic.objects.filter(pk=topic_id).update(**changes)
+        self.deltas.clear()
+
+
+def actual_counters(topic_ids):
+    """The counters recomputed from the cards of ``topic_ids``, keyed by topic id"""
+    rows = Card.objects.filter(topic_id__in=topic_ids).order_by().values('topic_id').annotate(
+        card_count=Count('id'),
+        completed_count=Count('id', filter=Q(progress__gte=COMPLETED_PROGRESS)),
+        starred_count=Count('id', filter=Q(starred=True)),
+        progress_sum=Sum('progress'),
+    )
+    actual = {topic_id: dict.fromkeys(COUNTER_FIELDS, 0) for topic_id in topic_ids}
+    for row in rows:
+        actual[row.pop('topic_id')] = row
+    return actual
+
+
+def recount(topics, dry_run=False):
+    """Fix the stored counters of ``topics`` (Topic instances) and return the ones that had drifted"""
+    actual = actual_counters([topic.pk for topic in topics])
+    drifted = []
+    for topic in topics:
+        values = actual[topic.pk]
+        if any(getattr(topic, field) != values[field] for field in COUNTER_FIELDS):
+            for field in COUNTER_FIELDS:
+                setattr(topic, field, values[field])
+            drifted.append(topic)
+    if drifted and not dry_run:
+        Topic.objects.bulk_update(drifted, COUNTER_FIELDS)
+    return drifted
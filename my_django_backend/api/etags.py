@@ -0,0 +1,72 @@
+from django.db.models import F
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import UserDataVersion
+
+
+def bump_versions(user_ids):
+    """Increment the data version of every given user"""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    versions = UserDataVersion.objects.filter(user_id__in=user_ids)
+    if versions.update(version=F('version') + 1) == len(user_ids):
+        return
+
+    # First write for some of these users: create their rows, then bump them
+    existing = set(versions.values_list('user_id', flat=True))
+    missing = user_ids - existing
+    UserDataVersion.objects.bulk_create(
+        [UserDataVersion(user_id=user_id) for user_id in missing],
+        ignore_conflicts=True
+    )
+    UserDataVersion.objects.filter(user_id__in=missing).update(version=F('version') + 1)
+
+
+def get_version(user_id):
+    """Current data version of a user (0 until their first write)"""
+    version = UserDataVersion.objects.filter(user_id=user_id).values_list('version', flat=True).first()
+    return version or 0
+
+
+def user_etag(request):
+    """Strong ETag for the requesting user's current data version and response format"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    media_format = renderer.format if renderer else 'json'
+    return f'"{request.user.pk}.{get_version(request.user.pk)}.{media_format}"'
+
+
+def conditional_response(request, handler, *args, **kwargs):
+    """
+    Run ``handler`` unless the client already holds the current version.
+
+    The version is read before the handler runs, so a write that lands in
+    between only makes the ETag older than the body, never newer.
+    """
+    etag = user_etag(request)
+    if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+
+    if etag in if_none_match or '*' in if_none_match:
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = handler(request, *args, **kwargs)
+        if response.status_code != status.HTTP_200_OK:
+            return response
+
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept', 'Authorization'])
+    return response
+
+
+class ConditionalReadMixin:
+    """Serve list and retrieve with per-user version ETags and honour If-None-Match"""
+
+    def list(self, request, *args, **kwargs):
+        return conditional_response(request, super().list, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_response(request, super().retrieve, *args, **kwargs)
@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+# Events pushed to /api/events/ streams. They only say what changed, by id;
+# clients fetch the rows themselves with /api/sync/.
+PEER_REQUESTED = 'peer.requested'
+PEER_UPDATED = 'peer.updated'
+PEER_REMOVED = 'peer.removed'
+SHARE_ACTIVATED = 'share.activated'
+SHARE_REVOKED = 'share.revoked'
+TOPICS_CHANGED = 'topics.changed'
+RESYNC = 'resync'  # The stream fell behind and dropped events
+
+
+class InProcessSubscription:
+    """One open stream's events, queued on the event loop that serves it"""
+
+    def __init__(self, broker, user_id, maxsize):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+
+    def put(self, event):
+        """Queue ``event`` from any thread"""
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:  # The loop has closed; the stream is gone
+            self.broker.unsubscribe(self)
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind refetches everything instead
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': RESYNC})
+
+    async def get(self, timeout):
+        """The next event, or None after ``timeout`` seconds without one"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    async def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    """
+    Fan-out to the streams open in this process.
+
+    Enough for a single ASGI worker and for tests; with several workers a
+    stream only sees events published by its own process, so use RedisBroker.
+    """
+
+    def __init__(self):
+        self._subscriptions = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, user_ids, event):
+        with self._lock:
+            subscriptions = [s for user_id in user_ids for s in self._subscriptions.get(user_id, ())]
+        for subscription in subscriptions:
+            subscription.put(event)
+
+    def subscribe(self, user_id):
+        subscription = InProcessSubscription(self, user_id, getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+
+class RedisSubscription:
+    """One open stream's events, read from the user's Redis pub/sub channel"""
+
+    def __init__(self, url, channel):
+        from redis import asyncio as redis_asyncio
+        self.client = redis_asyncio.Redis.from_url(url)
+        self.pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self.channel = channel
+        self.subscribed = False
+
+    async def get(self, timeout):
+        if not self.subscribed:
+            await self.pubsub.subscribe(self.channel)
+            self.subscribed = True
+        message = await self.pubsub.get_message(timeout=timeout)
+        return None if message is None else json.loads(message['data'])
+
+    async def close(self):
+        await self.pubsub.aclose()
+        await self.client.aclose()
+
+
+class RedisBroker:
+    """Fan-out across worker processes through one Redis pub/sub channel per user"""
+    CHANNEL = 'events:{}'
+
+    def __init__(self, url=None):
+        import redis
+        self.url = url or settings.REDIS_URL
+        self.client = redis.Redis.from_url(self.url)
+
+    def publish(self, user_ids, event):
+        payload = json.dumps(event)
+        with self.client.pipeline(transaction=False) as pipe:
+            for user_id in user_ids:
+                pipe.publish(self.CHANNEL.format(user_id), payload)
+            pipe.execute()
+
+    def subscribe(self, user_id):
+        return RedisSubscription(self.url, self.CHANNEL.format(user_id))
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    """The broker named by the EVENT_BROKER setting, created once per process"""
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENT_BROKER', 'api.events.InProcessBroker'))()
+        return _broker
+
+
+def publish(user_ids, event_type, **data):
+    """Push an event to ``user_ids``' streams once the current transaction commits"""
+    user_ids = sorted({user_id for user_id in user_ids if user_id is not None})
+    if not user_ids:
+        return
+    event = {'type': event_type, **data}
+
+    def send():
+        try:
+            get_broker().publish(user_ids, event)
+        except Exception:
+            # Streams are a convenience on top of /api/sync/; never fail a write over them
+            logger.exception("Could not publish %s event", event_type)
+
+    transaction.on_commit(send)
+
+
+def format_event(event):
+    """``event`` as a Server-Sent Events message"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, separators=(',', ':'))}\n\n".encode()
@@ -0,0 +1,180 @@
+"""
+Closed-loop HTTP load generator: ``concurrency`` keep-alive connections each
+send the next request as soon as the previous response has been read.
+
+Plain asyncio and HTTP/1.1, so it has no dependencies and does not need
+Django settings; the bench_async and bench_load commands drive it against a
+sync (gunicorn) and an async (uvicorn) server. It can also be run directly:
+
+    python -m api.loadtest http://127.0.0.1:8000/api/async/topics/ \\
+        --concurrency 200 --duration 10 --header "Authorization: Bearer <token>"
+
+``slow_clients`` extra connections trickle one header line per second and
+never finish their request, like clients on bad networks: each one pins a
+sync worker, while an async server only keeps a socket open.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+
+READ_ERRORS = (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError, ValueError)
+
+
+def build_request(url, headers=()):
+    parts = urlsplit(url)
+    path = parts.path or '/'
+    if parts.query:
+        path += '?' + parts.query
+    lines = [f'GET {path} HTTP/1.1', f'Host: {parts.netloc}', 'Accept: application/json', *headers]
+    return parts.hostname, parts.port or 80, ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+
+async def read_response(reader):
+    """Read one response off a keep-alive connection; returns (status, connection closed)"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise asyncio.IncompleteReadError(b'', None)
+    status = int(status_line.split()[1])
+    length, chunked, close = None, False, False
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.partition(b':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'transfer-encoding':
+            chunked = b'chunked' in value
+        elif name == b'connection':
+            close = value == b'close'
+
+    if status == 304 or status < 200:
+        pass
+    elif chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if not size:
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                break
+            await reader.readexactly(size + 2)
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        close = True
+    return status, close
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+async def _worker(host, port, request, deadline, timeout, latencies, statuses):
+    connection = None
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+            reader, writer = connection
+            writer.write(request)
+            await writer.drain()
+            status, close = await asyncio.wait_for(read_response(reader), timeout)
+        except READ_ERRORS as exc:
+            statuses[type(exc).__name__] += 1
+            if connection is not None:
+                connection[1].close()
+                connection = None
+            await asyncio.sleep(0.01)
+            continue
+        latencies.append(time.perf_counter() - started)
+        statuses[status] += 1
+        if close:
+            writer.close()
+            connection = None
+    if connection is not None:
+        connection[1].close()
+
+
+async def _slow_client(host, port, request, deadline):
+    head = request.split(b'\r\n')[0] + b'\r\n'
+    try:
+        reader, writer = await asyncio.open_connection(host, port)
+        writer.write(head)
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(1)
+            writer.write(b'X-Slow: 1\r\n')
+            await writer.drain()
+        writer.close()
+    except OSError:
+        pass
+
+
+def summarize(url, concurrency, elapsed, latencies, statuses, slow_clients=0):
+    """Throughput and latency percentiles of one run; ``statuses`` counts status codes and error names"""
+    latencies = sorted(latencies)
+    ok = sum(count for status, count in statuses.items() if isinstance(status, int) and status < 400)
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'slow_clients': slow_clients,
+        'duration_s': round(elapsed, 2),
+        'requests': len(latencies),
+        'ok': ok,
+        'errors': sum(statuses.values()) - ok,
+        'rps': round(len(latencies) / elapsed, 1),
+        **{
+            f'p{int(fraction * 100)}_ms': None if not latencies else round(percentile(latencies, fraction) * 1000, 2)
+            for fraction in (0.5, 0.95, 0.99)
+        },
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else None,
+        'statuses': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+    }
+
+
+async def run(url, concurrency=50, duration=10.0, headers=(), timeout=30.0, slow_clients=0, header_sets=None):
+    """
+    Load ``url`` for ``duration`` seconds and return throughput and latency
+    percentiles. With ``header_sets``, connection i sends
+    header_sets[i % len(header_sets)] after ``headers``, e.g. to spread the
+    load over several users' tokens.
+    """
+    host, port, request = build_request(url, headers)
+    requests = [build_request(url, [*headers, *extra])[2] for extra in header_sets or ()] or [request]
+    latencies, statuses = [], Counter()
+    started = time.perf_counter()
+    deadline = started + duration
+    tasks = [_slow_client(host, port, request, deadline) for _ in range(slow_clients)]
+    tasks += [
+        _worker(host, port, requests[i % len(requests)], deadline, timeout, latencies, statuses)
+        for i in range(concurrency)
+    ]
+    await asyncio.gather(*tasks)
+    return summarize(url, concurrency, time.perf_counter() - started, latencies, statuses, slow_clients)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('url')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--slow-clients', type=int, default=0)
+    parser.add_argument('--header', action='append', default=[], help="Extra request header, e.g. 'Authorization: Bearer ...'")
+    args = parser.parse_args(argv)
+    result = asyncio.run(run(
+        args.url, args.concurrency, args.duration, args.header, args.timeout, args.slow_clients
+    ))
+    print(json.dumps(result))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import loadtest
+from api.management.commands.bench_serializers import seed
+
+# Each server is started on the development database with throttling off, and
+# by default without the response cache, so every request reads the database
+SERVERS = {
+    'gunicorn-sync': {
+        'command': ['-m', 'gunicorn', 'my_django_backend.wsgi:application', '--bind', '127.0.0.1:{port}',
+                    '--workers', '{workers}', '--log-level', 'warning'],
+        'paths': {'sync': '/api/topics/'},
+    },
+    'uvicorn-async': {
+        'command': ['-m', 'uvicorn', 'my_django_backend.asgi:application', '--port', '{port}',
+                    '--workers', '{workers}', '--log-level', 'warning'],
+        'paths': {'sync': '/api/topics/', 'async': '/api/async/topics/'},
+    },
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_serving(url, headers, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with urllib.request.urlopen(urllib.request.Request(url, headers=headers), timeout=5) as response:
+                if response.status == 200:
+                    return
+        except (OSError, urllib.error.URLError):
+            time.sleep(0.2)
+    raise CommandError(f"Server did not start serving {url}")
+
+
+class Command(BaseCommand):
+    help = "Load-test GET topics on sync gunicorn workers and on an async ASGI server (uvicorn), at several concurrencies"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topics', type=int, default=50)
+        parser.add_argument('--cards', type=int, default=20, help="Cards per topic")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes per server")
+        parser.add_argument('--concurrency', default='10,100,400', help="Comma-separated connection counts")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per run")
+        parser.add_argument('--slow-clients', type=int, default=0, help="Extra connections that never finish a request")
+        parser.add_argument('--keep-cache', action='store_true', help="Leave the response cache on")
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        levels = [int(level) for level in options['concurrency'].split(',')]
+        env = {**os.environ, 'THROTTLE_USER_RATE': '1000000/s'}
+        if not options['keep_cache']:
+            env['RESPONSE_CACHE_TIMEOUT'] = '0'
+
+        # The servers read committed rows, so unlike the other benchmarks the
+        # data is kept until the end and then deleted
+        User.objects.filter(username__startswith='bench-serializers-').delete()
+        owner, _ = seed(options['topics'], options['cards'], 0)
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(owner)}'}
+        results = []
+        try:
+            for server, spec in SERVERS.items():
+                results += self.bench_server(server, spec, options['workers'], env, headers, levels, options)
+        finally:
+            User.objects.filter(username__startswith='bench-serializers-').delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(
+            f"GET topics: {options['topics']} topics x {options['cards']} cards, {options['workers']} workers, "
+            f"{options['slow_clients']} slow clients"
+        )
+        for row in results:
+            self.stdout.write(
+                f"  {row['server']:14} {row['view']:5} c={row['concurrency']:<4} {row['rps']:>9,.1f} req/s  "
+                f"p50 {row['p50_ms'] or 0:8.1f}  p95 {row['p95_ms'] or 0:8.1f}  p99 {row['p99_ms'] or 0:8.1f} ms  "
+                f"errors {row['errors']}"
+            )
+
+    def bench_server(self, server, spec, workers, env, headers, levels, options):
+        port = free_port()
+        command = [sys.executable] + [part.format(port=port, workers=workers) for part in spec['command']]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        results = []
+        try:
+            base = f'http://127.0.0.1:{port}'
+            wait_until_serving(base + next(iter(spec['paths'].values())), headers)
+            for view, path in spec['paths'].items():
+                for concurrency in levels:
+                    result = asyncio.run(loadtest.run(
+                        base + path, concurrency, options['duration'],
+                        [f'{name}: {value}' for name, value in headers.items()],
+                        slow_clients=options['slow_clients']
+                    ))
+                    results.append({'server': server, 'view': view, **result})
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
+        return results
@@ -0,0 +1,219 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+from rest_framework_simplejwt.tokens import AccessToken
+
+from api import loadtest
+from api.management.commands.bench_async import SERVERS, free_port, wait_until_serving
+from api.models import Card, PeerEdge, Topic, TopicShare
+
+# Read endpoints exercised per run, all through the real URLconf; each is
+# loaded on its own so its numbers are not diluted by cheaper ones
+ENDPOINTS = {
+    'topics': '/api/topics/',
+    'topics-page': '/api/topics/?page_size=20',
+    'topic-summary': '/api/topics/summary/',
+    'cards-page': '/api/cards/?page_size=50',
+    'shared-topics': '/api/shared-topics/',
+    'peers': '/api/peers/',
+    'peer-requests': '/api/peers/requests/',
+    'dashboard': '/api/dashboard/',
+    'sync': '/api/sync/',
+    'search': '/api/search/?q=python',
+    'async-topics': '/api/async/topics/',
+    'async-shared-topics': '/api/async/shared-topics/',
+}
+TARGETS = {'client': None, 'wsgi': 'gunicorn-sync', 'asgi': 'uvicorn-async'}
+
+
+def git_commit():
+    """(commit hash, uncommitted changes) of the checkout, or (None, None) outside git"""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=settings.BASE_DIR,
+                                capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return commit, bool(status.strip())
+
+
+@contextmanager
+def unthrottled():
+    """Turn the DRF rate limits off in this process, as THROTTLE_USER_RATE does for the servers"""
+    rates = SimpleRateThrottle.THROTTLE_RATES
+    SimpleRateThrottle.THROTTLE_RATES = {scope: None for scope in rates}
+    try:
+        yield
+    finally:
+        SimpleRateThrottle.THROTTLE_RATES = rates
+
+
+def run_client(path, concurrency, duration, header_sets):
+    """
+    loadtest.run's closed loop with Django's test client instead of sockets:
+    one thread per client, each with its own database connection. The GIL
+    serialises the Python work, so this measures the app without a server,
+    not the concurrency a server would reach.
+    """
+    results = []
+    deadline = time.perf_counter() + duration
+
+    def client_loop(headers):
+        client = Client(raise_request_exception=False, **headers)
+        latencies, statuses = [], Counter()
+        try:
+            while time.perf_counter() < deadline:
+                started = time.perf_counter()
+                response = client.get(path, HTTP_ACCEPT='application/json')
+                latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] += 1
+        finally:
+            connections.close_all()
+            results.append((latencies, statuses))
+
+    started = time.perf_counter()
+    threads = [
+        threading.Thread(target=client_loop, args=(header_sets[i % len(header_sets)],))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return loadtest.summarize(
+        path, concurrency, elapsed,
+        [latency for latencies, _ in results for latency in latencies],
+        sum((statuses for _, statuses in results), Counter()),
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Load every read endpoint with concurrent clients authenticated as generate_dataset users, against "
+        "the test client or a local WSGI/ASGI server; reports req/s and p50/p95/p99 per endpoint as JSON"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--target', choices=list(TARGETS), default='client',
+                            help="client: Django's test client in this process; wsgi: gunicorn; asgi: uvicorn")
+        parser.add_argument('--endpoints', help=f"Comma-separated subset of: {', '.join(ENDPOINTS)}")
+        parser.add_argument('--prefix', default='dataset-', help="Username prefix of the generate_dataset users")
+        parser.add_argument('--users', type=int, help="Distinct users the clients log in as (default: concurrency)")
+        parser.add_argument('--concurrency', type=int, default=20, help="Concurrent clients per endpoint")
+        parser.add_argument('--duration', type=float, default=10.0, help="Seconds per endpoint")
+        parser.add_argument('--workers', type=int, default=2, help="Worker processes of the wsgi/asgi server")
+        parser.add_argument('--keep-cache', action='store_true', help="Leave the response cache on")
+        parser.add_argument('--output', help="Also write the JSON report to this file")
+        parser.add_argument('--compare', help="A previous JSON report to print req/s and p95 changes against")
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        names = options['endpoints'].split(',') if options['endpoints'] else list(ENDPOINTS)
+        unknown = sorted(set(names) - set(ENDPOINTS))
+        if unknown:
+            raise CommandError(f"Unknown endpoints: {', '.join(unknown)}")
+
+        users = list(User.objects.filter(username__startswith=options['prefix'])
+                     .order_by('id')[:options['users'] or options['concurrency']])
+        if not users:
+            raise CommandError(f"No users with prefix {options['prefix']!r}; run generate_dataset first")
+        tokens = [str(AccessToken.for_user(user)) for user in users]
+
+        started = timezone.now()
+        if options['target'] == 'client':
+            header_sets = [{'HTTP_AUTHORIZATION': f'Bearer {token}'} for token in tokens]
+            cache_timeout = settings.RESPONSE_CACHE_TIMEOUT if options['keep_cache'] else 0
+            with unthrottled(), override_settings(RESPONSE_CACHE_TIMEOUT=cache_timeout):
+                endpoints = {
+                    name: run_client(ENDPOINTS[name], options['concurrency'], options['duration'], header_sets)
+                    for name in names
+                }
+        else:
+            header_sets = [[f'Authorization: Bearer {token}'] for token in tokens]
+            endpoints = self.bench_server(SERVERS[TARGETS[options['target']]], names, header_sets, options)
+
+        commit, dirty = git_commit()
+        report = {
+            'commit': commit,
+            'dirty': dirty,
+            'started_at': started.isoformat(),
+            'target': options['target'],
+            'concurrency': options['concurrency'],
+            'duration_s': options['duration'],
+            'users': len(users),
+            'response_cache': options['keep_cache'],
+            'dataset': self.dataset(options['prefix']),
+            'endpoints': endpoints,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+        baseline = None
+        if options['compare']:
+            with open(options['compare']) as previous:
+                baseline = json.load(previous)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        self.stdout.write(
+            f"{report['target']} @ {(commit or 'unknown')[:12]}{' (dirty)' if dirty else ''}: "
+            f"{report['concurrency']} clients as {report['users']} users, {report['duration_s']}s per endpoint"
+        )
+        for name, row in endpoints.items():
+            line = (
+                f"  {name:20} {row['rps']:>9,.1f} req/s  p50 {row['p50_ms'] or 0:8.1f}  "
+                f"p95 {row['p95_ms'] or 0:8.1f}  p99 {row['p99_ms'] or 0:8.1f} ms  errors {row['errors']}"
+            )
+            before = (baseline or {}).get('endpoints', {}).get(name)
+            if before and before['rps'] and before['p95_ms']:
+                line += (f"  req/s {(row['rps'] / before['rps'] - 1) * 100:+.0f}%"
+                         f"  p95 {((row['p95_ms'] or 0) / before['p95_ms'] - 1) * 100:+.0f}%")
+            self.stdout.write(line)
+
+    def dataset(self, prefix):
+        owned = {'user__username__startswith': prefix}
+        return {
+            'users': User.objects.filter(username__startswith=prefix).count(),
+            'topics': Topic.objects.filter(**owned).count(),
+            'cards': Card.objects.filter(topic__user__username__startswith=prefix).count(),
+            'peer_edges': PeerEdge.objects.filter(**owned).count(),
+            'shares': TopicShare.objects.filter(owner__username__startswith=prefix).count(),
+        }
+
+    def bench_server(self, spec, names, header_sets, options):
+        env = {**os.environ, 'THROTTLE_USER_RATE': '1000000/s'}
+        if not options['keep_cache']:
+            env['RESPONSE_CACHE_TIMEOUT'] = '0'
+        port = free_port()
+        command = [sys.executable] + [part.format(port=port, workers=options['workers']) for part in spec['command']]
+        process = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env)
+        base = f'http://127.0.0.1:{port}'
+        try:
+            wait_until_serving(base + ENDPOINTS['topics'], dict(header.split(': ', 1) for header in header_sets[0]))
+            return {
+                name: asyncio.run(loadtest.run(
+                    base + ENDPOINTS[name], options['concurrency'], options['duration'], header_sets=header_sets
+                ))
+                for name in names
+            }
+        finally:
+            process.terminate()
+            process.wait(timeout=30)
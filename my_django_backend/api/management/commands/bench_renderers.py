@@ -0,0 +1,75 @@
+import gzip
+import json
+import time
+from io import BytesIO
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from api.management.commands.bench_serializers import seed
+from api.models import Topic
+from api.parsers import MessagePackParser, ORJSONParser
+from api.readers import serialize_many
+from api.renderers import MessagePackRenderer, ORJSONRenderer
+from api.serializers import TopicSerializer
+
+FORMATS = {
+    'json': (JSONRenderer, JSONParser),
+    'orjson': (ORJSONRenderer, ORJSONParser),
+    'msgpack': (MessagePackRenderer, MessagePackParser),
+}
+
+
+def best_of(runs, func):
+    best = float('inf')
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+class Command(BaseCommand):
+    help = "Compare encode/decode time and payload size of the JSON, orjson and MessagePack formats on a /topics/ response"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topics', type=int, default=200)
+        parser.add_argument('--cards', type=int, default=50, help="Cards per topic")
+        parser.add_argument('--runs', type=int, default=10)
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        # The same data GET /api/topics/ returns, built on rolled-back rows
+        with transaction.atomic():
+            owner, _ = seed(options['topics'], options['cards'], 0)
+            data = serialize_many(TopicSerializer, Topic.objects.filter(user=owner))
+            transaction.set_rollback(True)
+
+        results = {}
+        for name, (renderer_class, parser_class) in FORMATS.items():
+            renderer, parser = renderer_class(), parser_class()
+            encode, body = best_of(options['runs'], lambda: renderer.render(data))
+            decode, _ = best_of(options['runs'], lambda: parser.parse(BytesIO(body), parser.media_type, {}))
+            results[name] = {
+                'encode_ms': round(encode * 1000, 2),
+                'decode_ms': round(decode * 1000, 2),
+                'bytes': len(body),
+                'gzip_bytes': len(gzip.compress(body, 6)),
+            }
+        results['orjson']['identical_to_json'] = (
+            ORJSONRenderer().render(data) == JSONRenderer().render(data)
+        )
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        self.stdout.write(f"/topics/ with {options['topics']} topics x {options['cards']} cards")
+        for name, row in results.items():
+            self.stdout.write(
+                f"  {name:8} encode {row['encode_ms']:8.2f} ms  decode {row['decode_ms']:8.2f} ms  "
+                f"{row['bytes']:>10,} bytes  {row['gzip_bytes']:>9,} gzipped"
+            )
+        if not results['orjson']['identical_to_json']:
+            self.stderr.write(self.style.ERROR("orjson output differs from JSONRenderer"))
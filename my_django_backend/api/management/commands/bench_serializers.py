@@ -0,0 +1,92 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.models import Card, PeerRelationship, Topic, TopicShare
+from api.readers import ValuesReader
+from api.serializers import CardSerializer, PeerRelationshipSerializer, SharedTopicSerializer, TopicSerializer
+
+
+def seed(topics, cards, peers):
+    """Create one owner with ``topics`` x ``cards`` shared with a viewer and ``peers`` peers; returns (owner, viewer)"""
+    owner = User.objects.create_user(username='bench-serializers-owner')
+    viewer = User.objects.create_user(username='bench-serializers-viewer')
+    created = Topic.objects.bulk_create([Topic(user=owner, name=f'Topic {i}') for i in range(topics)])
+    Card.objects.bulk_create([
+        Card(topic=topic, name=f'Card {j}', resource='https://example.com/' + 'r' * 40,
+             note='n' * 400, progress=j % 101, starred=j % 3 == 0)
+        for topic in created for j in range(cards)
+    ])
+    TopicShare.objects.bulk_create([TopicShare(topic=topic, owner=owner, peer=viewer) for topic in created])
+    users = User.objects.bulk_create([User(username=f'bench-serializers-peer-{i}', password='!') for i in range(peers)])
+    for peer in users:
+        PeerRelationship.objects.create(requester=owner, addressee=peer, status='accepted')
+    return owner, viewer
+
+
+class Command(BaseCommand):
+    help = "Compare objects/sec of the DRF serializers and the values() readers on synthetic data (rolled back afterwards)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topics', type=int, default=200)
+        parser.add_argument('--cards', type=int, default=50, help="Cards per topic")
+        parser.add_argument('--peers', type=int, default=200)
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            owner, viewer = seed(options['topics'], options['cards'], options['peers'])
+            cases = {
+                'cards': (CardSerializer, Card.objects.filter(topic__user=owner)),
+                'topics': (TopicSerializer, Topic.objects.filter(user=owner).prefetch_related('cards')),
+                'shared_topics': (
+                    SharedTopicSerializer,
+                    Topic.objects.filter(shares__peer=viewer).select_related('user').prefetch_related('cards')
+                ),
+                'peers': (
+                    PeerRelationshipSerializer,
+                    PeerRelationship.objects.filter(edges__user=owner).select_related('requester', 'addressee')
+                ),
+            }
+            results = {name: self.measure(*case, options['runs']) for name, case in cases.items()}
+            transaction.set_rollback(True)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+        for name, row in results.items():
+            self.stdout.write(
+                f"{name:14} {row['objects']:7} objects  drf {row['drf_per_sec']:>10,.0f}/s  "
+                f"values {row['values_per_sec']:>10,.0f}/s  x{row['speedup']:.1f}"
+            )
+
+    def measure(self, serializer_class, queryset, runs):
+        reader = ValuesReader.for_serializer(serializer_class())
+        drf = values = float('inf')
+        for _ in range(runs):
+            started = time.perf_counter()
+            drf_data = serializer_class(queryset.all(), many=True).data
+            drf = min(drf, time.perf_counter() - started)
+
+            started = time.perf_counter()
+            values_data = reader.render(reader.values(queryset.all()))
+            values = min(values, time.perf_counter() - started)
+
+        assert values_data == drf_data, "values() reader output differs from the serializer"
+        objects = self.count_objects(drf_data)
+        return {
+            'objects': objects,
+            'drf_ms': round(drf * 1000, 2),
+            'values_ms': round(values * 1000, 2),
+            'drf_per_sec': round(objects / drf),
+            'values_per_sec': round(objects / values),
+            'speedup': round(drf / values, 2),
+        }
+
+    def count_objects(self, data):
+        """Rows plus nested rows, the unit each serializer instantiates per object"""
+        return sum(1 + len(item.get('cards', ())) for item in data)
@@ -0,0 +1,90 @@
+import json
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from api.models import Tombstone, UserDataVersion
+from api.search import search_users
+
+BENCH_EMAIL_DOMAIN = 'bench-user-search.invalid'
+SYLLABLES = ['al', 'an', 'ar', 'be', 'ca', 'da', 'el', 'en', 'fa', 'go', 'ha', 'is', 'jo', 'ka', 'li',
+             'ma', 'ne', 'or', 'pa', 'ra', 'sa', 'ta', 'ul', 'va', 'wi', 'xe', 'yo', 'za']
+
+
+def make_username(rng, n):
+    word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    return f"{word}{n}"
+
+
+class Command(BaseCommand):
+    help = "Measure peer search latency against a large synthetic auth_user table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000, help="Synthetic users to ensure exist (default: 1,000,000)")
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--runs', type=int, default=20, help="Timed runs per query")
+        parser.add_argument('--queries', nargs='+', default=['al', 'mara', 'kaza', 'ul42', 'zzq'])
+        parser.add_argument('--keep', action='store_true', help="Keep the synthetic users afterwards")
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        rng = random.Random(42)
+        synthetic = User.objects.filter(email__endswith='@' + BENCH_EMAIL_DOMAIN)
+
+        existing = synthetic.count()
+        started = time.perf_counter()
+        for start in range(existing, options['users'], options['batch_size']):
+            stop = min(start + options['batch_size'], options['users'])
+            User.objects.bulk_create([
+                User(username=make_username(rng, n), email=f"{n}@{BENCH_EMAIL_DOMAIN}", password='!')
+                for n in range(start, stop)
+            ])
+        seed_seconds = time.perf_counter() - started
+
+        searcher = synthetic.order_by('id').first()
+        results = {
+            'vendor': connection.vendor,
+            'users': User.objects.count(),
+            'seed_seconds': round(seed_seconds, 2),
+            'queries': {},
+        }
+        for query in options['queries']:
+            list(search_users(searcher, query))  # warm up
+            timings = []
+            for _ in range(options['runs']):
+                t0 = time.perf_counter()
+                matches = list(search_users(searcher, query))
+                timings.append((time.perf_counter() - t0) * 1000)
+            timings.sort()
+            results['queries'][query] = {
+                'matches': len(matches),
+                'p50_ms': round(statistics.median(timings), 3),
+                'p95_ms': round(timings[int(len(timings) * 0.95) - 1], 3),
+                'max_ms': round(timings[-1], 3),
+            }
+
+        if not options['keep']:
+            # Synthetic users own nothing but, at most, version and tombstone
+            # rows. A model delete would load every user and run
+            # signals.user_deleted's two deletes for each, so those rows go in
+            # bulk and the users are deleted without loading them
+            while synthetic.exists():
+                ids = list(synthetic.values_list('id', flat=True)[:options['batch_size']])
+                UserDataVersion.objects.filter(user_id__in=ids).delete()
+                Tombstone.objects.filter(user_id__in=ids).delete()
+                User.objects.filter(id__in=ids)._raw_delete(connection.alias)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results))
+            return
+
+        self.stdout.write(f"{results['users']} users on {results['vendor']} (seeded in {results['seed_seconds']}s)")
+        for query, row in results['queries'].items():
+            self.stdout.write(
+                f"  {query!r:10} {row['matches']:3} matches  p50 {row['p50_ms']:8.3f} ms  "
+                f"p95 {row['p95_ms']:8.3f} ms  max {row['max_ms']:8.3f} ms"
+            )
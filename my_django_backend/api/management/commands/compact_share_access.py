@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import ShareAccess
+
+
+class Command(BaseCommand):
+    help = "Delete raw share access rows older than the retention window; daily rollups keep their counts"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Keep raw rows for this many days (default: 90)")
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows deleted per statement (default: 5000)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        chunk_size = options['chunk_size']
+
+        # Every row was added to ShareAccessDaily when it was written (or by the
+        # backfill in migration 0007), so dropping raw rows loses no counts.
+        # Deleting in short id-bounded chunks keeps each transaction small.
+        expired = ShareAccess.objects.filter(accessed_at__lt=cutoff).order_by('id')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted += ShareAccess.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} share access rows older than {cutoff:%Y-%m-%d}"
+        ))
@@ -0,0 +1,30 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api import transfer
+
+
+class Command(BaseCommand):
+    help = "Stream a user's topics and cards as NDJSON to a file or stdout"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--output', '-o', help="File to write (default: stdout)")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip")
+        parser.add_argument('--chunk-size', type=int, default=transfer.EXPORT_CHUNK_SIZE, help="Rows read per query")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        out = open(options['output'], 'wb') if options['output'] else sys.stdout.buffer
+        try:
+            for block in transfer.export_stream(user, compress=options['gzip'], chunk_size=options['chunk_size']):
+                out.write(block)
+        finally:
+            if options['output']:
+                out.close()
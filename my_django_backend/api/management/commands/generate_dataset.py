@@ -0,0 +1,160 @@
+import math
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.models import COMPLETED_PROGRESS, Card, PeerEdge, PeerRelationship, Topic, TopicShare
+
+# Words the names and notes are drawn from, so full-text search has real terms
+# to match; bench_load searches for one of them
+WORDS = (
+    'python', 'django', 'postgres', 'index', 'query', 'cache', 'async', 'thread', 'queue', 'latency',
+    'throughput', 'schema', 'migration', 'serializer', 'render', 'token', 'session', 'cursor', 'pagination',
+    'search', 'ranking', 'vector', 'graph', 'tree', 'hash', 'sort', 'merge', 'stream', 'socket', 'protocol',
+    'compiler', 'parser', 'memory', 'profile', 'benchmark', 'deploy', 'docker', 'kernel', 'network', 'security',
+    'review', 'notes', 'chapter', 'lecture', 'exercise', 'project', 'practice', 'summary', 'example', 'design',
+)
+RESOURCES = ('https://docs.example.com/{}/{}', 'https://www.youtube.com/watch?v={}{}', 'Book: {} in depth, ch. {}')
+
+
+def sentence(rng, length):
+    """Roughly ``length`` characters of words from WORDS"""
+    words = rng.choices(WORDS, k=max(1, length // 7))
+    return ' '.join(words)[:length]
+
+
+def note_length(rng, mean):
+    """Note sizes are skewed like real ones: a fifth empty, the rest log-normal around ``mean``"""
+    if mean <= 0 or rng.random() < 0.2:
+        return 0
+    sigma = 1.0
+    return min(int(rng.lognormvariate(math.log(mean) - sigma ** 2 / 2, sigma)), 50 * mean)
+
+
+def build_cards(rng, topic, cards, note_size):
+    """``cards`` unsaved cards for ``topic``, with its counters set to match them"""
+    built = []
+    for position in range(cards):
+        roll = rng.random()
+        progress = 0 if roll < 0.3 else COMPLETED_PROGRESS if roll < 0.5 else rng.randint(1, COMPLETED_PROGRESS - 1)
+        card = Card(
+            topic=topic, name=sentence(rng, rng.randint(12, 60)).title(),
+            resource=rng.choice(RESOURCES).format(rng.choice(WORDS), position) if rng.random() < 0.7 else '',
+            note=sentence(rng, note_length(rng, note_size)), progress=progress, starred=rng.random() < 0.15,
+        )
+        built.append(card)
+        topic.card_count += 1
+        topic.completed_count += progress >= COMPLETED_PROGRESS
+        topic.starred_count += card.starred
+        topic.progress_sum += progress
+    return built
+
+
+class Command(BaseCommand):
+    help = "Generate a synthetic dataset of users, topics, cards, peers and shares for load tests (or --delete it)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--topics', type=int, default=20, help="Topics per user")
+        parser.add_argument('--cards', type=int, default=25, help="Cards per topic")
+        parser.add_argument('--note-size', type=int, default=600, help="Mean note length in characters")
+        parser.add_argument('--peers', type=int, default=10, help="Peer requests sent per user (a fifth stay pending)")
+        parser.add_argument('--share-fraction', type=float, default=0.3,
+                            help="Fraction of topics shared, each with up to 3 accepted peers")
+        parser.add_argument('--prefix', default='dataset-', help="Username prefix of the generated users")
+        parser.add_argument('--password', default='dataset-password', help="Password of every generated user")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible datasets")
+        parser.add_argument('--batch-size', type=int, default=2000, help="Rows per bulk insert")
+        parser.add_argument('--delete', action='store_true', help="Delete the users with --prefix and their data")
+
+    def handle(self, *args, **options):
+        prefix = options['prefix']
+        existing = User.objects.filter(username__startswith=prefix)
+        if options['delete']:
+            deleted = 0
+            ids = list(existing.values_list('id', flat=True))
+            # Deletes cascade through the same signals as user deletes in the
+            # API, so they run in chunks rather than one huge transaction
+            for start in range(0, len(ids), 100):
+                with transaction.atomic():
+                    User.objects.filter(id__in=ids[start:start + 100]).delete()
+                deleted += len(ids[start:start + 100])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} users with prefix {prefix!r}"))
+            return
+        if existing.exists():
+            raise CommandError(f"Users with prefix {prefix!r} already exist; run with --delete first")
+
+        started = time.perf_counter()
+        with transaction.atomic():
+            counts = self.generate(random.Random(options['seed']), options)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {counts['users']} users, {counts['topics']} topics, {counts['cards']} cards, "
+            f"{counts['relationships']} peer relationships and {counts['shares']} shares "
+            f"in {time.perf_counter() - started:.1f}s"
+        ))
+
+    def generate(self, rng, options):
+        batch_size = options['batch_size']
+        # bulk_create skips save() and the signals, so everything they would
+        # maintain (topic counters, peer edges) is written here directly. It
+        # also relies on inserts returning ids, as SQLite and PostgreSQL do.
+        password = make_password(options['password'])
+        users = User.objects.bulk_create([
+            User(username=f"{options['prefix']}{i}", email=f"{options['prefix']}{i}@example.com", password=password)
+            for i in range(options['users'])
+        ], batch_size=batch_size)
+
+        topics_by_user = {}
+        card_total = 0
+        per_chunk = max(1, batch_size // max(1, options['topics'] * options['cards']))
+        for start in range(0, len(users), per_chunk):
+            topics, cards = [], []
+            for user in users[start:start + per_chunk]:
+                for _ in range(options['topics']):
+                    topic = Topic(user=user, name=sentence(rng, rng.randint(8, 40)).title())
+                    cards += build_cards(rng, topic, options['cards'], options['note_size'])
+                    topics.append(topic)
+            Topic.objects.bulk_create(topics, batch_size=batch_size)
+            Card.objects.bulk_create(cards, batch_size=batch_size)
+            card_total += len(cards)
+            for topic in topics:
+                topics_by_user.setdefault(topic.user_id, []).append(topic.pk)
+
+        pairs = {}
+        for user in users:
+            drawn = rng.sample(users, min(options['peers'] + 1, len(users)))
+            for other in [other for other in drawn if other.pk != user.pk][:options['peers']]:
+                key = (min(user.pk, other.pk), max(user.pk, other.pk))
+                if key not in pairs:
+                    pairs[key] = PeerRelationship(
+                        requester=user, addressee=other, status='accepted' if rng.random() < 0.8 else 'pending'
+                    )
+        relationships = PeerRelationship.objects.bulk_create(list(pairs.values()), batch_size=batch_size)
+        accepted = [relationship for relationship in relationships if relationship.status == 'accepted']
+        PeerEdge.objects.bulk_create([
+            edge for relationship in accepted for edge in (
+                PeerEdge(user_id=relationship.requester_id, peer_id=relationship.addressee_id, relationship=relationship),
+                PeerEdge(user_id=relationship.addressee_id, peer_id=relationship.requester_id, relationship=relationship),
+            )
+        ], batch_size=batch_size)
+
+        peers_of = {}
+        for relationship in accepted:
+            peers_of.setdefault(relationship.requester_id, []).append(relationship.addressee_id)
+            peers_of.setdefault(relationship.addressee_id, []).append(relationship.requester_id)
+        shares = [
+            TopicShare(topic_id=topic_id, owner_id=owner_id, peer_id=peer_id)
+            for owner_id, topic_ids in topics_by_user.items() if peers_of.get(owner_id)
+            for topic_id in topic_ids if rng.random() < options['share_fraction']
+            for peer_id in rng.sample(peers_of[owner_id], min(rng.randint(1, 3), len(peers_of[owner_id])))
+        ]
+        TopicShare.objects.bulk_create(shares, batch_size=batch_size)
+
+        return {
+            'users': len(users), 'topics': sum(map(len, topics_by_user.values())), 'cards': card_total,
+            'relationships': len(relationships), 'shares': len(shares),
+        }
@@ -0,0 +1,36 @@
+import sys
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api import transfer
+
+
+class Command(BaseCommand):
+    help = "Load an NDJSON export (plain or gzip) into a user's account as new topics and cards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('username')
+        parser.add_argument('--input', '-i', help="File to read (default: stdin)")
+        parser.add_argument('--chunk-size', type=int, default=transfer.EXPORT_CHUNK_SIZE, help="Rows per bulk insert")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"User {options['username']!r} does not exist")
+
+        source = open(options['input'], 'rb') if options['input'] else sys.stdin.buffer
+        started = time.perf_counter()
+        try:
+            counts = transfer.import_lines(user, transfer.open_import(source), chunk_size=options['chunk_size'])
+        except (transfer.TransferError, OSError, EOFError) as exc:
+            raise CommandError(f"Import failed, nothing was loaded: {exc}")
+        finally:
+            if options['input']:
+                source.close()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {counts['topics']} topics and {counts['cards']} cards in {time.perf_counter() - started:.1f}s"
+        ))
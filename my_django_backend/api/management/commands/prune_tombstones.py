@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from api.models import Tombstone
+from api.sync import tombstone_retention
+
+
+class Command(BaseCommand):
+    help = "Delete sync tombstones older than SYNC_TOMBSTONE_DAYS; older cursors are refused anyway"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000, help="Rows deleted per statement (default: 5000)")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - tombstone_retention()
+        chunk_size = options['chunk_size']
+
+        expired = Tombstone.objects.filter(deleted_at__lt=cutoff).order_by('id')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:chunk_size])
+            if not ids:
+                break
+            deleted += Tombstone.objects.filter(id__in=ids).delete()[0]
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Deleted {deleted} tombstones older than {cutoff:%Y-%m-%d}"
+        ))
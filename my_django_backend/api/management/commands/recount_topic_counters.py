@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from api.counters import COUNTER_FIELDS, recount
+from api.models import Topic
+
+
+class Command(BaseCommand):
+    help = "Recompute the stored card counters of topics from their cards and fix any that drifted"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--topic', type=int, nargs='+', dest='topic_ids', help="Only recount these topic ids")
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Topics recounted per transaction (default: 1000)")
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted topics without fixing them")
+
+    def handle(self, *args, **options):
+        topics = Topic.objects.order_by('id')
+        if options['topic_ids']:
+            topics = topics.filter(id__in=options['topic_ids'])
+
+        checked = drifted = 0
+        last_id = 0
+        while True:
+            # Locking the topics holds off card writes' F() updates on them
+            # until their recomputed counters are stored
+            with transaction.atomic():
+                chunk = list(
+                    topics.filter(id__gt=last_id).select_for_update().only('id', *COUNTER_FIELDS)[:options['chunk_size']]
+                )
+                if not chunk:
+                    break
+                fixed = recount(chunk, dry_run=options['dry_run'])
+            for topic in fixed:
+                self.stdout.write(f"  topic {topic.id}: " + ', '.join(f"{field}={getattr(topic, field)}" for field in COUNTER_FIELDS))
+            checked += len(chunk)
+            drifted += len(fixed)
+            last_id = chunk[-1].id
+
+        verb = "would fix" if options['dry_run'] else "fixed"
+        self.stdout.write(self.style.SUCCESS(f"Checked {checked} topics, {verb} {drifted}"))
@@ -0,0 +1,62 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, Max, Sum
+from django.utils import timezone
+
+from api.models import SlowQuery
+
+
+class Command(BaseCommand):
+    help = "Report the slowest captured queries grouped by fingerprint, with their views and latest plan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10, help="Fingerprints to show (default: 10)")
+        parser.add_argument('--hours', type=float, help="Only queries captured in the last N hours")
+        parser.add_argument('--order', choices=['total', 'count', 'max'], default='total',
+                            help="Rank by total time, occurrences or worst duration (default: total)")
+        parser.add_argument('--json', action='store_true', help="Print machine-readable results only")
+
+    def handle(self, *args, **options):
+        captured = SlowQuery.objects.all()
+        if options['hours']:
+            captured = captured.filter(captured_at__gte=timezone.now() - timedelta(hours=options['hours']))
+
+        groups = list(captured.values('fingerprint').annotate(
+            count=Count('id'), total=Sum('duration_ms'), avg=Avg('duration_ms'), max=Max('duration_ms'),
+            last_seen=Max('captured_at'),
+        ).order_by(f"-{options['order']}", 'fingerprint')[:options['top']])
+
+        report = []
+        for group in groups:
+            rows = captured.filter(fingerprint=group['fingerprint'])
+            latest = rows.order_by('-id').values('sql').first()
+            planned = rows.exclude(plan='').order_by('-id').values_list('plan', flat=True).first()
+            report.append({
+                'fingerprint': group['fingerprint'],
+                'count': group['count'],
+                'total_ms': round(group['total'], 1),
+                'avg_ms': round(group['avg'], 1),
+                'max_ms': round(group['max'], 1),
+                'last_seen': group['last_seen'].isoformat(),
+                'views': sorted(set(rows.exclude(view='').values_list('view', flat=True))),
+                'sql': latest['sql'],
+                'plan': planned or '',
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report))
+            return
+        if not report:
+            self.stdout.write("No slow queries captured")
+            return
+        for rank, entry in enumerate(report, 1):
+            self.stdout.write(self.style.WARNING(
+                f"{rank}. {entry['fingerprint']}  {entry['count']}x  total {entry['total_ms']:,.1f} ms  "
+                f"avg {entry['avg_ms']:,.1f} ms  max {entry['max_ms']:,.1f} ms"
+            ))
+            self.stdout.write(f"   views: {', '.join(entry['views']) or '-'}")
+            self.stdout.write(f"   sql:   {entry['sql']}")
+            for line in (entry['plan'] or 'no plan captured').splitlines():
+                self.stdout.write(f"   plan:  {line}")
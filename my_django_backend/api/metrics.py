@@ -0,0 +1,292 @@
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+from . import cache
+
+# Per-route request metrics, aggregated in this process and exposed in the
+# Prometheus text format by /api/metrics/. Each worker process keeps its own
+# counts, so scrape every worker (or run one) to see all traffic.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+UNMATCHED = 'unmatched'
+
+# The timing of the sampled request being served. A context variable rather
+# than a per-request execute wrapper, so the queries async views run on
+# sync_to_async threads are counted too: the context follows them there.
+_current = ContextVar('request_timing', default=None)
+
+
+def sample_rate():
+    """Fraction of requests measured; 0 turns the middleware into a pass-through"""
+    return getattr(settings, 'METRICS_SAMPLE_RATE', 1.0)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as Prometheus expects it"""
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def buckets(self):
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            yield bound, total
+
+
+class RouteStats:
+    """Everything recorded for one (view, method) pair"""
+    __slots__ = ('latency', 'queries', 'db', 'app', 'render', 'statuses')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.db = 0.0
+        self.app = 0.0
+        self.render = 0.0
+        self.statuses = {}
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes = {}
+
+    def record(self, view, method, status_code, timing):
+        with self._lock:
+            stats = self._routes.get((view, method))
+            if stats is None:
+                stats = self._routes[(view, method)] = RouteStats()
+            stats.latency.observe(timing.total)
+            stats.queries.observe(timing.queries)
+            stats.db += timing.db
+            stats.app += timing.app
+            stats.render += timing.render
+            stats.statuses[status_code] = stats.statuses.get(status_code, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._routes.clear()
+
+    def export(self):
+        """Every metric in the Prometheus text exposition format"""
+        with self._lock:
+            routes = sorted(self._routes.items())
+            lines = []
+            _histogram(lines, 'trackreso_request_duration_seconds', "Request latency by view",
+                       [(labels, stats.latency) for labels, stats in routes])
+            _histogram(lines, 'trackreso_db_queries', "SQL queries per request by view",
+                       [(labels, stats.queries) for labels, stats in routes])
+            for name, attribute, description in (
+                ('trackreso_db_duration_seconds_total', 'db', "Time spent in SQL queries"),
+                ('trackreso_app_duration_seconds_total', 'app',
+                 "Time spent in views, serializers included, other than SQL"),
+                ('trackreso_render_duration_seconds_total', 'render', "Time spent rendering response bodies"),
+            ):
+                lines += [f'# HELP {name} {description}', f'# TYPE {name} counter']
+                lines += [f'{name}{_labels(labels)} {getattr(stats, attribute):.6f}' for labels, stats in routes]
+            lines += ['# HELP trackreso_responses_total Responses by view and status',
+                      '# TYPE trackreso_responses_total counter']
+            lines += [
+                f'trackreso_responses_total{_labels(labels, status=code)} {count}'
+                for labels, stats in routes for code, count in sorted(stats.statuses.items())
+            ]
+
+        lines += ['# HELP trackreso_response_cache_total Response cache lookups',
+                  '# TYPE trackreso_response_cache_total counter']
+        lines += [
+            f'trackreso_response_cache_total{{outcome="{outcome}"}} {count}'
+            for outcome, count in sorted(cache.cache_stats().items())
+        ]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(route, **extra):
+    view, method = route
+    pairs = [('view', view), ('method', method), *extra.items()]
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _histogram(lines, name, description, series):
+    lines += [f'# HELP {name} {description}', f'# TYPE {name} histogram']
+    for route, histogram in series:
+        for bound, count in histogram.buckets():
+            lines.append(f'{name}_bucket{_labels(route, le=bound)} {count}')
+        lines.append(f'{name}_sum{_labels(route)} {histogram.sum:.6f}')
+        lines.append(f'{name}_count{_labels(route)} {histogram.count}')
+
+
+registry = Registry()
+
+
+def _observe(execute, sql, params, many, context):
+    """Execute wrapper on every connection, timing queries run for a sampled request"""
+    timing = _current.get()
+    if timing is None:
+        return execute(sql, params, many, context)
+    return timing(execute, sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver; wrappers outlive reconnects, so add it once"""
+    if _observe not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe)
+
+
+connection_created.connect(install)
+
+
+@contextmanager
+def uncounted():
+    """Leave the instrumentation's own queries (slow query plans, profiles) out of the request's figures"""
+    token = _current.set(None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+class RequestTiming:
+    """
+    Clock readings for one sampled request. SQL is timed by a database
+    execute wrapper. App time is derived, not measured: the view's own time
+    less its SQL, which covers the serializers and anything else it runs.
+    """
+    __slots__ = ('started', 'queries', 'db', 'view_started', 'view_db', 'view_ended', 'render_db',
+                 'rendered', 'total', 'app', 'render')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db = 0.0
+        self.view_started = self.view_ended = self.rendered = None
+        self.view_db = self.render_db = 0.0
+        self.total = self.app = self.render = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+    def view_called(self):
+        self.view_started = time.perf_counter()
+        self.view_db = self.db
+
+    def view_returned(self):
+        self.view_ended = time.perf_counter()
+        self.render_db = self.db
+
+    def response_rendered(self, response):
+        self.rendered = time.perf_counter()
+
+    def finish(self):
+        now = time.perf_counter()
+        self.total = now - self.started
+        if self.view_started is not None:
+            if self.view_ended is None:  # Not a template response: nothing rendered later
+                self.view_returned()
+            self.app = max(self.view_ended - self.view_started - (self.render_db - self.view_db), 0.0)
+        if self.rendered is not None:
+            self.render = max(self.rendered - self.view_ended - (self.db - self.render_db), 0.0)
+
+    def server_timing(self):
+        return (
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries", '
+            f'app;dur={self.app * 1000:.2f};desc="view less SQL", '
+            f'render;dur={self.render * 1000:.2f}, '
+            f'total;dur={self.total * 1000:.2f}'
+        )
+
+
+def _route(request):
+    match = getattr(request, 'resolver_match', None)
+    return (match.view_name if match is not None else UNMATCHED), request.method
+
+
+class RequestMetricsMiddleware:
+    """
+    Time a sample of requests: SQL count and time, app time (the view less
+    its SQL) and render time, recorded per view and sent back in a
+    Server-Timing header. Unsampled requests pass straight through.
+
+    Async views (ASGI) are timed the same way, SQL included.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return self.get_response(request)
+
+        timing = request._metrics = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    async def __acall__(self, request):
+        rate = sample_rate()
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return await self.get_response(request)
+
+        timing = request._metrics = RequestTiming()
+        token = _current.set(timing)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, timing)
+
+    def finish(self, request, response, timing):
+        timing.finish()
+        registry.record(*_route(request), response.status_code, timing)
+        response['Server-Timing'] = timing.server_timing()
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timing = getattr(request, '_metrics', None)
+        if timing is not None:
+            timing.view_called()
+
+    def process_template_response(self, request, response):
+        # DRF responses render right after this hook returns
+        timing = getattr(request, '_metrics', None)
+        if timing is not None:
+            timing.view_returned()
+            response.add_post_render_callback(timing.response_rendered)
+        return response
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:33
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_userdataversion'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shareaccess',
+            name='accessed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:34
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def backfill_daily_rollups(apps, schema_editor):
+    """Roll up the access log written before the daily table existed"""
+    ShareAccess = apps.get_model('api', 'ShareAccess')
+    ShareAccessDaily = apps.get_model('api', 'ShareAccessDaily')
+
+    totals = (
+        ShareAccess.objects
+        .annotate(day=TruncDate('accessed_at'))
+        .values('topic_share_id', 'day', 'access_type')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+    ShareAccessDaily.objects.bulk_create(
+        (ShareAccessDaily(**row) for row in totals.iterator(chunk_size=2000)),
+        batch_size=2000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_shareaccess_accessed_at_default'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='shareaccess',
+            name='accessed_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.CreateModel(
+            name='ShareAccessDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('access_type', models.CharField(choices=[('view_topic', 'View Topic'), ('view_card', 'View Card')], default='view_topic', max_length=20)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('topic_share', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_access', to='api.topicshare')),
+            ],
+            options={
+                'unique_together': {('topic_share', 'day', 'access_type')},
+            },
+        ),
+        migrations.RunPython(backfill_daily_rollups, migrations.RunPython.noop),
+    ]
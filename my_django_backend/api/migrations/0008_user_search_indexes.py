@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.db import migrations
+
+# Trigram index for substring search and a btree for prefix search, both on
+# UPPER(username) because that is what icontains/istartswith compile to.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS api_user_username_trgm ON auth_user USING gin (UPPER(username) gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS api_user_username_prefix ON auth_user (UPPER(username) text_pattern_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS api_user_username_prefix",
+    "DROP INDEX IF EXISTS api_user_username_trgm",
+]
+
+# SQLite equivalent: an external-content FTS5 table with the trigram tokenizer,
+# kept in sync with auth_user by triggers, plus a NOCASE index for prefixes.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_user_username_trgm USING fts5("
+    "username, content='auth_user', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS api_user_username_trgm_ai AFTER INSERT ON auth_user BEGIN "
+    "INSERT INTO api_user_username_trgm(rowid, username) VALUES (new.id, new.username); END",
+    "CREATE TRIGGER IF NOT EXISTS api_user_username_trgm_ad AFTER DELETE ON auth_user BEGIN "
+    "INSERT INTO api_user_username_trgm(api_user_username_trgm, rowid, username) VALUES ('delete', old.id, old.username); END",
+    "CREATE TRIGGER IF NOT EXISTS api_user_username_trgm_au AFTER UPDATE OF username ON auth_user BEGIN "
+    "INSERT INTO api_user_username_trgm(api_user_username_trgm, rowid, username) VALUES ('delete', old.id, old.username); "
+    "INSERT INTO api_user_username_trgm(rowid, username) VALUES (new.id, new.username); END",
+    "INSERT INTO api_user_username_trgm(api_user_username_trgm) VALUES ('rebuild')",
+    "CREATE INDEX IF NOT EXISTS api_user_username_nocase ON auth_user (username COLLATE NOCASE)",
+]
+SQLITE_BACKWARD = [
+    "DROP INDEX IF EXISTS api_user_username_nocase",
+    "DROP TRIGGER IF EXISTS api_user_username_trgm_au",
+    "DROP TRIGGER IF EXISTS api_user_username_trgm_ad",
+    "DROP TRIGGER IF EXISTS api_user_username_trgm_ai",
+    "DROP TABLE IF EXISTS api_user_username_trgm",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_shareaccessdaily'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
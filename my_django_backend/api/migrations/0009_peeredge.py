@@ -0,0 +1,45 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:42
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_edges(apps, schema_editor):
+    """Create both directed edges for every already accepted relationship"""
+    PeerRelationship = apps.get_model('api', 'PeerRelationship')
+    PeerEdge = apps.get_model('api', 'PeerEdge')
+
+    accepted = PeerRelationship.objects.filter(status='accepted').values_list('id', 'requester_id', 'addressee_id')
+    batch = []
+    for relationship_id, requester_id, addressee_id in accepted.iterator(chunk_size=2000):
+        batch.append(PeerEdge(user_id=requester_id, peer_id=addressee_id, relationship_id=relationship_id))
+        batch.append(PeerEdge(user_id=addressee_id, peer_id=requester_id, relationship_id=relationship_id))
+        if len(batch) >= 2000:
+            PeerEdge.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    PeerEdge.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_user_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PeerEdge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('peer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('relationship', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='edges', to='api.peerrelationship')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='peer_edges', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'peer')},
+            },
+        ),
+        migrations.RunPython(backfill_edges, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.1.6 on 2026-10-18 06:48
+
+from django.db import migrations, models
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill_counters(apps, schema_editor):
+    """Compute every topic's counters from its cards in one UPDATE"""
+    Topic = apps.get_model('api', 'Topic')
+    Card = apps.get_model('api', 'Card')
+
+    def per_topic(aggregate):
+        cards = Card.objects.filter(topic=OuterRef('pk')).order_by().values('topic')
+        return Coalesce(Subquery(cards.annotate(value=aggregate).values('value')), 0, output_field=IntegerField())
+
+    Topic.objects.update(
+        card_count=per_topic(Count('id')),
+        completed_count=per_topic(Count('id', filter=Q(progress__gte=100))),
+        starred_count=per_topic(Count('id', filter=Q(starred=True))),
+        progress_sum=per_topic(Sum('progress')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_peeredge'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='topic',
+            name='card_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='completed_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='progress_sum',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='topic',
+            name='starred_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_counters, migrations.RunPython.noop),
+    ]
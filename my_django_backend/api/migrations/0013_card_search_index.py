@@ -0,0 +1,60 @@
+from django.db import migrations
+
+# Full-text index over card names, resources and notes, weighted in that
+# order. On PostgreSQL a stored generated tsvector column, so every card
+# write updates it, with a GIN index; the model does not declare the column.
+POSTGRES_FORWARD = [
+    "ALTER TABLE api_card ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(name, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(resource, '')), 'B') || "
+    "setweight(to_tsvector('english', coalesce(note, '')), 'C')) STORED",
+    "CREATE INDEX IF NOT EXISTS api_card_search_vector ON api_card USING gin (search_vector)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS api_card_search_vector",
+    "ALTER TABLE api_card DROP COLUMN IF EXISTS search_vector",
+]
+
+# SQLite equivalent: an external-content FTS5 table with the porter stemmer,
+# kept in sync with api_card by triggers like the username index in 0008.
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS api_card_fts USING fts5("
+    "name, resource, note, content='api_card', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS api_card_fts_ai AFTER INSERT ON api_card BEGIN "
+    "INSERT INTO api_card_fts(rowid, name, resource, note) VALUES (new.id, new.name, new.resource, new.note); END",
+    "CREATE TRIGGER IF NOT EXISTS api_card_fts_ad AFTER DELETE ON api_card BEGIN "
+    "INSERT INTO api_card_fts(api_card_fts, rowid, name, resource, note) "
+    "VALUES ('delete', old.id, old.name, old.resource, old.note); END",
+    "CREATE TRIGGER IF NOT EXISTS api_card_fts_au AFTER UPDATE OF name, resource, note ON api_card BEGIN "
+    "INSERT INTO api_card_fts(api_card_fts, rowid, name, resource, note) "
+    "VALUES ('delete', old.id, old.name, old.resource, old.note); "
+    "INSERT INTO api_card_fts(rowid, name, resource, note) VALUES (new.id, new.name, new.resource, new.note); END",
+    "INSERT INTO api_card_fts(api_card_fts) VALUES ('rebuild')",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS api_card_fts_au",
+    "DROP TRIGGER IF EXISTS api_card_fts_ad",
+    "DROP TRIGGER IF EXISTS api_card_fts_ai",
+    "DROP TABLE IF EXISTS api_card_fts",
+]
+
+
+def run_for_vendor(statements):
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0011_sync_tombstones'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_for_vendor({'postgresql': POSTGRES_FORWARD, 'sqlite': SQLITE_FORWARD}),
+            run_for_vendor({'postgresql': POSTGRES_BACKWARD, 'sqlite': SQLITE_BACKWARD}),
+        ),
+    ]
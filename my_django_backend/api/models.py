@@ -1,13 +1,43 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+COMPLETED_PROGRESS = 100  # Cards at or above this progress count as completed
+
+
+class CreatedAtField(models.DateTimeField):
+    """
+    auto_now_add that keeps a value the instance was created with, so an
+    import can bulk_create rows with their exported timestamps in one write.
+    Nothing else sets it, and it stays read-only in forms and serializers.
+    """
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.attname)
+        if add and value is not None:
+            return value
+        return super().pre_save(model_instance, add)
+
+    def deconstruct(self):
+        # Migrations see a plain DateTimeField: the column is the same
+        name, path, args, kwargs = super().deconstruct()
+        return name, 'django.db.models.DateTimeField', args, kwargs
+
 
 class Topic(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, db_index=True)  # Index for user filtering
     name = models.CharField(max_length=255, db_index=True)  # Index for search/sorting
     collapsed = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)  # Index for ordering
+    created_at = CreatedAtField(auto_now_add=True, db_index=True)  # Index for ordering
     updated_at = models.DateTimeField(auto_now=True)
+    # Card totals kept current by api.counters on every card write
+    card_count = models.IntegerField(default=0)
+    completed_count = models.IntegerField(default=0)
+    starred_count = models.IntegerField(default=0)
+    progress_sum = models.BigIntegerField(default=0)
+
+    COUNTER_FIELDS = ('card_count', 'completed_count', 'starred_count', 'progress_sum')
 
     class Meta:
         ordering = ['-created_at']
@@ -19,6 +49,21 @@ class Topic(models.Model):
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        # Counters only change through F() updates; writing back the loaded
+        # values would undo card writes that landed since this topic was read
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            skipped = set(self.COUNTER_FIELDS) | self.get_deferred_fields()
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in skipped
+            ]
+        super().save(*args, **kwargs)
+
+    @property
+    def average_progress(self):
+        return self.progress_sum / self.card_count if self.card_count else 0.0
+
 class Card(models.Model):
     topic = models.ForeignKey('Topic', related_name='cards', on_delete=models.CASCADE, db_index=True)
     name = models.CharField(max_length=255, db_index=True)  # Index for search
@@ -27,7 +72,7 @@ class Card(models.Model):
     progress = models.IntegerField(default=0, db_index=True)  # Index for filtering by progress
     starred = models.BooleanField(default=False, db_index=True)  # Index for filtering starred
     collapsed = models.BooleanField(default=True)
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    created_at = CreatedAtField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
@@ -41,6 +86,19 @@ class Card(models.Model):
     def __str__(self):
         return f"{self.name} ({self.topic.name})"
 
+    def save(self, *args, **kwargs):
+        # The counter receivers lock and read the stored row before the write
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            # Decrement the topic counters by the stored values, not stale in-memory ones
+            stored = Card.objects.select_for_update().filter(pk=self.pk).values('topic_id', 'progress', 'starred').first()
+            if stored is not None:
+                self.topic_id, self.progress, self.starred = stored['topic_id'], stored['progress'], stored['starred']
+            return super().delete(*args, **kwargs)
+
 class PeerRelationship(models.Model):
     STATUS_CHOICES = [
         ('pending', 'Pending'),
@@ -67,9 +125,41 @@ class PeerRelationship(models.Model):
         if self.requester == self.addressee:
             raise ValidationError("Users cannot add themselves as peers")
     
+    def save(self, *args, **kwargs):
+        # Edges change in the same transaction as the status they mirror
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_edges()
+    
+    def sync_edges(self):
+        """Keep one PeerEdge per direction while the relationship is accepted, none otherwise"""
+        if self.status == 'accepted':
+            PeerEdge.objects.bulk_create([
+                PeerEdge(user_id=self.requester_id, peer_id=self.addressee_id, relationship=self),
+                PeerEdge(user_id=self.addressee_id, peer_id=self.requester_id, relationship=self),
+            ], ignore_conflicts=True)
+        else:
+            self.edges.all().delete()
+    
     def __str__(self):
         return f"{self.requester.username} -> {self.addressee.username} ({self.status})"
 
+class PeerEdge(models.Model):
+    """
+    Directed copy of an accepted PeerRelationship, stored once per side.
+    "Is X my peer" and "list my peers" become lookups on (user, peer) instead
+    of OR conditions over requester and addressee.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='peer_edges')
+    peer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    relationship = models.ForeignKey(PeerRelationship, on_delete=models.CASCADE, related_name='edges')
+    
+    class Meta:
+        unique_together = ('user', 'peer')  # Index used for both peer checks and peer listings
+    
+    def __str__(self):
+        return f"{self.user_id} <-> {self.peer_id}"
+
 class TopicShare(models.Model):
     PERMISSION_CHOICES = [
         ('read_only', 'Read Only'),
@@ -81,6 +171,7 @@ class TopicShare(models.Model):
     permission_level = models.CharField(max_length=20, choices=PERMISSION_CHOICES, default='read_only')
     shared_at = models.DateTimeField(auto_now_add=True, db_index=True)
     is_active = models.BooleanField(default=True, db_index=True)
+    updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = ('topic', 'peer')
@@ -106,8 +197,80 @@ class ShareAccess(models.Model):
     ]
     
     topic_share = models.ForeignKey(TopicShare, on_delete=models.CASCADE, related_name='access_logs')
-    accessed_at = models.DateTimeField(auto_now_add=True)
+    accessed_at = models.DateTimeField(default=timezone.now, db_index=True)  # Set when the access happened; indexed for retention
     access_type = models.CharField(max_length=20, choices=ACCESS_TYPE_CHOICES, default='view_topic')
     
     def __str__(self):
         return f"{self.topic_share.peer.username} accessed {self.topic_share.topic.name}"
+
+class ShareAccessDaily(models.Model):
+    """Per-day access counts of a topic share, kept up to date as access events are written"""
+    topic_share = models.ForeignKey(TopicShare, on_delete=models.CASCADE, related_name='daily_access')
+    day = models.DateField()
+    access_type = models.CharField(max_length=20, choices=ShareAccess.ACCESS_TYPE_CHOICES, default='view_topic')
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        unique_together = ('topic_share', 'day', 'access_type')  # Also serves share + date range lookups
+
+    def __str__(self):
+        return f"{self.topic_share_id} {self.day} {self.access_type}: {self.count}"
+
+class UserDataVersion(models.Model):
+    """Per-user counter bumped on every write that changes data visible to that user"""
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} @ {self.version}"
+
+class Tombstone(models.Model):
+    """A row that was deleted, or stopped being visible, recorded once per user who could see it"""
+    KIND_CHOICES = [
+        ('topic', 'Topic'),
+        ('card', 'Card'),
+        ('share', 'Topic Share'),
+        ('peer', 'Peer Relationship'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now, db_index=True)  # Indexed for retention
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at']),  # For a user's deletions since a sync cursor
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} for {self.user_id}"
+
+class SlowQuery(models.Model):
+    """A query that ran slower than SLOW_QUERY_THRESHOLD_MS, with its plan; only the newest SLOW_QUERY_MAX_ROWS are kept"""
+    fingerprint = models.CharField(max_length=16, db_index=True)  # Hash of the normalized SQL
+    sql = models.TextField()  # Normalized: literals and placeholders replaced by ?
+    view = models.CharField(max_length=200, blank=True)  # e.g. TopicViewSet.list
+    duration_ms = models.FloatField()
+    plan = models.TextField(blank=True)  # Empty when the fingerprint was explained recently
+    captured_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.fingerprint} {self.duration_ms:.1f}ms in {self.view or '?'}"
+
+class RequestProfile(models.Model):
+    """cProfile output of one request a staff user asked to profile; old and surplus rows are pruned"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='request_profiles')
+    method = models.CharField(max_length=10)
+    path = models.CharField(max_length=500)
+    view = models.CharField(max_length=200, blank=True)  # e.g. TopicViewSet.list
+    status_code = models.PositiveSmallIntegerField()
+    duration_ms = models.FloatField()
+    stats = models.BinaryField()  # zlib-compressed marshal dump, as written by cProfile's dump_stats
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)  # Indexed for retention
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"{self.method} {self.path} ({self.duration_ms:.0f}ms)"
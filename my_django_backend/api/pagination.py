@@ -0,0 +1,38 @@
+from rest_framework.pagination import CursorPagination
+
+
+class OptionalCursorPagination(CursorPagination):
+    """
+    Keyset pagination that only kicks in when the client asks for it.
+
+    Requests without ``page_size`` or ``cursor`` keep the original unpaginated
+    list response, so existing clients continue to receive plain arrays.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def get_page_size(self, request):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        return super().get_page_size(request)
+
+
+class TopicCursorPagination(OptionalCursorPagination):
+    # Walks the (user, -created_at) index on Topic; id breaks ties between rows
+    # created in the same instant (bulk imports), so pages never skip or repeat them
+    ordering = ('-created_at', '-id')
+
+
+class CardCursorPagination(OptionalCursorPagination):
+    # Walks the (topic, -created_at) index on Card in reverse, id breaking ties
+    ordering = ('created_at', 'id')
+
+
+class TopicCardsPagination(CardCursorPagination):
+    """Always-on pagination for the /topics/{id}/cards/ sub-resource"""
+    page_size = 100
+
+    def get_page_size(self, request):
+        return CursorPagination.get_page_size(self, request)
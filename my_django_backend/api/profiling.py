@@ -0,0 +1,126 @@
+import cProfile
+import io
+import logging
+import marshal
+import pstats
+import time
+import zlib
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from . import metrics
+from .async_views import jwt_user
+from .models import RequestProfile
+from .slow_queries import call_site
+
+logger = logging.getLogger(__name__)
+
+# A staff user profiles one request by sending "X-Profile: 1" or ?profile=1;
+# the cProfile stats are stored as a RequestProfile and served by
+# /api/profiles/. Requests without the flag only pay for the flag lookup.
+HEADER = 'X-Profile'
+QUERY_PARAMETER = 'profile'
+TRUE_VALUES = ('1', 'true', 'yes')
+
+
+def requested(request):
+    return (request.headers.get(HEADER, '').lower() in TRUE_VALUES
+            or request.GET.get(QUERY_PARAMETER, '').lower() in TRUE_VALUES)
+
+
+def staff_user(request):
+    """The staff user behind the request's session or Bearer JWT, or None"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        user = jwt_user(request)
+    return user if user is not None and user.is_active and user.is_staff else None
+
+
+def dump(profiler):
+    """``profiler``'s stats compressed, in the format pstats and snakeviz read once decompressed"""
+    profiler.create_stats()
+    return zlib.compress(marshal.dumps(profiler.stats))
+
+
+class _Loaded:
+    """A stored profile in the shape pstats.Stats accepts"""
+
+    def __init__(self, data):
+        self.stats = marshal.loads(zlib.decompress(data))
+
+    def create_stats(self):
+        pass
+
+
+def raw_stats(profile):
+    return zlib.decompress(bytes(profile.stats))
+
+
+def report(profile, sort='cumulative', limit=50):
+    """pstats' text report of a stored profile"""
+    stream = io.StringIO()
+    stats = pstats.Stats(_Loaded(bytes(profile.stats)), stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return stream.getvalue()
+
+
+def prune():
+    """Drop profiles older than PROFILE_RETENTION_DAYS and all but the newest PROFILE_MAX_ROWS"""
+    RequestProfile.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=getattr(settings, 'PROFILE_RETENTION_DAYS', 7))
+    ).delete()
+    surplus = RequestProfile.objects.order_by('-created_at', '-id').values_list('id', flat=True)[
+        getattr(settings, 'PROFILE_MAX_ROWS', 50):
+    ]
+    RequestProfile.objects.filter(id__in=list(surplus)).delete()
+
+
+class ProfilingMiddleware:
+    """
+    Run flagged requests of staff users under cProfile, store the profile and
+    return its id in an X-Profile-Id header. Flags from anyone else are
+    ignored, and async views are never profiled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async or not requested(request):
+            return self.get_response(request)
+        with metrics.uncounted():
+            user = staff_user(request)
+        if user is None:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        duration = time.perf_counter() - started
+
+        try:
+            with metrics.uncounted(), transaction.atomic():
+                profile = RequestProfile.objects.create(
+                    user=user, method=request.method, path=request.get_full_path()[:500],
+                    view=call_site(request)[:200], status_code=response.status_code,
+                    duration_ms=round(duration * 1000, 3), stats=dump(profiler),
+                )
+                prune()
+        except DatabaseError:
+            logger.warning("Could not store the profile of %s", request.path, exc_info=True)
+            return response
+        response['X-Profile-Id'] = str(profile.pk)
+        return response
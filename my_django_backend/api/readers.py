@@ -0,0 +1,200 @@
+from collections import defaultdict
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import ManyToOneRel
+from rest_framework import ISO_8601, serializers
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+# Field types whose to_representation() returns database values unchanged
+PLAIN_FIELDS = (
+    serializers.IntegerField, serializers.CharField, serializers.BooleanField,
+    serializers.ChoiceField, serializers.ReadOnlyField, PrimaryKeyRelatedField,
+)
+# Field types converted with the bound field's own to_representation()
+CONVERTED_FIELDS = (serializers.DateTimeField, serializers.FloatField, serializers.DecimalField)
+
+VALUE, ONE, MANY = range(3)
+
+
+def _datetime_converter(field):
+    """``field.to_representation`` with the output format and timezone resolved once instead of per value"""
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    field_timezone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+    if output_format is None or output_format.lower() != ISO_8601 or field_timezone is None:
+        return field.to_representation
+
+    def convert(value):
+        if value.tzinfo is None:
+            return field.to_representation(value)
+        try:
+            text = value.astimezone(field_timezone).isoformat()
+        except OverflowError:
+            return field.to_representation(value)
+        return text[:-6] + 'Z' if text.endswith('+00:00') else text
+    return convert
+
+
+class Unsupported(Exception):
+    """The serializer uses a field the values() reader cannot reproduce exactly"""
+
+
+class ValuesReader:
+    """
+    Produce a ModelSerializer's read output from values() rows.
+
+    The plan is compiled once from the serializer's (already projected) fields;
+    rendering is then plain dict building per row, with nested many=True
+    serializers read in one query per page and grouped by their foreign key.
+    Output matches ``serializer.data`` exactly, and field types outside
+    PLAIN_FIELDS/CONVERTED_FIELDS raise Unsupported at compile time.
+    """
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        opts = self.model._meta
+        self.pk = prefix + opts.pk.name
+        # Ordering columns are selected too so cursor pagination can read them
+        self.columns = {self.pk} | {prefix + name.lstrip('-') for name in opts.ordering}
+        self.entries = []
+
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            if isinstance(field, serializers.ListSerializer):
+                if prefix:
+                    raise Unsupported(name)
+                relation = self._model_field(field.source)
+                if not isinstance(relation, ManyToOneRel):
+                    raise Unsupported(name)
+                self.entries.append((MANY, name, ValuesReader(field.child), relation.field.name))
+            elif isinstance(field, serializers.ModelSerializer):
+                if prefix or not getattr(self._model_field(field.source), 'many_to_one', False):
+                    raise Unsupported(name)
+                nested = ValuesReader(field, prefix=f'{field.source}__')
+                if any(kind != VALUE for kind, *_ in nested.entries):
+                    raise Unsupported(name)
+                self.columns |= nested.columns
+                self.entries.append((ONE, name, nested, nested.pk))
+            elif isinstance(field, PLAIN_FIELDS + CONVERTED_FIELDS):
+                model_field = self._model_field(field.source)
+                if model_field is None or not model_field.concrete:
+                    raise Unsupported(name)
+                column = prefix + field.source
+                convert = None
+                if isinstance(field, serializers.DateTimeField):
+                    convert = _datetime_converter(field)
+                elif isinstance(field, CONVERTED_FIELDS):
+                    convert = field.to_representation
+                self.columns.add(column)
+                self.entries.append((VALUE, name, column, convert))
+            else:
+                raise Unsupported(name)
+
+    def _model_field(self, source):
+        try:
+            return self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            return None
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """A reader for ``serializer`` (or its child when many=True), or None if it is unsupported"""
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        try:
+            return cls(serializer)
+        except Unsupported:
+            return None
+
+    def values(self, queryset):
+        """``queryset`` as the values() rows this reader renders"""
+        return queryset.prefetch_related(None).values(*sorted(self.columns))
+
+    def children(self, name, queryset):
+        """
+        ``queryset`` as the values() rows of the nested many=True field ``name``,
+        for render(children=...) when the caller reads them itself
+        """
+        for kind, entry_name, reader, key in self.entries:
+            if kind == MANY and entry_name == name:
+                return queryset.values(*sorted(reader.columns | {key}))
+        raise KeyError(name)
+
+    def render(self, rows, children=None):
+        """
+        Serialized dicts for ``rows``, in order. Nested many=True fields are
+        read with one query each, unless ``children`` already holds their rows.
+        """
+        rows = list(rows)
+        nested = {}
+        for kind, name, reader, key in self.entries:
+            if kind == MANY and children is not None and name in children:
+                nested[name] = reader.group(key, children[name])
+            elif kind == MANY:
+                nested[name] = reader.render_grouped(key, [row[self.pk] for row in rows])
+
+        output = []
+        for row in rows:
+            item = {}
+            for kind, name, target, extra in self.entries:
+                if kind == VALUE:  # target is the column, extra the converter
+                    value = row[target]
+                    item[name] = value if extra is None or value is None else extra(value)
+                elif kind == ONE:  # target is the nested reader, extra its pk column
+                    item[name] = None if row[extra] is None else target.render_row(row)
+                else:
+                    item[name] = nested[name].get(row[self.pk], [])
+            output.append(item)
+        return output
+
+    def render_row(self, row):
+        item = {}
+        for _, name, column, convert in self.entries:
+            value = row[column]
+            item[name] = value if convert is None or value is None else convert(value)
+        return item
+
+    def render_grouped(self, key, parent_ids):
+        """Rendered rows of this model whose ``key`` foreign key is in ``parent_ids``, grouped by it"""
+        grouped = defaultdict(list)
+        if not parent_ids:
+            return grouped
+        rows = self.model._default_manager.filter(**{f'{key}__in': parent_ids}).values(*sorted(self.columns | {key}))
+        return self.group(key, rows)
+
+    def group(self, key, rows):
+        """Rendered ``rows`` grouped by their ``key`` column, keeping their order"""
+        grouped = defaultdict(list)
+        rows = list(rows)
+        for row, item in zip(rows, self.render(rows)):
+            grouped[row[key]].append(item)
+        return grouped
+
+
+def serialize_many(serializer_class, queryset, context=None):
+    """``serializer_class(queryset, many=True).data``, read from values() rows when the serializer allows it"""
+    serializer = serializer_class(queryset, many=True, context=context or {})
+    reader = ValuesReader.for_serializer(serializer)
+    if reader is None:
+        return serializer.data
+    return reader.render(reader.values(queryset))
+
+
+class ValuesReadMixin:
+    """Serve list from values() rows when the serializer allows it, falling back to DRF otherwise"""
+
+    def get_values_reader(self):
+        return ValuesReader.for_serializer(self.get_serializer())
+
+    def list(self, request, *args, **kwargs):
+        reader = self.get_values_reader()
+        if reader is None:
+            return super().list(request, *args, **kwargs)
+
+        rows = reader.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(reader.render(page))
+        return Response(reader.render(rows))
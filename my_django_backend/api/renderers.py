@@ -0,0 +1,78 @@
+import json
+from decimal import Decimal
+
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib renderer
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+LINE_SEPARATOR = '\u2028'.encode()
+PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer encoding with orjson, producing the same bytes as DRF's.
+
+    Datetimes, dates, times and everything else orjson does not handle natively
+    (Decimal, lazy strings, QuerySets...) go through DRF's JSONEncoder.default,
+    so they are formatted exactly as before. Indented output (the browsable API
+    or an ``indent`` media type parameter), non-compact settings, and anything
+    orjson rejects, such as integers beyond 64 bits, use the stdlib renderer.
+
+    Two float cases differ from the stdlib: exponents are spelled 1e-7/1e16
+    rather than 1e-07/1e+16 (the same JSON numbers), and NaN or infinity
+    render as null where the stdlib renderer raises. This API's floats are
+    0-100 progress averages, which never hit either case.
+    """
+    options = (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS) if orjson else 0
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if (orjson is None or not self.compact or self.ensure_ascii
+                or self.get_indent(accepted_media_type, renderer_context) is not None):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self.default_for(self.encoder_class()), option=self.options)
+        except (orjson.JSONEncodeError, TypeError):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        # Same escaping of the JavaScript line terminators as JSONRenderer
+        if LINE_SEPARATOR in ret:
+            ret = ret.replace(LINE_SEPARATOR, b'\\u2028')
+        if PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+    @staticmethod
+    def default_for(encoder):
+        def default(obj):
+            if isinstance(obj, Decimal):
+                # Spelled by the stdlib, which writes exponents as 1e-07 where orjson writes 1e-7
+                return orjson.Fragment(json.dumps(encoder.default(obj), allow_nan=False))
+            return encoder.default(obj)
+        return default
+
+
+class MessagePackRenderer(BaseRenderer):
+    """MessagePack output with the same values as the JSON renderers (datetimes as ISO strings)"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+    encoder_class = JSONRenderer.encoder_class
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, default=self.encoder_class().default, use_bin_type=True)
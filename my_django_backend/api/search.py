@@ -0,0 +1,161 @@
+import html
+import re
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Case, Exists, IntegerField, OuterRef, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Length
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+from .models import PeerRelationship
+
+USER_SEARCH_MAX_LIMIT = 50
+CARD_SEARCH_MAX_LIMIT = 50
+CARD_SEARCH_MAX_TERMS = 8
+
+# Snippet highlight markers: private-use characters that card text will not
+# contain, swapped for <mark> tags after the rest of the snippet is escaped
+MARK_START, MARK_END = '\ue000', '\ue001'
+
+
+class SearchNotSupported(APIException):
+    """Card search on a database without one of the full-text indexes from migration 0013"""
+    status_code = status.HTTP_501_NOT_IMPLEMENTED
+    default_detail = 'Card search is not supported on this database.'
+    default_code = 'search_not_supported'
+
+
+def _fts_phrase(text):
+    """Quote text as a single FTS5 phrase"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search_users(user, query, limit=10, offset=0):
+    """
+    Users whose username contains ``query``, excluding ``user`` and anyone
+    they already have a peer relationship with.
+
+    Prefix matches rank first, then shorter usernames. Matching is served by
+    the indexes from migration 0008: pg_trgm on PostgreSQL and an FTS5 trigram
+    table on SQLite (trigrams need at least three characters).
+    """
+    candidates = User.objects.filter(username__icontains=query)
+    if connection.vendor == 'sqlite' and len(query) >= 3:
+        candidates = candidates.filter(id__in=RawSQL(
+            "SELECT rowid FROM api_user_username_trgm WHERE api_user_username_trgm MATCH %s",
+            [_fts_phrase(query)]
+        ))
+
+    # Two anti-joins, each on the (requester, addressee) unique index, instead
+    # of loading every relationship into Python
+    sent = PeerRelationship.objects.filter(requester=user, addressee=OuterRef('pk'))
+    received = PeerRelationship.objects.filter(requester=OuterRef('pk'), addressee=user)
+    candidates = candidates.exclude(pk=user.pk).filter(~Exists(sent), ~Exists(received))
+
+    ranked = candidates.annotate(
+        prefix_rank=Case(
+            When(username__istartswith=query, then=0),
+            default=1,
+            output_field=IntegerField()
+        )
+    ).order_by('prefix_rank', Length('username'), 'username')
+
+    limit = min(max(limit, 1), USER_SEARCH_MAX_LIMIT)
+    offset = max(offset, 0)
+    return ranked[offset:offset + limit]
+
+
+# Cards the user owns or that are in topics actively shared with them
+VISIBLE_CARDS = (
+    "(t.user_id = %s OR c.topic_id IN "
+    "(SELECT s.topic_id FROM api_topicshare s WHERE s.peer_id = %s AND s.is_active))"
+)
+
+# Ranked matches from the api_card_fts table of migration 0013, names weighted
+# over resources over notes; bm25() is lower for better matches
+SQLITE_CARD_SEARCH = f"""
+    SELECT c.id, c.name, c.topic_id, t.name, t.user_id <> %s, -bm25(api_card_fts, 10.0, 4.0, 1.0),
+           snippet(api_card_fts, -1, '{MARK_START}', '{MARK_END}', '…', 16)
+    FROM api_card_fts
+    JOIN api_card c ON c.id = api_card_fts.rowid
+    JOIN api_topic t ON t.id = c.topic_id
+    WHERE api_card_fts MATCH %s AND {VISIBLE_CARDS}
+    ORDER BY 6 DESC, c.id
+    LIMIT %s OFFSET %s
+"""
+
+# The same on the search_vector GIN index; headlines are only built for the page
+POSTGRES_CARD_SEARCH = f"""
+    SELECT c.id, c.name, c.topic_id, t.name, t.user_id <> %s, page.rank,
+           ts_headline('english', concat_ws(' … ', c.name, nullif(c.resource, ''), nullif(c.note, '')),
+                       to_tsquery('english', %s),
+                       'StartSel={MARK_START}, StopSel={MARK_END}, MaxWords=16, MinWords=4, MaxFragments=2')
+    FROM (
+        SELECT c.id, ts_rank_cd(c.search_vector, query) AS rank
+        FROM api_card c JOIN api_topic t ON t.id = c.topic_id, to_tsquery('english', %s) query
+        WHERE c.search_vector @@ query AND {VISIBLE_CARDS}
+        ORDER BY rank DESC, c.id
+        LIMIT %s OFFSET %s
+    ) page
+    JOIN api_card c ON c.id = page.id
+    JOIN api_topic t ON t.id = c.topic_id
+    ORDER BY page.rank DESC, c.id
+"""
+
+
+def _highlight(snippet):
+    """The snippet HTML-escaped, with its matches wrapped in <mark>"""
+    return html.escape(snippet or '').replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+
+
+def search_terms(query):
+    """The words of ``query``; the last is matched as a prefix, for search-as-you-type"""
+    return re.findall(r'\w+', query)[:CARD_SEARCH_MAX_TERMS]
+
+
+def search_cards(user, query, limit=20, offset=0):
+    """
+    Cards in ``user``'s own topics and in topics actively shared with them
+    whose name, resource or note contain every word of ``query``, best first.
+
+    Served by the full-text indexes from migration 0013 (a tsvector GIN index
+    on PostgreSQL, an FTS5 table on SQLite), so card text is never scanned.
+    Returns a page of dicts and whether more results follow; on any other
+    database it raises SearchNotSupported, a 501 in the API.
+    """
+    terms = search_terms(query)
+    limit = min(max(limit, 1), CARD_SEARCH_MAX_LIMIT)
+    offset = max(offset, 0)
+    if not terms:
+        return [], False
+
+    # One extra row tells whether there is a next page
+    if connection.vendor == 'postgresql':
+        tsquery = ' & '.join(terms) + ':*'
+        sql = POSTGRES_CARD_SEARCH
+        params = [user.id, tsquery, tsquery, user.id, user.id, limit + 1, offset]
+    elif connection.vendor == 'sqlite':
+        sql = SQLITE_CARD_SEARCH
+        match = ' '.join(_fts_phrase(term) for term in terms) + '*'
+        params = [user.id, match, user.id, user.id, limit + 1, offset]
+    else:
+        raise SearchNotSupported(f"Card search is not supported on {connection.vendor}.")
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        rows = cursor.fetchall()
+    results = [
+        {
+            'id': card_id,
+            'name': name,
+            'topic': topic_id,
+            'topic_name': topic_name,
+            'shared': bool(shared),
+            'rank': round(rank, 4),
+            'snippet': _highlight(snippet),
+        }
+        for card_id, name, topic_id, topic_name, shared, rank, snippet in rows[:limit]
+    ]
+    return results, len(rows) > limit
@@ -1,13 +1,102 @@
+from collections import defaultdict
+
 from rest_framework import serializers
-from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccess
+from rest_framework.permissions import SAFE_METHODS
+from django.db.models import Prefetch
+from django.utils import timezone
+from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccess, RequestProfile
+from .signals import batch_topic_changes, cards_removed, count_cards, counting
 from django.contrib.auth.models import User
 
-class CardSerializer(serializers.ModelSerializer):
+BULK_CARD_LIMIT = 1000  # Maximum number of operations in one bulk request
+
+def _split_param(value):
+    return [entry.strip() for entry in (value or '').split(',') if entry.strip()]
+
+def field_projection(request, path=''):
+    """
+    The (include, omit) field names requested for the serializer at ``path``.
+
+    ``?fields=id,name,cards.progress`` keeps id, name and cards at the top
+    level and only progress inside cards; ``?omit=cards.note`` drops note from
+    nested cards. Either set is None when the request does not restrict it.
+    """
+    prefix = f'{path}.' if path else ''
+    include = {
+        entry[len(prefix):].split('.')[0]
+        for entry in _split_param(request.query_params.get('fields'))
+        if entry.startswith(prefix) and len(entry) > len(prefix)
+    }
+    omit = {
+        entry.rpartition('.')[2]
+        for entry in _split_param(request.query_params.get('omit'))
+        if entry.rpartition('.')[0] == path
+    }
+    return include or None, omit or None
+
+class SparseFieldsetMixin:
+    """Limit read responses to the fields selected with ?fields= and ?omit="""
+
+    @property
+    def field_path(self):
+        names = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                names.append(node.field_name)
+            node = node.parent
+        return '.'.join(reversed(names))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method not in SAFE_METHODS:
+            return fields
+        include, omit = field_projection(request, self.field_path)
+        for name in list(fields):
+            if (include is not None and name not in include) or (omit is not None and name in omit):
+                del fields[name]
+        return fields
+
+def _model_columns(serializer):
+    """Concrete model fields read by the serializer's selected fields"""
+    opts = serializer.Meta.model._meta
+    # Ordering columns stay loaded: cursor pagination reads them off each page
+    columns = {opts.pk.name} | {name.lstrip('-') for name in opts.ordering}
+    for field in serializer.fields.values():
+        source = field.source.split('.')[0]
+        model_field = next((f for f in opts.concrete_fields if f.name == source), None)
+        if model_field is not None:
+            columns.add(model_field.name)
+    return columns
+
+def project_queryset(queryset, serializer):
+    """
+    Load only the columns ``serializer`` will output.
+
+    Nested user serializers on foreign keys become select_related and nested
+    many=True serializers become a Prefetch with its own ``.only()``, so heavy
+    text columns such as Card.note are never read when they are not returned.
+    """
+    columns = _model_columns(serializer)
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            child = field.child
+            relation = queryset.model._meta.get_field(field.source)
+            child_columns = _model_columns(child) | {relation.field.name}
+            queryset = queryset.prefetch_related(
+                Prefetch(field.source, queryset=child.Meta.model.objects.only(*child_columns))
+            )
+        elif isinstance(field, serializers.ModelSerializer):
+            queryset = queryset.select_related(field.source)
+    return queryset.only(*columns)
+
+class CardSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     class Meta:
         model = Card
         fields = '__all__'
 
-class TopicSerializer(serializers.ModelSerializer):
+class TopicSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     cards = CardSerializer(many=True, required=False)
 
     class Meta:
@@ -17,11 +106,125 @@ class TopicSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         cards_data = validated_data.pop('cards', [])
-        topic = Topic.objects.create(**validated_data)
-        for card_data in cards_data:
-            Card.objects.create(topic=topic, **card_data)
+        with batch_topic_changes() as changed:
+            topic = Topic.objects.create(**validated_data)
+            count_cards(Card.objects.bulk_create([Card(**{**card_data, 'topic': topic}) for card_data in cards_data]))
+            changed.add(topic.pk)
         return topic
 
+class TopicSummarySerializer(serializers.ModelSerializer):
+    """Topic with its stored card totals instead of embedded cards"""
+    average_progress = serializers.FloatField(read_only=True)
+
+    class Meta:
+        model = Topic
+        fields = ['id', 'name', 'collapsed', 'card_count', 'starred_count', 'completed_count', 'average_progress']
+        read_only_fields = fields
+
+class CardBulkItemSerializer(serializers.ModelSerializer):
+    """Card fields for bulk creates; topic ownership is checked once per topic by CardBulkSerializer"""
+    topic = serializers.IntegerField(source='topic_id')
+
+    class Meta:
+        model = Card
+        fields = ['topic', 'name', 'resource', 'note', 'progress', 'starred', 'collapsed']
+
+class CardBulkUpdateItemSerializer(CardBulkItemSerializer):
+    """Partial card changes keyed by id"""
+    id = serializers.IntegerField()
+    topic = serializers.IntegerField(source='topic_id', required=False)
+
+    class Meta(CardBulkItemSerializer.Meta):
+        fields = ['id'] + CardBulkItemSerializer.Meta.fields
+        extra_kwargs = {'name': {'required': False}}
+
+class CardBulkSerializer(serializers.Serializer):
+    """Mixed create, update and delete operations applied to many cards in one transaction"""
+    create = CardBulkItemSerializer(many=True, required=False)
+    update = CardBulkUpdateItemSerializer(many=True, required=False)
+    delete = serializers.ListField(child=serializers.IntegerField(), required=False)
+
+    def validate(self, attrs):
+        user = self.context['request'].user
+        creates = attrs.setdefault('create', [])
+        updates = attrs.setdefault('update', [])
+        deletes = attrs.setdefault('delete', [])
+
+        if len(creates) + len(updates) + len(deletes) > BULK_CARD_LIMIT:
+            raise serializers.ValidationError(f"At most {BULK_CARD_LIMIT} operations per request")
+
+        update_ids = [item['id'] for item in updates]
+        if len(set(update_ids) | set(deletes)) != len(update_ids) + len(deletes):
+            raise serializers.ValidationError("Each card may appear only once across update and delete")
+
+        # One ownership query for every card touched, one for every target topic
+        card_ids = set(update_ids) | set(deletes)
+        cards = Card.objects.filter(id__in=card_ids, topic__user=user).in_bulk() if card_ids else {}
+        missing_cards = card_ids - set(cards)
+        if missing_cards:
+            raise serializers.ValidationError({'cards': f"Cards not found: {sorted(missing_cards)}"})
+
+        topic_ids = {item['topic_id'] for item in creates + updates if 'topic_id' in item}
+        owned_topics = set(
+            Topic.objects.filter(id__in=topic_ids, user=user).values_list('id', flat=True)
+        ) if topic_ids else set()
+        missing_topics = topic_ids - owned_topics
+        if missing_topics:
+            raise serializers.ValidationError({'topics': f"Topics not found: {sorted(missing_topics)}"})
+
+        attrs['cards'] = cards
+        return attrs
+
+    def save(self):
+        """Apply all operations and return the created and updated cards and the deleted ids"""
+        data = self.validated_data
+
+        with batch_topic_changes() as changed, counting() as deltas:
+            created = Card.objects.bulk_create([Card(**item) for item in data['create']])
+            changed.update(card.topic_id for card in created)
+            count_cards(created)
+
+            # Re-read the changed cards under lock so counter deltas and the
+            # written rows start from the stored values, not the validated ones
+            cards = {}
+            if data['update'] or data['delete']:
+                cards = Card.objects.select_for_update().in_bulk(list(data['cards']))
+                if len(cards) != len(data['cards']):
+                    raise serializers.ValidationError({'cards': f"Cards not found: {sorted(set(data['cards']) - set(cards))}"})
+
+            updated = []
+            moved = defaultdict(list)
+            update_fields = {'updated_at'}
+            now = timezone.now()
+            for item in data['update']:
+                card = cards[item['id']]
+                old_topic_id = card.topic_id
+                changed.add(old_topic_id)  # The old topic too, in case the card moves
+                deltas.add_card(card, sign=-1)
+                for field, value in item.items():
+                    setattr(card, field, value)
+                card.updated_at = now
+                update_fields.update(field for field in item if field != 'id')
+                changed.add(card.topic_id)
+                deltas.add_card(card)
+                if card.topic_id != old_topic_id:
+                    moved[old_topic_id].append(card.pk)
+                updated.append(card)
+            if updated:
+                Card.objects.bulk_update(updated, sorted(update_fields))
+            # bulk_update skips signals; peers of the old topic lose moved cards
+            cards_removed(moved)
+
+            if data['delete']:
+                changed.update(cards[card_id].topic_id for card_id in data['delete'])
+                Card.objects.filter(id__in=data['delete']).delete()
+
+        return {
+            'created': CardSerializer(created, many=True).data,
+            'updated': CardSerializer(updated, many=True).data,
+            'deleted': data['delete'],
+        }
+
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
@@ -63,7 +266,7 @@ class TopicShareSerializer(serializers.ModelSerializer):
         model = TopicShare
         fields = ['id', 'topic', 'owner', 'peer', 'permission_level', 'shared_at', 'is_active']
 
-class SharedTopicSerializer(serializers.ModelSerializer):
+class SharedTopicSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """Serializer for topics shared with the current user"""
     cards = CardSerializer(many=True, read_only=True)
     owner = UserPublicSerializer(source='user', read_only=True)  # Map 'user' field to 'owner'
@@ -72,3 +275,29 @@ class SharedTopicSerializer(serializers.ModelSerializer):
         model = Topic
         fields = ['id', 'name', 'cards', 'owner']
 
+class SharedTopicSummarySerializer(TopicSummarySerializer):
+    """Card totals of a topic shared with the current user"""
+    owner = UserPublicSerializer(source='user', read_only=True)
+
+    class Meta(TopicSummarySerializer.Meta):
+        fields = ['id', 'name', 'owner', 'card_count', 'starred_count', 'completed_count', 'average_progress']
+
+class SyncTopicSerializer(serializers.ModelSerializer):
+    """Topic row of a client replica; its cards sync as their own collection"""
+    class Meta:
+        model = Topic
+        fields = ['id', 'user', 'name', 'collapsed', 'created_at', 'updated_at']
+
+class SyncShareSerializer(serializers.ModelSerializer):
+    """Topic share row of a client replica, with related rows as ids"""
+    class Meta:
+        model = TopicShare
+        fields = ['id', 'topic', 'owner', 'peer', 'permission_level', 'shared_at', 'is_active', 'updated_at']
+
+class RequestProfileSerializer(serializers.ModelSerializer):
+    """A stored request profile without its stats, which are downloaded separately"""
+    username = serializers.CharField(source='user.username', read_only=True)
+
+    class Meta:
+        model = RequestProfile
+        fields = ['id', 'username', 'method', 'path', 'view', 'status_code', 'duration_ms', 'created_at']
@@ -0,0 +1,318 @@
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save
+from django.dispatch import receiver
+
+from . import authz, cache, events, sync
+from .counters import CounterDeltas
+from .etags import bump_versions
+from .models import Topic, Card, PeerRelationship, Tombstone, TopicShare, UserDataVersion
+
+_state = threading.local()
+
+
+def _deletion(origin):
+    """
+    Topics being deleted by the delete() call ``origin`` started, mapped to
+    the users who could see them, and the share tombstones buffered for them.
+    Cascaded card and share deletions are folded into the topic's own signal.
+
+    Django passes every delete signal of one delete() call the same origin,
+    so state that a failed or rolled-back delete left behind belongs to
+    another origin and is dropped here, never mistaken for a delete in
+    progress.
+    """
+    if getattr(_state, 'origin', None) is not origin:
+        _state.origin = origin
+        _state.deleting = {}
+        _state.cascaded_shares = defaultdict(dict)
+    return _state
+
+
+def _cascaded(instance, origin):
+    """Whether ``instance`` (a card or share) is going away with its topic, in the delete() ``origin`` started"""
+    return origin is not None and origin is getattr(_state, 'origin', None) and instance.topic_id in _state.deleting
+
+
+def _batch():
+    return getattr(_state, 'batch', None)
+
+
+@contextmanager
+def counting():
+    """
+    Collect topic counter deltas from card writes.
+
+    Inside batch_topic_changes() they join the batch and are applied once per
+    topic when it ends; otherwise they are applied when the block exits.
+    """
+    deltas = getattr(_state, 'deltas', None)
+    if deltas is not None:
+        yield deltas
+        return
+    deltas = CounterDeltas()
+    yield deltas
+    deltas.apply()
+
+
+def count_cards(cards, sign=1):
+    """Add (or with sign=-1 remove) cards' contributions; for bulk operations that bypass signals"""
+    with counting() as deltas:
+        for card in cards:
+            deltas.add_card(card, sign)
+
+
+@contextmanager
+def batch_topic_changes():
+    """
+    Run a block of topic/card writes atomically and record their changes once.
+
+    Signal receivers only collect the ids of the touched topics and their
+    counter deltas while the block runs; bulk operations that bypass signals
+    add their topics to the yielded set and their cards with count_cards().
+    """
+    if _batch() is not None:
+        # Nested batch: the outermost one records everything
+        yield _batch()
+        return
+
+    _state.batch = changed = set()
+    _state.deltas = deltas = CounterDeltas()
+    _state.removed = removed = defaultdict(list)
+    try:
+        with transaction.atomic():
+            yield changed
+            deltas.apply()
+            if removed:
+                _record_removed_cards(removed)
+            if changed:
+                topics_changed(changed)
+    finally:
+        _state.batch = None
+        _state.deltas = None
+        _state.removed = None
+
+
+def topic_audience(topic_id, owner_id=None):
+    """Ids of the users who can see a topic: its owner and every peer it is actively shared with"""
+    if owner_id is None:
+        owner_id = Topic.objects.filter(pk=topic_id).values_list('user_id', flat=True).first()
+    peer_ids = TopicShare.objects.filter(
+        topic_id=topic_id,
+        is_active=True
+    ).values_list('peer_id', flat=True)
+    return {owner_id, *peer_ids}
+
+
+def topic_audiences(topic_ids):
+    """topic_audience() of many topics with two queries, keyed by topic id"""
+    audiences = {
+        topic_id: {owner_id}
+        for topic_id, owner_id in Topic.objects.filter(pk__in=topic_ids).values_list('id', 'user_id')
+    }
+    shares = TopicShare.objects.filter(topic_id__in=topic_ids, is_active=True).values_list('topic_id', 'peer_id')
+    for topic_id, peer_id in shares:
+        audiences[topic_id].add(peer_id)
+    return audiences
+
+
+def cards_removed(removed):
+    """
+    Record cards that left a topic, deleted or moved, for everyone who could
+    see that topic; ``removed`` maps topic ids to card ids. Inside
+    batch_topic_changes() they are recorded once when the batch ends.
+    """
+    if _batch() is not None:
+        for topic_id, card_ids in removed.items():
+            _state.removed[topic_id].extend(card_ids)
+        return
+    _record_removed_cards(removed)
+
+
+def _record_removed_cards(removed):
+    audiences = topic_audiences(list(removed))
+    sync.record_deleted(sync.CARD, {
+        card_id: audiences.get(topic_id, ())
+        for topic_id, card_ids in removed.items()
+        for card_id in card_ids
+    })
+
+
+def topic_changed(owner_id, audience):
+    """Record a change to a topic or its cards for everyone who can see it"""
+    bump_versions(audience)
+    cache.invalidate([owner_id], [cache.TOPICS])
+    cache.invalidate(audience - {owner_id}, [cache.SHARED])
+
+
+def topics_changed(topic_ids):
+    """Record a change to many topics (or their cards) with a fixed number of queries"""
+    owners = dict(Topic.objects.filter(pk__in=topic_ids).values_list('id', 'user_id'))
+    shares = TopicShare.objects.filter(
+        topic_id__in=topic_ids,
+        is_active=True
+    ).values_list('topic_id', 'peer_id')
+    audiences = {topic_id: {owner_id} for topic_id, owner_id in owners.items()}
+    peer_ids = set()
+    for topic_id, peer_id in shares:
+        audiences[topic_id].add(peer_id)
+        peer_ids.add(peer_id)
+    owner_ids = set(owners.values())
+    bump_versions(owner_ids | peer_ids)
+    cache.invalidate(owner_ids, [cache.TOPICS])
+    cache.invalidate(peer_ids, [cache.SHARED])
+    push_topics_changed(audiences)
+
+
+def push_topics_changed(audiences):
+    """Tell each user in ``audiences`` (topic id -> user ids) which of their topics changed"""
+    topics_by_user = defaultdict(list)
+    for topic_id, user_ids in audiences.items():
+        for user_id in user_ids:
+            topics_by_user[user_id].append(topic_id)
+    for user_id, topic_ids in topics_by_user.items():
+        events.publish([user_id], events.TOPICS_CHANGED, topics=sorted(topic_ids))
+
+
+@receiver(post_save, sender=Topic)
+def topic_saved(sender, instance, **kwargs):
+    if _batch() is not None:
+        _batch().add(instance.pk)
+        return
+    audience = topic_audience(instance.pk, instance.user_id)
+    topic_changed(instance.user_id, audience)
+    push_topics_changed({instance.pk: audience})
+
+
+@receiver(pre_delete, sender=Topic)
+def topic_deleting(sender, instance, origin=None, **kwargs):
+    _deletion(origin).deleting[instance.pk] = topic_audience(instance.pk, instance.user_id)
+
+
+@receiver(post_delete, sender=Topic)
+def topic_deleted(sender, instance, origin=None, **kwargs):
+    deletion = _deletion(origin)
+    audience = deletion.deleting.pop(instance.pk, {instance.user_id})
+    shares = deletion.cascaded_shares.pop(instance.pk, None)
+    if not deletion.deleting:
+        _state.origin = None  # Don't keep the origin alive once its topics are gone
+    topic_changed(instance.user_id, audience)
+    # Its cards go with it; clients drop them along with the topic
+    sync.record_deleted(sync.TOPIC, {instance.pk: audience})
+    if shares:
+        sync.record_deleted(sync.SHARE, shares)
+    push_topics_changed({instance.pk: audience})
+    # The topic's shares were cascaded without their own signal handling
+    authz.invalidate_shared_topics(audience - {instance.user_id})
+
+
+@receiver(pre_save, sender=Card)
+def card_saving(sender, instance, **kwargs):
+    # Card.save() runs in a transaction, so the row stays locked until the
+    # counters are updated and concurrent saves see each other's values
+    instance._stored_counts = None
+    if not instance._state.adding:
+        instance._stored_counts = Card.objects.select_for_update().filter(
+            pk=instance.pk
+        ).values('topic_id', 'progress', 'starred').first()
+
+
+@receiver(post_save, sender=Card)
+def card_counted(sender, instance, **kwargs):
+    stored = getattr(instance, '_stored_counts', None)
+    with counting() as deltas:
+        if stored is not None:
+            deltas.add(stored['topic_id'], stored['progress'], stored['starred'], sign=-1)
+        deltas.add_card(instance)
+    if stored is not None and stored['topic_id'] != instance.topic_id:
+        cards_removed({stored['topic_id']: [instance.pk]})
+
+
+@receiver(post_delete, sender=Card)
+def card_uncounted(sender, instance, origin=None, **kwargs):
+    if _cascaded(instance, origin):
+        return
+    count_cards([instance], sign=-1)
+    cards_removed({instance.topic_id: [instance.pk]})
+
+
+@receiver([post_save, post_delete], sender=Card)
+def card_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded(instance, origin):
+        return
+    if _batch() is not None:
+        _batch().add(instance.topic_id)
+        return
+    topics_changed([instance.topic_id])
+
+
+@receiver([post_save, post_delete], sender=TopicShare)
+def share_changed(sender, instance, origin=None, **kwargs):
+    if _cascaded(instance, origin):
+        return
+    bump_versions({instance.owner_id, instance.peer_id})
+    cache.invalidate([instance.peer_id], [cache.SHARED])
+    authz.invalidate_shared_topics([instance.peer_id])
+
+
+@receiver(post_save, sender=TopicShare)
+def share_saved(sender, instance, **kwargs):
+    if not instance.is_active:
+        sync.record_deleted(sync.TOPIC, {instance.topic_id: {instance.peer_id}})
+    events.publish(
+        [instance.owner_id, instance.peer_id],
+        events.SHARE_ACTIVATED if instance.is_active else events.SHARE_REVOKED,
+        share=instance.pk, topic=instance.topic_id
+    )
+
+
+@receiver(post_delete, sender=TopicShare)
+def share_deleted(sender, instance, origin=None, **kwargs):
+    if _cascaded(instance, origin):
+        # One insert for all of a deleted topic's shares; its tombstone and
+        # event already cover their peers
+        _state.cascaded_shares[instance.topic_id][instance.pk] = {instance.owner_id, instance.peer_id}
+        return
+    sync.record_deleted(sync.SHARE, {instance.pk: {instance.owner_id, instance.peer_id}})
+    if instance.is_active:
+        sync.record_deleted(sync.TOPIC, {instance.topic_id: {instance.peer_id}})
+        events.publish(
+            [instance.owner_id, instance.peer_id], events.SHARE_REVOKED,
+            share=instance.pk, topic=instance.topic_id
+        )
+
+
+@receiver([post_save, post_delete], sender=PeerRelationship)
+def peer_relationship_changed(sender, instance, **kwargs):
+    bump_versions({instance.requester_id, instance.addressee_id})
+    cache.invalidate([instance.requester_id, instance.addressee_id], [cache.PEERS])
+    authz.invalidate_peers([instance.requester_id, instance.addressee_id])
+
+
+@receiver(post_save, sender=PeerRelationship)
+def peer_relationship_saved(sender, instance, created, **kwargs):
+    events.publish(
+        [instance.requester_id, instance.addressee_id],
+        events.PEER_REQUESTED if created else events.PEER_UPDATED,
+        peer=instance.pk, status=instance.status
+    )
+
+
+@receiver(post_delete, sender=PeerRelationship)
+def peer_relationship_deleted(sender, instance, **kwargs):
+    sync.record_deleted(sync.PEER, {instance.pk: {instance.requester_id, instance.addressee_id}})
+    events.publish([instance.requester_id, instance.addressee_id], events.PEER_REMOVED, peer=instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    # The cascade to the user's topics and shares bumped the versions of
+    # everyone who saw them and wrote their tombstones, the user included,
+    # after the user's own rows had been collected; constraints are checked
+    # at commit
+    UserDataVersion.objects.filter(user_id=instance.pk).delete()
+    Tombstone.objects.filter(user_id=instance.pk).delete()
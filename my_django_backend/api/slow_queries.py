@@ -0,0 +1,223 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, transaction
+from django.db.backends.signals import connection_created
+
+from . import metrics
+from .models import SlowQuery
+
+logger = logging.getLogger(__name__)
+
+# Queries slower than SLOW_QUERY_THRESHOLD_MS during a request are stored in
+# SlowQuery with the view that ran them and their plan, to see which indexes
+# the planner actually uses; report_slow_queries groups them by fingerprint.
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDER = re.compile(r'%s|\?')
+_LIST = re.compile(r'\bIN\s*\(\s*\?(?:\s*,\s*\?)*\s*\)', re.IGNORECASE)
+_SPACE = re.compile(r'\s+')
+EXPLAINABLE = ('SELECT', 'WITH')
+
+# The sampler of the request being served; like the request metrics, a
+# context variable, so it follows sync views and async ORM calls onto the
+# threads their queries run on under ASGI
+_current = ContextVar('slow_query_sampler', default=None)
+
+_explained_lock = threading.Lock()
+_explained = {}  # fingerprint -> monotonic time of its last EXPLAIN in this process
+
+
+def threshold():
+    """Seconds a query may take before it is captured, or None when capture is off"""
+    threshold_ms = getattr(settings, 'SLOW_QUERY_THRESHOLD_MS', 0)
+    return threshold_ms / 1000 if threshold_ms and threshold_ms > 0 else None
+
+
+def normalize(sql):
+    """``sql`` with literals and parameters replaced by ?, IN lists collapsed and whitespace squeezed"""
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _PLACEHOLDER.sub('?', sql)
+    sql = _LIST.sub('IN (...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+def fingerprint(normalized_sql):
+    return hashlib.sha1(normalized_sql.encode()).hexdigest()[:16]
+
+
+def _due_for_explain(key):
+    interval = getattr(settings, 'SLOW_QUERY_EXPLAIN_INTERVAL', 60)
+    now = time.monotonic()
+    with _explained_lock:
+        last = _explained.get(key)
+        if last is not None and now - last < interval:
+            return False
+        _explained[key] = now
+        return True
+
+
+def explain(connection, sql, params):
+    """The plan of a SELECT as text; ANALYZE (which runs it again) only when enabled and on PostgreSQL"""
+    options = {}
+    if getattr(settings, 'SLOW_QUERY_EXPLAIN_ANALYZE', False) and connection.vendor == 'postgresql':
+        options['analyze'] = True
+    prefix = connection.ops.explain_query_prefix(**options)
+    # A savepoint, so a failed EXPLAIN cannot break the request's transaction
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {sql}', params)
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        # (id, parent, notused, detail) rows; indent each step under its parent
+        depth = {0: -1}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, -1) + 1
+            lines.append('  ' * depth[node_id] + detail)
+        return '\n'.join(lines)
+    return '\n'.join(' '.join(str(column) for column in row) for row in rows)
+
+
+def call_site(request):
+    """The view class and action that served ``request``, e.g. TopicViewSet.list"""
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return ''
+    view = getattr(match.func, 'cls', None) or getattr(match.func, 'view_class', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    return f'{view.__name__}.{action}' if view is not None else match.view_name
+
+
+def _observe(execute, sql, params, many, context):
+    """Execute wrapper on every connection, handing a sampled request's queries to its Sampler"""
+    sampler = _current.get()
+    if sampler is None:
+        return execute(sql, params, many, context)
+    return sampler(execute, sql, params, many, context)
+
+
+def install(sender, connection, **kwargs):
+    """connection_created receiver; wrappers outlive reconnects, so add it once"""
+    if _observe not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_observe)
+
+
+connection_created.connect(install)
+
+
+class Sampler:
+    """
+    Collects the slow queries of one request. Plans are
+    taken by ``explain_captured`` once the response is ready, so EXPLAIN
+    never adds to the request's own query timings.
+    """
+
+    def __init__(self, request, limit):
+        self.request = request
+        self.limit = limit
+        self.captured = []
+        self.to_explain = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        result = execute(sql, params, many, context)
+        elapsed = time.perf_counter() - started
+        if elapsed >= self.limit:
+            self.capture(context['connection'], sql, params, many, elapsed)
+        return result
+
+    def capture(self, connection, sql, params, many, elapsed):
+        normalized = normalize(sql)
+        key = fingerprint(normalized)
+        query = SlowQuery(
+            fingerprint=key, sql=normalized, view=call_site(self.request)[:200],
+            duration_ms=round(elapsed * 1000, 3),
+        )
+        if not many and sql.lstrip().upper().startswith(EXPLAINABLE) and _due_for_explain(key):
+            self.to_explain.append((query, connection, sql, params))
+        self.captured.append(query)
+
+    def explain_captured(self):
+        for query, connection, sql, params in self.to_explain:
+            try:
+                query.plan = explain(connection, sql, params)
+            except DatabaseError:
+                logger.warning("Could not EXPLAIN slow query %s", query.fingerprint, exc_info=True)
+
+
+def store(captured):
+    """Save captured queries and drop all but the newest SLOW_QUERY_MAX_ROWS"""
+    max_rows = getattr(settings, 'SLOW_QUERY_MAX_ROWS', 1000)
+    with transaction.atomic():
+        newest = SlowQuery.objects.bulk_create(captured)[-1].pk
+        if newest is None:  # Backends that do not return ids from bulk inserts
+            newest = SlowQuery.objects.order_by('-pk').values_list('pk', flat=True).first()
+        # Ids only grow, so the newest rows are the last max_rows ids
+        SlowQuery.objects.filter(pk__lte=newest - max_rows).delete()
+
+
+class SlowQueryMiddleware:
+    """
+    Capture the slow queries of each request and explain and store them once
+    the response is ready, outside the request's own transaction and left out
+    of its request metrics. Under ASGI, sync and async views are sampled
+    alike. With no threshold set it passes requests straight through.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        limit = threshold()
+        if limit is None:
+            return self.get_response(request)
+
+        sampler = Sampler(request, limit)
+        token = _current.set(sampler)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        self.save(sampler)
+        return response
+
+    async def __acall__(self, request):
+        limit = threshold()
+        if limit is None:
+            return await self.get_response(request)
+
+        sampler = Sampler(request, limit)
+        token = _current.set(sampler)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        if sampler.captured:
+            # On the request's sync thread, whose connections ran the queries
+            await sync_to_async(self.save)(sampler)
+        return response
+
+    def save(self, sampler):
+        if not sampler.captured:
+            return
+        with metrics.uncounted():
+            sampler.explain_captured()
+            try:
+                store(sampler.captured)
+            except DatabaseError:
+                logger.warning("Could not store %d slow queries", len(sampler.captured), exc_info=True)
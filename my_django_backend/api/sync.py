@@ -0,0 +1,121 @@
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import authz
+from .models import Card, PeerRelationship, Tombstone, Topic, TopicShare
+
+# /api/sync/ sends a client the rows that changed for it since a cursor, read
+# from the updated_at columns, and the ids that stopped being visible to it,
+# read from Tombstone rows written for every user who could see them.
+#
+# The cursor is a timestamp, not a commit-ordered sequence: a row is stamped
+# when it is written and only becomes visible when its transaction commits.
+# Each sync re-reads SYNC_CURSOR_OVERLAP seconds before the cursor, so a
+# change is guaranteed to arrive only if its transaction commits within that
+# overlap of its stamp, and only while the app servers' clocks agree to well
+# within it. Writes that can take longer (account imports) re-stamp their
+# rows once committed; anything else a client missed arrives with the next
+# full sync, which clients run when a cursor expires.
+TOPIC, CARD, SHARE, PEER = 'topic', 'card', 'share', 'peer'
+COLLECTIONS = {TOPIC: 'topics', CARD: 'cards', SHARE: 'shares', PEER: 'peers'}
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class SyncError(ValueError):
+    """A cursor that cannot be synced from"""
+
+
+class CursorExpired(SyncError):
+    """A cursor older than the tombstone retention; the client must sync from scratch"""
+
+
+def cursor_overlap():
+    """How far before a cursor changes are read again: the longest a write may take to commit and still be synced"""
+    return timedelta(seconds=getattr(settings, 'SYNC_CURSOR_OVERLAP', 10))
+
+
+def tombstone_retention():
+    return timedelta(days=getattr(settings, 'SYNC_TOMBSTONE_DAYS', 30))
+
+
+def encode_cursor(moment):
+    return str((moment - EPOCH) // MICROSECOND)
+
+
+def decode_cursor(value):
+    try:
+        return EPOCH + int(value) * MICROSECOND
+    except (TypeError, ValueError, OverflowError):
+        raise SyncError("Invalid cursor")
+
+
+def record_deleted(kind, audiences):
+    """Store tombstones for ``audiences``: object id -> ids of the users who could see it"""
+    now = timezone.now()
+    Tombstone.objects.bulk_create([
+        Tombstone(user_id=user_id, kind=kind, object_id=object_id, deleted_at=now)
+        for object_id, user_ids in audiences.items()
+        for user_id in user_ids if user_id is not None
+    ])
+
+
+def visible(user):
+    """Every topic, card, share and peer relationship ``user`` can see, by collection name"""
+    shared = list(authz.shared_topic_ids(user.id))
+    return {
+        'topics': Topic.objects.filter(Q(user=user) | Q(pk__in=shared)),
+        'cards': Card.objects.filter(Q(topic__user=user) | Q(topic_id__in=shared)),
+        'shares': TopicShare.objects.filter(Q(owner=user) | Q(peer=user)),
+        'peers': PeerRelationship.objects.filter(Q(requester=user) | Q(addressee=user)),
+    }
+
+
+def changes(user, cursor=None):
+    """
+    What changed for ``user`` since ``cursor``: a new cursor, a queryset per
+    collection and the ids deleted from each, or everything without a cursor.
+
+    Rows are re-read from ``cursor_overlap()`` before the cursor, so a client
+    may receive a row it already has; it replaces it. Deleted ids are only
+    those the user cannot see any more, so a row deleted and re-shared in the
+    window arrives as a change, never as both.
+    """
+    now = timezone.now()
+    current = visible(user)
+    querysets = dict(current)
+    deleted = {name: [] for name in COLLECTIONS.values()}
+    if cursor is None:
+        return encode_cursor(now), querysets, deleted
+
+    since = decode_cursor(cursor)
+    if since > now + cursor_overlap():
+        raise SyncError("Cursor is in the future")
+    if since < now - tombstone_retention():
+        raise CursorExpired("Cursor expired, sync again without one")
+
+    start = since - cursor_overlap()
+    # A newly shared topic arrives whole, however old its rows are
+    reshared = list(TopicShare.objects.filter(
+        peer=user, is_active=True, updated_at__gte=start
+    ).values_list('topic_id', flat=True))
+    querysets['topics'] = querysets['topics'].filter(Q(updated_at__gte=start) | Q(pk__in=reshared))
+    querysets['cards'] = querysets['cards'].filter(Q(updated_at__gte=start) | Q(topic_id__in=reshared))
+    for name in ('shares', 'peers'):
+        querysets[name] = querysets[name].filter(updated_at__gte=start)
+
+    buried = defaultdict(set)
+    for kind, object_id in Tombstone.objects.filter(user=user, deleted_at__gte=start).values_list('kind', 'object_id'):
+        buried[kind].add(object_id)
+    for kind, object_ids in buried.items():
+        name = COLLECTIONS[kind]
+        still_visible = current[name].filter(pk__in=object_ids).values_list('pk', flat=True)
+        deleted[name] = sorted(object_ids - set(still_visible))
+
+    # Never hand out a cursor older than the one the client sent
+    return encode_cursor(max(now, since)), querysets, deleted
@@ -1,3 +1,1891 @@
-from django.test import TestCase
+import asyncio
+import cProfile
+import json
+import marshal
+import os
+import runpy
+import tempfile
+import threading
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from types import SimpleNamespace
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import DatabaseError, connection, transaction
+from django.db.models.signals import post_delete
+from django.test import AsyncClient, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import gettext_lazy
+import msgpack
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, APITestCase, APITransactionTestCase
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from . import (
+    access_log, async_views, authz, cache, checks, counters, events, metrics, profiling, slow_queries, sync, transfer
+)
+from . import urls as api_urls
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .models import (
+    Topic, Card, PeerRelationship, PeerEdge, TopicShare, ShareAccess, ShareAccessDaily, SlowQuery, RequestProfile,
+    Tombstone, UserDataVersion
+)
+from .readers import ValuesReader, ValuesReadMixin, serialize_many
+from .serializers import (
+    CardSerializer, PeerRelationshipSerializer, SharedTopicSerializer, TopicSerializer, TopicSummarySerializer
+)
+
+
+class ApiTestCase(APITestCase):
+    def setUp(self):
+        # Cached responses and id sets must not leak between tests that reuse user ids
+        for backend in caches.all():
+            backend.clear()
+
+    def tearDown(self):
+        # Write buffered access events while the test database still exists
+        access_log.flush()
+
+
+class DashboardViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.requester = User.objects.create_user(username='carol')
+        PeerRelationship.objects.create(requester=self.user, addressee=self.peer, status='accepted')
+        PeerRelationship.objects.create(requester=self.requester, addressee=self.user)
+        self.client.force_authenticate(self.user)
+
+    def seed(self, count):
+        for i in range(count):
+            topic = Topic.objects.create(user=self.user, name=f'Topic {i}')
+            Card.objects.create(topic=topic, name=f'Card {i}', progress=50)
+            shared = Topic.objects.create(user=self.peer, name=f'Shared {i}')
+            Card.objects.create(topic=shared, name=f'Shared card {i}')
+            TopicShare.objects.create(topic=shared, owner=self.peer, peer=self.user)
+
+    def test_returns_all_collections(self):
+        self.seed(2)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['topics']), 2)
+        self.assertEqual(len(response.data['topics'][0]['cards']), 1)
+        self.assertEqual(len(response.data['peers']), 1)
+        self.assertEqual(response.data['requests'][0]['requester']['username'], 'carol')
+        self.assertEqual(len(response.data['shared']), 2)
+        self.assertEqual(response.data['shared'][0]['owner']['username'], 'bob')
+
+    def test_query_count_does_not_grow_with_data(self):
+        # data version, topics + cards, peers, requests, shared topic ids
+        # (seeding shares invalidated them), shared topics + cards
+        self.seed(1)
+        with self.assertNumQueries(8):
+            self.client.get(reverse('dashboard'))
+        self.seed(10)
+        with self.assertNumQueries(8):
+            self.client.get(reverse('dashboard'))
+
+
+class CursorPaginationTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(user=self.user, name='Python')
+        for i in range(5):
+            Card.objects.create(topic=self.topic, name=f'Card {i}')
+
+    def test_topic_list_is_unpaginated_by_default(self):
+        response = self.client.get(reverse('topic-list'))
+        self.assertIsInstance(response.data, list)
+
+    def test_topic_list_pages_newest_first(self):
+        for i in range(3):
+            Topic.objects.create(user=self.user, name=f'Extra {i}')
+        response = self.client.get(reverse('topic-list'), {'page_size': 2})
+        self.assertEqual([t['name'] for t in response.data['results']], ['Extra 2', 'Extra 1'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([t['name'] for t in response.data['results']], ['Extra 0', 'Python'])
+        self.assertIsNone(response.data['next'])
+
+    def test_topic_cards_sub_resource(self):
+        url = reverse('topic-cards', args=[self.topic.id])
+        response = self.client.get(url, {'page_size': 3})
+        self.assertEqual([c['name'] for c in response.data['results']], ['Card 0', 'Card 1', 'Card 2'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual([c['name'] for c in response.data['results']], ['Card 3', 'Card 4'])
+
+    def test_pages_rows_created_in_the_same_instant_once_each(self):
+        Card.objects.filter(topic=self.topic).update(created_at=timezone.now())
+        ids, url, params = [], reverse('card-list'), {'page_size': 2}
+        while url:
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(url, params)
+            ids += [card['id'] for card in response.data['results']]
+            url, params = response.data['next'], None
+        self.assertEqual(ids, sorted(Card.objects.filter(topic=self.topic).values_list('id', flat=True)))
+        # SQLite happens to return ties in id order anyway; other databases need it spelled out
+        page_query = next(query['sql'] for query in queries.captured_queries if 'FROM "api_card"' in query['sql'])
+        self.assertIn('"api_card"."id" ASC', page_query.split('ORDER BY')[-1])
+
+    def test_topic_cards_requires_ownership(self):
+        other = User.objects.create_user(username='mallory')
+        self.client.force_authenticate(other)
+        response = self.client.get(reverse('topic-cards', args=[self.topic.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class ConditionalGetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        PeerRelationship.objects.create(requester=self.owner, addressee=self.peer, status='accepted')
+        self.topic = Topic.objects.create(user=self.owner, name='Python')
+        self.card = Card.objects.create(topic=self.topic, name='Decorators')
+        TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+
+    def get(self, user, url, etag=None):
+        self.client.force_authenticate(user)
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(url, **headers)
+
+    def test_matching_etag_returns_304_without_touching_topics(self):
+        url = reverse('topic-list')
+        etag = self.get(self.owner, url)['ETag']
+        with self.assertNumQueries(1):
+            response = self.get(self.owner, url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+    def test_card_write_changes_etag_for_owner_and_peers(self):
+        topics_etag = self.get(self.owner, reverse('topic-list'))['ETag']
+        shared_url = reverse('shared-topic-detail', args=[self.topic.id])
+        shared_etag = self.get(self.peer, shared_url)['ETag']
+
+        self.card.progress = 80
+        self.card.save()
+
+        self.assertEqual(self.get(self.owner, reverse('topic-list'), topics_etag).status_code, 200)
+        self.assertEqual(self.get(self.peer, shared_url, shared_etag).status_code, 200)
+
+    def test_unrelated_write_keeps_etag(self):
+        url = reverse('peer-list')
+        etag = self.get(self.peer, url)['ETag']
+        stranger = User.objects.create_user(username='carol')
+        Topic.objects.create(user=stranger, name='Go')
+        self.assertEqual(self.get(self.peer, url, etag).status_code, 304)
+
+    def test_revoking_share_changes_peer_etag(self):
+        url = reverse('shared-topic-list')
+        etag = self.get(self.peer, url)['ETag']
+        share = TopicShare.objects.get(topic=self.topic, peer=self.peer)
+        share.is_active = False
+        share.save()
+        response = self.get(self.peer, url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, [])
+
+    def test_deleting_a_user_drops_their_version_and_bumps_peers(self):
+        url = reverse('shared-topic-list')
+        etag = self.get(self.peer, url)['ETag']
+        owner_id = self.owner.pk
+        self.owner.delete()
+        connection.check_constraints()
+        self.assertFalse(UserDataVersion.objects.filter(user_id=owner_id).exists())
+        self.assertEqual(self.get(self.peer, url, etag).status_code, 200)
+
+    def test_deleting_topic_changes_peer_etag(self):
+        url = reverse('shared-topic-list')
+        etag = self.get(self.peer, url)['ETag']
+        self.topic.delete()
+        self.assertEqual(self.get(self.peer, url, etag).status_code, 200)
+
+
+class ResponseCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        PeerRelationship.objects.create(requester=self.owner, addressee=self.peer, status='accepted')
+        self.topic = Topic.objects.create(user=self.owner, name='Python')
+        self.card = Card.objects.create(topic=self.topic, name='Decorators')
+        TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+
+    def get(self, user, url):
+        self.client.force_authenticate(user)
+        return self.client.get(url)
+
+    def test_repeated_reads_are_served_from_cache(self):
+        self.get(self.owner, reverse('dashboard'))
+        before = cache.cache_stats()
+        # Only the data version lookup reaches the database
+        with self.assertNumQueries(1):
+            response = self.get(self.owner, reverse('dashboard'))
+        self.assertEqual(response.data['topics'][0]['name'], 'Python')
+        self.assertEqual(cache.cache_stats()['hits'], before['hits'] + 1)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_local_cache_is_skipped_with_several_workers(self):
+        url = reverse('shared-topic-list')
+        self.get(self.peer, url)
+        Card.objects.filter(pk=self.card.pk).update(progress=60)  # Written by another worker
+        before = cache.cache_stats()
+        self.assertEqual(self.get(self.peer, url).data[0]['cards'][0]['progress'], 60)
+        self.assertEqual(cache.cache_stats(), before)
+
+    def test_card_change_invalidates_peer_shared_views(self):
+        url = reverse('shared-topic-list')
+        self.assertEqual(self.get(self.peer, url).data[0]['cards'][0]['progress'], 0)
+        self.card.progress = 60
+        self.card.save()
+        self.assertEqual(self.get(self.peer, url).data[0]['cards'][0]['progress'], 60)
+
+    def test_card_change_keeps_unrelated_scopes(self):
+        self.get(self.peer, reverse('peer-list'))
+        self.card.progress = 60
+        self.card.save()
+        before = cache.cache_stats()
+        self.get(self.peer, reverse('peer-list'))
+        self.assertEqual(cache.cache_stats()['hits'], before['hits'] + 1)
+
+    def test_removing_peer_invalidates_shared_views(self):
+        url = reverse('shared-topic-list')
+        self.assertEqual(len(self.get(self.peer, url).data), 1)
+        relationship = PeerRelationship.objects.get(requester=self.owner)
+        self.client.force_authenticate(self.owner)
+        self.client.delete(reverse('peer-detail', args=[relationship.id]))
+        self.assertEqual(self.get(self.peer, url).data, [])
+
+
+class BulkCardTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(user=self.user, name='Python')
+        self.other_topic = Topic.objects.create(user=self.user, name='Go')
+        self.cards = [Card.objects.create(topic=self.topic, name=f'Card {i}') for i in range(3)]
+
+    def test_mixed_operations(self):
+        response = self.client.post(reverse('card-bulk'), {
+            'create': [{'topic': self.topic.id, 'name': 'New'}, {'topic': self.other_topic.id, 'name': 'Other'}],
+            'update': [{'id': self.cards[0].id, 'progress': 100, 'starred': True}],
+            'delete': [self.cards[1].id],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([c['name'] for c in response.data['created']], ['New', 'Other'])
+        self.assertEqual(response.data['updated'][0]['progress'], 100)
+        self.assertEqual(response.data['deleted'], [self.cards[1].id])
+
+        self.cards[0].refresh_from_db()
+        self.assertTrue(self.cards[0].starred)
+        self.assertEqual(self.cards[0].name, 'Card 0')
+        self.assertFalse(Card.objects.filter(id=self.cards[1].id).exists())
+        self.assertEqual(self.topic.cards.count(), 3)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def run(count):
+            payload = {
+                'create': [{'topic': self.topic.id, 'name': f'New {i}'} for i in range(count)],
+                'update': [{'id': card.id, 'progress': 50} for card in Card.objects.all()],
+            }
+            # Includes the locked re-read of updated cards and one counter UPDATE per topic
+            with self.assertNumQueries(11):
+                response = self.client.post(reverse('card-bulk'), payload, format='json')
+            self.assertEqual(response.status_code, 200)
+        run(2)
+        run(20)
+
+    def test_foreign_topic_rejects_whole_batch(self):
+        stranger = User.objects.create_user(username='mallory')
+        foreign = Topic.objects.create(user=stranger, name='Secret')
+        response = self.client.post(reverse('card-bulk'), {
+            'create': [{'topic': self.topic.id, 'name': 'Mine'}, {'topic': foreign.id, 'name': 'Theirs'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Card.objects.count(), 3)
+
+    def test_foreign_card_is_rejected(self):
+        stranger = User.objects.create_user(username='mallory')
+        foreign_card = Card.objects.create(topic=Topic.objects.create(user=stranger, name='Secret'), name='X')
+        response = self.client.post(reverse('card-bulk'), {'delete': [foreign_card.id]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Card.objects.filter(id=foreign_card.id).exists())
+
+    def test_nested_topic_create_uses_one_insert_for_cards(self):
+        cards = [{'topic': self.topic.id, 'name': f'Card {i}'} for i in range(5)]
+        response = self.client.post(reverse('topic-list'), {'name': 'Rust', 'cards': cards}, format='json')
+        self.assertEqual(response.status_code, 201)
+        topic = Topic.objects.get(name='Rust')
+        self.assertEqual(topic.cards.count(), 5)
+
+
+@override_settings(ACCESS_LOG_BATCH_SIZE=1000, ACCESS_LOG_FLUSH_INTERVAL=3600, ACCESS_LOG_MAX_BUFFER=5)
+class AccessLogTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.topic = Topic.objects.create(user=self.owner, name='Python')
+        self.share = TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+        self.client.force_authenticate(self.peer)
+
+    def test_shared_topic_read_performs_no_writes(self):
+        url = reverse('shared-topic-detail', args=[self.topic.id])
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        writes = [q['sql'] for q in queries if not q['sql'].startswith('SELECT')]
+        self.assertEqual(writes, [])
+        self.assertEqual(ShareAccess.objects.count(), 0)
+
+        self.client.get(url)
+        self.assertEqual(access_log.flush(), 2)
+        self.assertEqual(ShareAccess.objects.filter(topic_share=self.share).count(), 2)
+
+    def test_revoked_share_is_refused_despite_a_current_etag(self):
+        url = reverse('shared-topic-detail', args=[self.topic.id])
+        etag = self.client.get(url)['ETag']
+        access_log.flush()
+        # Revoked without a version bump, so the ETag still matches
+        TopicShare.objects.filter(pk=self.share.pk).update(is_active=False)
+        authz.invalidate_shared_topics([self.peer.id])
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data, {'detail': 'No Topic matches the given query.'})
+        self.assertEqual(len(access_log.buffer), 0)
+
+    def test_flush_is_batched(self):
+        for _ in range(4):
+            access_log.record(self.topic.id, self.peer.id)
+        # share lookup, savepoint, insert, rollup insert + increment, release
+        with self.assertNumQueries(6):
+            self.assertEqual(access_log.flush(), 4)
+
+    def test_buffer_is_bounded(self):
+        for _ in range(8):
+            access_log.record(self.topic.id, self.peer.id)
+        self.assertEqual(len(access_log.buffer), 5)
+        self.assertEqual(access_log.flush(), 5)
+
+    def test_events_for_missing_shares_are_dropped(self):
+        access_log.record(self.topic.id, self.owner.id)
+        self.assertEqual(access_log.flush(), 0)
+
+    def test_gunicorn_flushes_stopping_workers(self):
+        hooks = runpy.run_path(os.path.join(settings.BASE_DIR, 'gunicorn.conf.py'))
+        access_log.record(self.topic.id, self.peer.id)
+        hooks['worker_exit'](None, None)
+        access_log.record(self.topic.id, self.peer.id)
+        hooks['worker_abort'](None)
+        self.assertEqual(len(access_log.buffer), 0)
+        self.assertEqual(ShareAccess.objects.filter(topic_share=self.share).count(), 2)
+
+    def test_idle_buffer_is_flushed_on_time(self):
+        flushed = threading.Event()
+        with override_settings(ACCESS_LOG_FLUSH_INTERVAL=0.05), \
+                patch.object(access_log.buffer, 'flush', side_effect=flushed.set):
+            # A single event, and no further request to notice it is due
+            access_log.record(self.topic.id, self.peer.id)
+            self.assertTrue(flushed.wait(5))
+        access_log.flush()
+
+
+@override_settings(ACCESS_LOG_BATCH_SIZE=1000, ACCESS_LOG_FLUSH_INTERVAL=3600)
+class ShareAccessStatsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peers = [User.objects.create_user(username=name) for name in ('bob', 'carol')]
+        self.topic = Topic.objects.create(user=self.owner, name='Python')
+        for peer in self.peers:
+            TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=peer)
+
+    def test_flush_maintains_daily_rollups(self):
+        for _ in range(3):
+            access_log.record(self.topic.id, self.peers[0].id)
+        access_log.record(self.topic.id, self.peers[1].id)
+        access_log.flush()
+        access_log.record(self.topic.id, self.peers[0].id)
+        access_log.flush()
+
+        counts = dict(ShareAccessDaily.objects.values_list('topic_share__peer__username', 'count'))
+        self.assertEqual(counts, {'bob': 4, 'carol': 1})
+
+    def test_stats_endpoint_reads_rollups(self):
+        share = TopicShare.objects.get(peer=self.peers[0])
+        today = timezone.localdate()
+        ShareAccessDaily.objects.create(topic_share=share, day=today, count=5)
+        ShareAccessDaily.objects.create(topic_share=share, day=today - timedelta(days=2), count=2)
+        ShareAccessDaily.objects.create(topic_share=share, day=today - timedelta(days=40), count=9)
+
+        self.client.force_authenticate(self.owner)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('topic-stats', args=[self.topic.id]), {'days': 7})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['total'], 7)
+        self.assertEqual([row['count'] for row in response.data['daily']], [2, 5])
+        self.assertEqual(response.data['by_peer'], [{'peer': {'id': self.peers[0].id, 'username': 'bob'}, 'count': 7}])
+
+    def test_stats_are_owner_only(self):
+        self.client.force_authenticate(self.peers[0])
+        response = self.client.get(reverse('topic-stats', args=[self.topic.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_compaction_deletes_only_expired_rows(self):
+        share = TopicShare.objects.get(peer=self.peers[0])
+        old = timezone.now() - timedelta(days=100)
+        ShareAccess.objects.bulk_create([ShareAccess(topic_share=share, accessed_at=old) for _ in range(5)])
+        ShareAccess.objects.create(topic_share=share)
+
+        call_command('compact_share_access', days=90, chunk_size=2, stdout=StringIO())
+        self.assertEqual(ShareAccess.objects.count(), 1)
+
+
+class UserSearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='searcher')
+        for name in ('xalicex', 'alice', 'alicia_long_name', 'malice', 'bob'):
+            User.objects.create_user(username=name)
+        self.client.force_authenticate(self.user)
+
+    def search(self, query, **extra):
+        response = self.client.post(reverse('peer-search'), {'query': query, **extra}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return [user['username'] for user in response.data]
+
+    def test_prefix_matches_rank_first(self):
+        self.assertEqual(self.search('ali'), ['alice', 'alicia_long_name', 'malice', 'xalicex'])
+
+    def test_short_queries_still_match(self):
+        self.assertEqual(self.search('bo'), ['bob'])
+
+    def test_excludes_self_and_existing_relationships(self):
+        PeerRelationship.objects.create(requester=self.user, addressee=User.objects.get(username='alice'))
+        PeerRelationship.objects.create(
+            requester=User.objects.get(username='malice'), addressee=self.user, status='accepted'
+        )
+        self.assertEqual(self.search('ali'), ['alicia_long_name', 'xalicex'])
+        self.assertEqual(self.search('searcher'), [])
+
+    def test_results_are_paged(self):
+        self.assertEqual(self.search('ali', limit=2), ['alice', 'alicia_long_name'])
+        self.assertEqual(self.search('ali', limit=2, offset=2), ['malice', 'xalicex'])
+
+    def test_renamed_users_are_found(self):
+        bob = User.objects.get(username='bob')
+        bob.username = 'robert'
+        bob.save()
+        self.assertEqual(self.search('rober'), ['robert'])
+        self.assertEqual(self.search('bob'), [])
+
+
+
+class CardSearchTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        topic = Topic.objects.create(user=self.owner, name='Databases')
+        self.named = Card.objects.create(topic=topic, name='Indexing strategies', note='B-trees')
+        self.noted = Card.objects.create(topic=topic, name='Query plans', note='Read about indexes <b>later</b>')
+        self.shared_topic = Topic.objects.create(user=self.peer, name='Shared')
+        self.shared = Card.objects.create(topic=self.shared_topic, name='Index tuning', resource='https://example.com')
+        Card.objects.create(topic=Topic.objects.create(user=self.peer, name='Private'), name='Index secrets')
+        self.share = TopicShare.objects.create(topic=self.shared_topic, owner=self.peer, peer=self.owner)
+        self.client.force_authenticate(self.owner)
+
+    def search(self, q, **params):
+        response = self.client.get(reverse('card-search'), {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, q, **params):
+        return [result['id'] for result in self.search(q, **params)['results']]
+
+    def test_ranks_name_matches_above_notes_across_own_and_shared_topics(self):
+        ids = self.ids('index')
+        self.assertEqual(set(ids), {self.named.id, self.noted.id, self.shared.id})
+        self.assertEqual(ids[-1], self.noted.id)
+        result = self.search('tuning')['results'][0]
+        self.assertEqual((result['id'], result['shared'], result['topic_name']), (self.shared.id, True, 'Shared'))
+
+    def test_revoked_shares_are_not_searched(self):
+        self.share.is_active = False
+        self.share.save()
+        self.assertEqual(self.ids('tuning'), [])
+
+    def test_snippets_are_escaped_and_highlighted(self):
+        snippet = self.search('later')['results'][0]['snippet']
+        self.assertIn('&lt;b&gt;<mark>later</mark>&lt;/b&gt;', snippet)
+
+    def test_index_follows_card_writes(self):
+        self.named.name = 'Sharding'
+        self.named.save()
+        self.noted.delete()
+        self.assertEqual(self.ids('shard'), [self.named.id])
+        self.assertEqual(self.ids('index'), [self.shared.id])
+
+    def test_results_are_paged(self):
+        first = self.search('index', limit=2)
+        self.assertEqual(first['next_offset'], 2)
+        rest = self.search('index', limit=2, offset=2)
+        self.assertIsNone(rest['next_offset'])
+        self.assertEqual(
+            [r['id'] for r in first['results'] + rest['results']], self.ids('index')
+        )
+
+    def test_rejects_short_queries(self):
+        self.assertEqual(self.client.get(reverse('card-search'), {'q': 'i'}).status_code, 400)
+
+    def test_other_databases_are_refused_with_501(self):
+        with patch('api.search.connection', SimpleNamespace(vendor='mysql')):
+            response = self.client.get(reverse('card-search'), {'q': 'index'})
+        self.assertEqual(response.status_code, 501)
+        self.assertEqual(response.data['detail'], 'Card search is not supported on mysql.')
+
+class PeerEdgeTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.alice = User.objects.create_user(username='alice')
+        self.bob = User.objects.create_user(username='bob')
+
+    def edges(self):
+        return set(PeerEdge.objects.values_list('user__username', 'peer__username'))
+
+    def test_edges_follow_relationship_status(self):
+        relationship = PeerRelationship.objects.create(requester=self.alice, addressee=self.bob)
+        self.assertEqual(self.edges(), set())
+
+        relationship.status = 'accepted'
+        relationship.save()
+        self.assertEqual(self.edges(), {('alice', 'bob'), ('bob', 'alice')})
+
+        relationship.status = 'blocked'
+        relationship.save()
+        self.assertEqual(self.edges(), set())
+
+    def test_deleting_relationship_removes_edges(self):
+        relationship = PeerRelationship.objects.create(requester=self.alice, addressee=self.bob, status='accepted')
+        relationship.delete()
+        self.assertEqual(self.edges(), set())
+
+    def test_accept_flow_and_peer_listing(self):
+        self.client.force_authenticate(self.alice)
+        self.client.post(reverse('peer-request'), {'user_id': self.bob.id}, format='json')
+        relationship = PeerRelationship.objects.get()
+
+        self.client.force_authenticate(self.bob)
+        self.client.post(reverse('peer-accept', args=[relationship.id]))
+        for user in (self.alice, self.bob):
+            self.client.force_authenticate(user)
+            response = self.client.get(reverse('peer-list'))
+            self.assertEqual([peer['id'] for peer in response.data], [relationship.id])
+
+        response = self.client.post(reverse('peer-request'), {'user_id': self.alice.id}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_share_requires_peer_edge(self):
+        topic = Topic.objects.create(user=self.alice, name='Python')
+        self.client.force_authenticate(self.alice)
+        url = reverse('topic-share', args=[topic.id])
+        self.assertEqual(self.client.post(url, {'peer_id': self.bob.id}, format='json').status_code, 400)
+
+        PeerRelationship.objects.create(requester=self.bob, addressee=self.alice, status='accepted')
+        self.assertEqual(self.client.post(url, {'peer_id': self.bob.id}, format='json').status_code, 201)
+
+
+class AuthorizationCacheTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.relationship = PeerRelationship.objects.create(requester=self.owner, addressee=self.peer, status='accepted')
+        self.topic = Topic.objects.create(user=self.owner, name='Python')
+
+    def test_peer_checks_are_served_from_cache(self):
+        with self.assertNumQueries(1):
+            self.assertTrue(authz.is_peer(self.owner.id, self.peer.id))
+        with self.assertNumQueries(0):
+            self.assertTrue(authz.is_peer(self.owner.id, self.peer.id))
+            self.assertFalse(authz.is_peer(self.owner.id, self.owner.id))
+
+    def test_removing_relationship_invalidates_peer_sets(self):
+        self.assertTrue(authz.is_peer(self.owner.id, self.peer.id))
+        self.relationship.delete()
+        self.assertFalse(authz.is_peer(self.owner.id, self.peer.id))
+        self.assertFalse(authz.is_peer(self.peer.id, self.owner.id))
+
+    def test_share_changes_invalidate_shared_topic_ids(self):
+        self.assertFalse(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+        share = TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+        self.assertTrue(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+        share.is_active = False
+        share.save()
+        self.assertFalse(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+
+    def test_deleting_topic_invalidates_shared_topic_ids(self):
+        TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+        self.assertTrue(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+        self.topic.delete()
+        self.assertFalse(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+
+    def test_removing_peer_revokes_shared_topic_access(self):
+        TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+        self.client.force_authenticate(self.peer)
+        url = reverse('shared-topic-detail', args=[self.topic.id])
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+        self.client.force_authenticate(self.owner)
+        self.client.delete(reverse('peer-detail', args=[self.relationship.id]))
+        self.client.force_authenticate(self.peer)
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+    @override_settings(WEB_CONCURRENCY=4)
+    def test_local_cache_is_skipped_with_several_workers(self):
+        share = TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+        self.assertTrue(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+        # Revoked in another worker: nothing here was invalidated
+        TopicShare.objects.filter(pk=share.pk).update(is_active=False)
+        with self.assertNumQueries(1):
+            self.assertFalse(authz.can_view_shared_topic(self.peer.id, self.topic.id))
+
+
+class SystemCheckTests(ApiTestCase):
+    def test_deploy_check_requires_redis_eviction(self):
+        redis_caches = {
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'responses': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'},
+        }
+        cases = [
+            ({'maxmemory': '0', 'maxmemory-policy': 'noeviction'}, ['api.W001']),
+            ({'maxmemory': '1073741824', 'maxmemory-policy': 'noeviction'}, ['api.W001']),
+            ({'maxmemory': '1073741824', 'maxmemory-policy': 'allkeys-lru'}, []),
+            (None, ['api.W002']),
+        ]
+        with override_settings(CACHES=redis_caches):
+            for memory, expected in cases:
+                with patch('api.checks.redis_memory_config', return_value=memory) as config:
+                    messages = checks.check_response_cache_is_bounded(None)
+                self.assertEqual([message.id for message in messages], expected, memory)
+                config.assert_called_with('redis://cache:6379')
+        self.assertEqual(checks.check_response_cache_is_bounded(None), [])
+
+    def test_deploy_check_requires_a_shared_authz_cache(self):
+        self.assertEqual(checks.check_authz_cache_is_shared(None), [])
+        with override_settings(WEB_CONCURRENCY=4):
+            self.assertEqual([message.id for message in checks.check_authz_cache_is_shared(None)], ['api.E001'])
+            with override_settings(CACHES={
+                'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache:6379'},
+            }):
+                self.assertEqual(checks.check_authz_cache_is_shared(None), [])
+
+
+class SparseFieldsetTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(user=self.user, name='Python')
+        for i in range(3):
+            Card.objects.create(topic=self.topic, name=f'Card {i}', note='x' * 1000, resource='https://example.com')
+
+    def card_sql(self, queries):
+        return [q['sql'] for q in queries if 'FROM "api_card"' in q['sql']]
+
+    def test_topic_list_projects_nested_cards(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('topic-list'), {'fields': 'id,name,cards.id,cards.name,cards.progress'})
+        self.assertEqual(set(response.data[0]), {'id', 'name', 'cards'})
+        self.assertEqual(set(response.data[0]['cards'][0]), {'id', 'name', 'progress'})
+        [card_sql] = self.card_sql(ctx.captured_queries)
+        self.assertNotIn('"note"', card_sql)
+        self.assertNotIn('"resource"', card_sql)
+
+    def test_omit_drops_nested_fields_only(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('topic-detail', args=[self.topic.id]), {'omit': 'cards.note,cards.resource'})
+        self.assertEqual(set(response.data), {'id', 'name', 'collapsed', 'cards'})
+        self.assertNotIn('note', response.data['cards'][0])
+        self.assertIn('progress', response.data['cards'][0])
+        [card_sql] = self.card_sql(ctx.captured_queries)
+        self.assertNotIn('"note"', card_sql)
+
+    def test_omitting_cards_skips_prefetch(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('topic-list'), {'omit': 'cards'})
+        self.assertNotIn('cards', response.data[0])
+        self.assertEqual(self.card_sql(ctx.captured_queries), [])
+
+    def test_card_list_pages_with_projection(self):
+        response = self.client.get(reverse('card-list'), {'fields': 'id,name', 'page_size': 2})
+        self.assertEqual([set(card) for card in response.data['results']], [{'id', 'name'}] * 2)
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual([card['name'] for card in response.data['results']], ['Card 2'])
+
+    def test_shared_topic_projection(self):
+        PeerRelationship.objects.create(requester=self.user, addressee=self.peer, status='accepted')
+        TopicShare.objects.create(topic=self.topic, owner=self.user, peer=self.peer)
+        self.client.force_authenticate(self.peer)
+        response = self.client.get(reverse('shared-topic-list'), {'fields': 'name,owner,cards.name'})
+        self.assertEqual(response.data[0]['owner'], {'id': self.user.id, 'username': 'alice'})
+        self.assertEqual(response.data[0]['cards'][0], {'name': 'Card 0'})
+
+    def test_writes_ignore_projection(self):
+        response = self.client.post(reverse('topic-list') + '?fields=id', {'name': 'Go'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['name'], 'Go')
+
+
+class TopicSummaryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(user=self.user, name='Python')
+        Card.objects.create(topic=self.topic, name='Basics', progress=100, starred=True)
+        Card.objects.create(topic=self.topic, name='Async', progress=50)
+        Card.objects.create(topic=self.topic, name='Typing', progress=0, starred=True)
+        self.empty = Topic.objects.create(user=self.user, name='Go')
+
+    def test_topic_summary_counts(self):
+        response = self.client.get(reverse('topic-summary'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data, key=lambda topic: topic['name']), [
+            {'id': self.empty.id, 'name': 'Go', 'collapsed': False, 'card_count': 0,
+             'starred_count': 0, 'completed_count': 0, 'average_progress': 0.0},
+            {'id': self.topic.id, 'name': 'Python', 'collapsed': False, 'card_count': 3,
+             'starred_count': 2, 'completed_count': 1, 'average_progress': 50.0},
+        ])
+
+    def test_topic_summary_is_one_query_for_any_number_of_topics(self):
+        for i in range(10):
+            topic = Topic.objects.create(user=self.user, name=f'Extra {i}')
+            Card.objects.create(topic=topic, name='Card')
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(reverse('topic-summary'))
+        self.assertEqual(len([q for q in ctx.captured_queries if 'FROM "api_topic"' in q['sql']]), 1)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith('SELECT "api_card"')])
+
+    def test_topic_summary_reflects_card_changes(self):
+        self.client.get(reverse('topic-summary'))
+        Card.objects.create(topic=self.empty, name='Card', progress=100)
+        response = self.client.get(reverse('topic-summary'))
+        summary = {topic['id']: topic for topic in response.data}
+        self.assertEqual(summary[self.empty.id]['completed_count'], 1)
+
+    def test_shared_topic_summary(self):
+        PeerRelationship.objects.create(requester=self.user, addressee=self.peer, status='accepted')
+        TopicShare.objects.create(topic=self.topic, owner=self.user, peer=self.peer)
+        self.client.force_authenticate(self.peer)
+        response = self.client.get(reverse('shared-topic-summary'))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(response.data[0]['owner'], {'id': self.user.id, 'username': 'alice'})
+        self.assertEqual(response.data[0]['card_count'], 3)
+
+
+class TopicCounterTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.client.force_authenticate(self.user)
+        self.topic = Topic.objects.create(user=self.user, name='Python')
+        self.other = Topic.objects.create(user=self.user, name='Go')
+
+    def assertCounters(self, topic, card_count, completed_count, starred_count, progress_sum):
+        topic.refresh_from_db()
+        self.assertEqual(
+            (topic.card_count, topic.completed_count, topic.starred_count, topic.progress_sum),
+            (card_count, completed_count, starred_count, progress_sum)
+        )
+        self.assertEqual(counters.recount([topic], dry_run=True), [])
+
+    def test_card_create_update_move_and_delete(self):
+        card = Card.objects.create(topic=self.topic, name='Basics', progress=40, starred=True)
+        self.assertCounters(self.topic, 1, 0, 1, 40)
+        card.progress = 100
+        card.starred = False
+        card.save()
+        self.assertCounters(self.topic, 1, 1, 0, 100)
+        card.topic = self.other
+        card.save()
+        self.assertCounters(self.topic, 0, 0, 0, 0)
+        self.assertCounters(self.other, 1, 1, 0, 100)
+        card.delete()
+        self.assertCounters(self.other, 0, 0, 0, 0)
+
+    def test_counters_keep_updating_after_a_failed_topic_delete(self):
+        card = Card.objects.create(topic=self.topic, name='Basics', progress=40)
+
+        def fail(**kwargs):
+            raise DatabaseError("delete failed")
+        post_delete.connect(fail, sender=Card, dispatch_uid='fail-card-delete')
+        try:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                self.topic.delete()
+        finally:
+            post_delete.disconnect(sender=Card, dispatch_uid='fail-card-delete')
+
+        self.assertCounters(self.topic, 1, 0, 0, 40)
+        Card.objects.create(topic=self.topic, name='Closures', progress=100)
+        card.delete()
+        self.assertCounters(self.topic, 1, 1, 0, 100)
+
+    def test_stale_instances_apply_stored_values(self):
+        card = Card.objects.create(topic=self.topic, name='Basics', progress=10)
+        first, second = Card.objects.get(pk=card.pk), Card.objects.get(pk=card.pk)
+        first.progress = 100
+        first.save()
+        # second still holds progress=10 but the delta is taken from the stored row
+        second.progress = 30
+        second.save()
+        self.assertCounters(self.topic, 1, 0, 0, 30)
+        first.delete()
+        self.assertCounters(self.topic, 0, 0, 0, 0)
+
+    def test_topic_save_does_not_overwrite_counters(self):
+        stale = Topic.objects.get(pk=self.topic.pk)
+        Card.objects.create(topic=self.topic, name='Basics', progress=100)
+        stale.name = 'Python 3'
+        stale.save()
+        self.assertCounters(self.topic, 1, 1, 0, 100)
+
+    def test_bulk_and_nested_writes(self):
+        response = self.client.post(reverse('topic-list'), {
+            'name': 'Rust', 'cards': [{'topic': self.topic.id, 'name': f'Card {i}', 'progress': 50} for i in range(4)]
+        }, format='json')
+        rust = Topic.objects.get(pk=response.data['id'])
+        self.assertCounters(rust, 4, 0, 0, 200)
+
+        ids = list(rust.cards.values_list('id', flat=True))
+        self.client.post(reverse('card-bulk'), {
+            'create': [{'topic': rust.id, 'name': 'New', 'starred': True}],
+            'update': [{'id': ids[0], 'progress': 100}, {'id': ids[1], 'topic': self.other.id}],
+            'delete': [ids[2]],
+        }, format='json')
+        self.assertCounters(rust, 3, 1, 1, 150)
+        self.assertCounters(self.other, 1, 0, 0, 50)
+
+    def test_topic_delete_skips_counter_updates(self):
+        Card.objects.create(topic=self.topic, name='Basics')
+        with CaptureQueriesContext(connection) as ctx:
+            self.topic.delete()
+        self.assertFalse([q for q in ctx.captured_queries if 'card_count' in q['sql']])
+
+    def test_summary_reads_counters_only(self):
+        Card.objects.create(topic=self.topic, name='Basics', progress=100, starred=True)
+        Card.objects.create(topic=self.topic, name='Async', progress=50)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('topic-summary'))
+        self.assertFalse([q for q in ctx.captured_queries if 'api_card' in q['sql']])
+        summary = {topic['id']: topic for topic in response.data}
+        self.assertEqual(summary[self.topic.id]['average_progress'], 75.0)
+        self.assertEqual(summary[self.other.id]['average_progress'], 0.0)
+
+    def test_recount_command_fixes_drift(self):
+        Card.objects.create(topic=self.topic, name='Basics', progress=100)
+        Topic.objects.filter(pk=self.topic.pk).update(card_count=7, progress_sum=0)
+        out = StringIO()
+        call_command('recount_topic_counters', '--dry-run', stdout=out)
+        self.assertIn('would fix 1', out.getvalue())
+        call_command('recount_topic_counters', stdout=StringIO())
+        self.assertCounters(self.topic, 1, 1, 0, 100)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ConcurrentCounterTests(APITransactionTestCase):
+    # Row locks only exist on a real server (PostgreSQL); SQLite ignores
+    # select_for_update, so without it the locking is never exercised
+    THREADS = 6
+
+    def test_parallel_card_writes_keep_counters_exact(self):
+        user = User.objects.create_user(username='alice')
+        topic = Topic.objects.create(user=user, name='Python')
+        shared = Card.objects.create(topic=topic, name='Shared', progress=0)
+        owned = [
+            [Card.objects.create(topic=topic, name=f'Card {n}.{i}', progress=100, starred=True) for i in range(5)]
+            for n in range(self.THREADS)
+        ]
+        barrier = threading.Barrier(self.THREADS)
+        errors = []
+
+        def write(n):
+            try:
+                barrier.wait()
+                for i, card in enumerate(owned[n]):
+                    Card.objects.create(topic=topic, name=f'New {n}.{i}', progress=i * 25, starred=i % 2 == 0)
+                    card.delete()
+                    # Every thread edits the same card from its own stale copy
+                    stale = Card.objects.get(pk=shared.pk)
+                    stale.progress = (n * 5 + i) % 101
+                    stale.starred = not stale.starred
+                    stale.save()
+            except Exception as error:  # Reported on the main thread
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=write, args=(n,)) for n in range(self.THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        topic.refresh_from_db()
+        self.assertEqual(topic.card_count, 1 + 5 * self.THREADS)
+        self.assertEqual(
+            counters.actual_counters([topic.pk])[topic.pk],
+            {field: getattr(topic, field) for field in counters.COUNTER_FIELDS}
+        )
+
+
+class ValuesReaderParityTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bøb')
+        PeerRelationship.objects.create(requester=self.user, addressee=self.peer, status='accepted')
+        PeerRelationship.objects.create(requester=User.objects.create_user(username='carol'), addressee=self.user)
+        for t in range(3):
+            topic = Topic.objects.create(user=self.user, name=f'Topic {t}   "quoted"', collapsed=bool(t % 2))
+            TopicShare.objects.create(topic=topic, owner=self.user, peer=self.peer)
+            for c in range(t * 2):
+                Card.objects.create(topic=topic, name=f'Card {c} ✓', note='line\nbreak', progress=c * 30, starred=bool(c % 2))
+
+    def assertParity(self, serializer_class, queryset, query=''):
+        request = APIRequestFactory().get('/' + query)
+        context = {'request': Request(request)}
+        expected = JSONRenderer().render(serializer_class(queryset, many=True, context=context).data)
+        actual = JSONRenderer().render(serialize_many(serializer_class, queryset, context))
+        self.assertEqual(actual, expected)
+
+    def test_serializers_render_identical_bytes(self):
+        self.assertParity(CardSerializer, Card.objects.all())
+        self.assertParity(TopicSerializer, Topic.objects.prefetch_related('cards'))
+        self.assertParity(SharedTopicSerializer, Topic.objects.select_related('user').prefetch_related('cards'))
+        self.assertParity(PeerRelationshipSerializer, PeerRelationship.objects.select_related('requester', 'addressee'))
+
+    def test_projected_serializers_render_identical_bytes(self):
+        self.assertParity(TopicSerializer, Topic.objects.all(), '?fields=id,cards.name,cards.updated_at')
+        self.assertParity(SharedTopicSerializer, Topic.objects.all(), '?omit=cards,name')
+        self.assertParity(CardSerializer, Card.objects.all(), '?omit=note,resource')
+
+    def test_parity_in_non_utc_timezone(self):
+        with timezone.override('America/New_York'):
+            self.assertParity(CardSerializer, Card.objects.all())
+
+    def test_list_views_match_drf_output(self):
+        for user, name, params in [
+            (self.user, 'topic-list', {}), (self.user, 'topic-list', {'page_size': 2}),
+            (self.user, 'card-list', {}), (self.user, 'peer-list', {}), (self.peer, 'shared-topic-list', {}),
+        ]:
+            self.client.force_authenticate(user)
+            fast = self.client.get(reverse(name), params).content
+            for backend in caches.all():
+                backend.clear()
+            with patch.object(ValuesReadMixin, 'get_values_reader', return_value=None):
+                slow = self.client.get(reverse(name), params).content
+            self.assertEqual(fast, slow, name)
+
+    def test_unsupported_fields_fall_back_to_drf(self):
+        self.assertIsNone(ValuesReader.for_serializer(TopicSummarySerializer()))
+
+
+class RendererTests(ApiTestCase):
+    sample = {
+        'text': 'naïve ✓ "quoted" \\ slash/     \x00\x1f\t\n',
+        'when': timezone.now().replace(microsecond=123456),
+        'day': timezone.localdate(),
+        'duration': timedelta(seconds=90),
+        'amount': [Decimal('12.50'), Decimal('1E-7'), Decimal('1E+20')],
+        'lazy': gettext_lazy('Access revoked'),
+        'numbers': [0, -1, 2 ** 63 - 1, 0.1, 75.0, 66.66666666666667, True, None],
+        1: 'non-string key',
+        'nested': ReturnDict({'cards': ReturnList([{'id': 1}], serializer=None)}, serializer=None),
+    }
+
+    def test_orjson_renderer_matches_drf_bytes(self):
+        self.assertEqual(ORJSONRenderer().render(self.sample), JSONRenderer().render(self.sample))
+
+    def test_orjson_renderer_falls_back_for_big_ints_and_indent(self):
+        data = {'big': 2 ** 70}
+        self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        context = {'indent': 4}
+        self.assertEqual(ORJSONRenderer().render(self.sample, renderer_context=context),
+                         JSONRenderer().render(self.sample, renderer_context=context))
+
+    def test_orjson_parser(self):
+        parser = ORJSONParser()
+        body = '{"name": "✓", "n": [1, 2.5, null], "big": 1180591620717411303424}'.encode()
+        self.assertEqual(parser.parse(BytesIO(body)), JSONParser().parse(BytesIO(body)))
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"broken": '))
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"n": NaN}'))
+
+    def test_msgpack_negotiation(self):
+        user = User.objects.create_user(username='alice')
+        self.client.force_authenticate(user)
+        response = self.client.post(
+            reverse('topic-list'), msgpack.packb({'name': 'Go ✓'}),
+            content_type='application/msgpack', HTTP_ACCEPT='application/msgpack'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Content-Type'], 'application/msgpack')
+        self.assertEqual(msgpack.unpackb(response.content)['name'], 'Go ✓')
+
+        json_body = self.client.get(reverse('topic-list')).json()
+        msgpack_body = msgpack.unpackb(self.client.get(reverse('topic-list'), HTTP_ACCEPT='application/msgpack').content)
+        self.assertEqual(msgpack_body, json_body)
+
+    def test_invalid_msgpack_is_a_bad_request(self):
+        self.client.force_authenticate(User.objects.create_user(username='alice'))
+        response = self.client.post(reverse('topic-list'), b'\xc1', content_type='application/msgpack')
+        self.assertEqual(response.status_code, 400)
+
+
+class AccountTransferTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.client.force_authenticate(self.user)
+        for t in range(3):
+            topic = Topic.objects.create(user=self.user, name=f'Topic {t}')
+            for c in range(4):
+                Card.objects.create(topic=topic, name=f'Card {c} ✓', note='line\nbreak', progress=c * 40, starred=c == 1)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content)
+
+    def test_export_is_ndjson(self):
+        lines = [json.loads(line) for line in self.export().splitlines()]
+        self.assertEqual(lines[0]['type'], 'export')
+        self.assertEqual([line['type'] for line in lines[1:]], ['topic'] * 3 + ['card'] * 12)
+        self.assertEqual(lines[4]['note'], 'line\nbreak')
+
+    def test_export_reads_in_chunks(self):
+        with CaptureQueriesContext(connection) as ctx:
+            lines = list(transfer.export_lines(self.user, chunk_size=5))
+        self.assertEqual(len(lines), 16)
+        # SQLite has no server-side cursors, so iterator() still issues one query per model
+        self.assertEqual(len(ctx.captured_queries), 2)
+
+    def test_round_trip_into_another_account(self):
+        body = self.export(gzip=1)
+        other = User.objects.create_user(username='bob')
+        self.client.force_authenticate(other)
+        with patch('api.events.publish') as publish, CaptureQueriesContext(connection) as queries:
+            response = self.client.generic('POST', reverse('import'), body, content_type='application/gzip')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data, {'topics': 3, 'cards': 12})
+        # Each row is written once, with its exported created_at
+        self.assertEqual([q['sql'] for q in queries if q['sql'].startswith('UPDATE') and 'created_at' in q['sql']], [])
+        imported = sorted(Topic.objects.filter(user=other).values_list('id', flat=True))
+        publish.assert_called_once_with([other.id], events.TOPICS_CHANGED, topics=imported)
+
+        def snapshot(user):
+            return sorted(Card.objects.filter(topic__user=user).values_list(
+                'topic__name', 'name', 'note', 'progress', 'starred', 'created_at'
+            ))
+        self.assertEqual(snapshot(other), snapshot(self.user))
+        topic = Topic.objects.filter(user=other).get(name='Topic 0')
+        self.assertEqual((topic.card_count, topic.completed_count, topic.starred_count), (4, 1, 1))
+
+    def test_bad_line_rolls_back_whole_import(self):
+        body = self.export() + b'{"type": "card", "topic": 999, "name": "Orphan"}\n'
+        response = self.client.generic('POST', reverse('import'), body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('line 17', response.data['error'])
+        self.assertEqual(Topic.objects.count(), 3)
+
+    def test_import_command_reads_gzip_files(self):
+        path = os.path.join(self.enterContext(tempfile.TemporaryDirectory()), 'export.ndjson.gz')
+        call_command('export_account', 'alice', '--output', path, '--gzip')
+        out = StringIO()
+        call_command('import_account', 'alice', '--input', path, '--chunk-size', '5', stdout=out)
+        self.assertIn('Imported 3 topics and 12 cards', out.getvalue())
+        self.assertEqual(Card.objects.filter(topic__user=self.user).count(), 24)
+
+
+@override_settings(SYNC_CURSOR_OVERLAP=0)
+class SyncTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        PeerRelationship.objects.create(requester=self.owner, addressee=self.peer, status='accepted')
+        self.topic = Topic.objects.create(user=self.owner, name='Shared')
+        self.private = Topic.objects.create(user=self.owner, name='Private')
+        self.cards = [Card.objects.create(topic=self.topic, name=f'Card {i}') for i in range(3)]
+        Card.objects.create(topic=self.private, name='Hidden')
+        self.share = TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+
+    def sync(self, user, since=None):
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('sync'), {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def ids(self, data, collection):
+        return sorted(row['id'] for row in data[collection])
+
+    def test_full_sync_returns_everything_visible(self):
+        data = self.sync(self.peer)
+        self.assertTrue(data['cursor'].isdigit())
+        self.assertEqual(self.ids(data, 'topics'), [self.topic.id])
+        self.assertEqual(self.ids(data, 'cards'), [card.id for card in self.cards])
+        self.assertEqual(self.ids(data, 'shares'), [self.share.id])
+        self.assertEqual(len(data['peers']), 1)
+        self.assertEqual(data['deleted'], {'topics': [], 'cards': [], 'shares': [], 'peers': []})
+
+    def test_delta_contains_only_changes_since_cursor(self):
+        cursor = self.sync(self.owner)['cursor']
+        self.cards[0].progress = 50
+        self.cards[0].save()
+        deleted_id = self.cards[1].id
+        self.cards[1].delete()
+
+        data = self.sync(self.owner, cursor)
+        self.assertEqual(self.ids(data, 'cards'), [self.cards[0].id])
+        self.assertEqual(data['topics'], [])
+        self.assertEqual(data['deleted']['cards'], [deleted_id])
+        self.assertGreaterEqual(int(data['cursor']), int(cursor))
+        # The peer sees the same deletion in the shared topic
+        self.assertEqual(self.sync(self.peer, cursor)['deleted']['cards'], [deleted_id])
+
+    def test_revoked_and_restored_share(self):
+        cursor = self.sync(self.peer)['cursor']
+        self.share.is_active = False
+        self.share.save()
+        data = self.sync(self.peer, cursor)
+        self.assertEqual(data['deleted']['topics'], [self.topic.id])
+        self.assertEqual(self.ids(data, 'shares'), [self.share.id])
+
+        # Re-sharing sends the whole topic again, and no longer reports it deleted
+        self.share.is_active = True
+        self.share.save()
+        data = self.sync(self.peer, cursor)
+        self.assertEqual(self.ids(data, 'topics'), [self.topic.id])
+        self.assertEqual(self.ids(data, 'cards'), [card.id for card in self.cards])
+        self.assertEqual(data['deleted']['topics'], [])
+
+    def test_topic_and_peer_deletions_are_fanned_out(self):
+        cursor = self.sync(self.peer)['cursor']
+        self.client.force_authenticate(self.owner)
+        relationship = PeerRelationship.objects.get()
+        self.assertEqual(self.client.delete(reverse('peer-detail', args=[relationship.id])).status_code, 204)
+        data = self.sync(self.peer, cursor)
+        self.assertEqual(data['deleted']['topics'], [self.topic.id])
+        self.assertEqual(data['deleted']['peers'], [relationship.id])
+
+        topic_id, share_id = self.topic.id, self.share.id
+        self.topic.delete()
+        data = self.sync(self.owner, cursor)
+        self.assertEqual(data['deleted']['topics'], [topic_id])
+        self.assertEqual(data['deleted']['shares'], [share_id])
+
+    def test_moved_card_is_deleted_only_for_users_who_lost_it(self):
+        cursor = self.sync(self.owner)['cursor']
+        self.client.force_authenticate(self.owner)
+        response = self.client.post(reverse('card-bulk'), {
+            'update': [{'id': self.cards[0].id, 'topic': self.private.id}],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.sync(self.peer, cursor)['deleted']['cards'], [self.cards[0].id])
+        data = self.sync(self.owner, cursor)
+        self.assertEqual(self.ids(data, 'cards'), [self.cards[0].id])
+        self.assertEqual(data['deleted']['cards'], [])
+
+    def test_deleting_a_user_with_shared_topics(self):
+        cursor = self.sync(self.peer)['cursor']
+        topic_id = self.topic.id
+        owner_id = self.owner.pk
+        self.owner.delete()
+        connection.check_constraints()
+        self.assertFalse(Topic.objects.filter(id=topic_id).exists())
+        self.assertFalse(Tombstone.objects.filter(user_id=owner_id).exists())
+        self.assertEqual(self.sync(self.peer, cursor)['deleted']['topics'], [topic_id])
+
+    @override_settings(SYNC_CURSOR_OVERLAP=10)
+    def test_late_commits_are_synced_within_the_overlap(self):
+        for model in (Card, TopicShare):  # A recent share would send the whole topic
+            model.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+        cursor = self.sync(self.peer)['cursor']
+        since = sync.decode_cursor(cursor)
+        # Stamped before the cursor was handed out, committed after it
+        Card.objects.filter(pk=self.cards[0].pk).update(name='Late', updated_at=since - timedelta(seconds=9))
+        Card.objects.filter(pk=self.cards[1].pk).update(name='Too late', updated_at=since - timedelta(seconds=11))
+        self.assertEqual(self.ids(self.sync(self.peer, cursor), 'cards'), [self.cards[0].id])
+
+    def test_imports_are_stamped_when_they_commit(self):
+        lines = list(transfer.export_lines(self.owner))
+        long_ago = timezone.now() - timedelta(hours=1)
+        with self.captureOnCommitCallbacks(execute=True):
+            transfer.import_lines(self.peer, lines)
+            # As if the import had taken an hour
+            Topic.objects.filter(user=self.peer).update(updated_at=long_ago)
+            Card.objects.filter(topic__user=self.peer).update(updated_at=long_ago)
+            committed = timezone.now()
+        self.assertFalse(Topic.objects.filter(user=self.peer, updated_at__lt=committed).exists())
+        self.assertFalse(Card.objects.filter(topic__user=self.peer, updated_at__lt=committed).exists())
+        self.assertEqual(Card.objects.filter(topic__user=self.peer).count(), 4)
+
+    def test_bad_cursors(self):
+        self.client.force_authenticate(self.owner)
+        now = timezone.now()
+        self.assertEqual(self.client.get(reverse('sync'), {'since': 'abc'}).status_code, 400)
+        future = sync.encode_cursor(now + timedelta(hours=1))
+        self.assertEqual(self.client.get(reverse('sync'), {'since': future}).status_code, 400)
+        expired = sync.encode_cursor(now - timedelta(days=31))
+        response = self.client.get(reverse('sync'), {'since': expired})
+        self.assertEqual(response.status_code, 410)
+        self.assertIn('error', response.data)
+
+
+class RecordingBroker:
+    def __init__(self):
+        self.published = []
+
+    def publish(self, user_ids, event):
+        self.published.append((sorted(user_ids), event))
+
+
+class EventTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        self.broker = RecordingBroker()
+        patcher = patch('api.events.get_broker', return_value=self.broker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def published(self, user_id=None):
+        return [event for user_ids, event in self.broker.published if user_id is None or user_id in user_ids]
+
+    def test_peer_request_share_and_card_changes_are_pushed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            relationship = PeerRelationship.objects.create(requester=self.owner, addressee=self.peer)
+        self.assertEqual(self.published(self.peer.id), [{'type': 'peer.requested', 'peer': relationship.id, 'status': 'pending'}])
+
+        topic = Topic.objects.create(user=self.owner, name='Shared')
+        self.broker.published.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            share = TopicShare.objects.create(topic=topic, owner=self.owner, peer=self.peer)
+        self.assertEqual(self.published(self.peer.id), [{'type': 'share.activated', 'share': share.id, 'topic': topic.id}])
+
+        self.broker.published.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            Card.objects.create(topic=topic, name='New')
+        self.assertEqual(self.published(self.peer.id), [{'type': 'topics.changed', 'topics': [topic.id]}])
+
+    def test_nothing_is_pushed_when_the_transaction_rolls_back(self):
+        with self.captureOnCommitCallbacks(execute=False):
+            PeerRelationship.objects.create(requester=self.owner, addressee=self.peer)
+        self.assertEqual(self.broker.published, [])
+
+
+class EventStreamTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='alice')
+        self.token = str(AccessToken.for_user(self.user))
+
+    async def test_stream_delivers_published_events(self):
+        broker = events.InProcessBroker()
+        with patch('api.events.get_broker', return_value=broker):
+            response = await AsyncClient().get(reverse('events'), {'token': self.token})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            stream = response.streaming_content
+            self.assertIn(b'event: ready', await anext(stream))
+
+            broker.publish([self.user.id], {'type': 'topics.changed', 'topics': [7]})
+            broker.publish([self.user.id + 1], {'type': 'topics.changed', 'topics': [8]})
+            message = await asyncio.wait_for(anext(stream), 1)
+            self.assertEqual(message, b'event: topics.changed\ndata: {"type":"topics.changed","topics":[7]}\n\n')
+
+            # A disconnect cancels the request task while the stream waits
+            waiting = asyncio.ensure_future(anext(stream))
+            await asyncio.sleep(0)
+            waiting.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await waiting
+            self.assertEqual(dict(broker._subscriptions), {})
+
+    def test_stream_is_refused_under_wsgi(self):
+        # The test client builds WSGI requests, as gunicorn's sync workers do
+        response = self.client.get(reverse('events'), {'token': self.token})
+        self.assertEqual(response.status_code, 501)
+        self.assertFalse(response.streaming)
+        self.assertIn('ASGI', response.json()['error'])
+
+    async def test_stream_requires_a_valid_token(self):
+        response = await AsyncClient().get(reverse('events'), {'token': 'nope'})
+        self.assertEqual(response.status_code, 401)
+
+    @override_settings(EVENTS_QUEUE_SIZE=2)
+    async def test_slow_stream_is_told_to_resync(self):
+        broker = events.InProcessBroker()
+        subscription = broker.subscribe(self.user.id)
+        for topic_id in range(5):
+            broker.publish([self.user.id], {'type': 'topics.changed', 'topics': [topic_id]})
+        await asyncio.sleep(0)
+        self.assertEqual(await subscription.get(1), {'type': 'resync'})
+        await subscription.close()
+
+
+class AsyncReadViewTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.owner = User.objects.create_user(username='alice')
+        self.peer = User.objects.create_user(username='bob')
+        PeerRelationship.objects.create(requester=self.owner, addressee=self.peer, status='accepted')
+        PeerRelationship.objects.create(requester=User.objects.create_user(username='carol'), addressee=self.owner)
+        self.topic = Topic.objects.create(user=self.owner, name='Shared')
+        self.private = Topic.objects.create(user=self.owner, name='Private')
+        for topic in (self.topic, self.private):
+            for i in range(3):
+                Card.objects.create(topic=topic, name=f'{topic.name} {i}', progress=i * 30, note='✓')
+        TopicShare.objects.create(topic=self.topic, owner=self.owner, peer=self.peer)
+
+    async def async_get(self, user, name, args=(), **headers):
+        headers['Authorization'] = f'Bearer {AccessToken.for_user(user)}'
+        return await AsyncClient().get(reverse(name, args=args), headers=headers)
+
+    async def sync_get(self, user, url):
+        def get():
+            self.client.force_authenticate(user)
+            return self.client.get(url)
+        return await sync_to_async(get)()
+
+    async def test_responses_match_the_sync_endpoints(self):
+        cases = [
+            (self.owner, 'topic-list', 'async-topic-list', []),
+            (self.owner, 'topic-detail', 'async-topic-detail', [self.topic.id]),
+            (self.peer, 'shared-topic-list', 'async-shared-topic-list', []),
+            (self.peer, 'shared-topic-detail', 'async-shared-topic-detail', [self.topic.id]),
+            (self.owner, 'peer-list', 'async-peer-list', []),
+            (self.owner, 'peer-requests', 'async-peer-requests', []),
+        ]
+        for user, sync_name, async_name, args in cases:
+            with self.subTest(async_name):
+                expected = await self.sync_get(user, reverse(sync_name, args=args))
+                response = await self.async_get(user, async_name, args)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+                if expected.has_header('ETag'):
+                    self.assertEqual(response['ETag'], expected['ETag'])
+
+    async def test_if_none_match_skips_the_read(self):
+        etag = (await self.async_get(self.owner, 'async-topic-list'))['ETag']
+        with patch.object(async_views.TopicListView, 'read', side_effect=AssertionError) as read:
+            response = await self.async_get(self.owner, 'async-topic-list', **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+        read.assert_not_called()
+
+    async def test_authentication_and_visibility(self):
+        response = await AsyncClient().get(reverse('async-topic-list'))
+        self.assertEqual(response.status_code, 401)
+        # The peer cannot read the private topic, as owner or as a share
+        for name in ('async-topic-detail', 'async-shared-topic-detail'):
+            response = await self.async_get(self.peer, name, [self.private.id])
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(json.loads(response.content), {'detail': 'No Topic matches the given query.'})
+
+    async def test_revoked_share_is_refused_despite_a_current_etag(self):
+        etag = (await self.async_get(self.peer, 'async-shared-topic-detail', [self.topic.id]))['ETag']
+        await sync_to_async(access_log.flush)()
+        # Revoked without a version bump, so the ETag still matches
+        await TopicShare.objects.filter(topic=self.topic).aupdate(is_active=False)
+        await sync_to_async(authz.invalidate_shared_topics)([self.peer.id])
+
+        response = await self.async_get(self.peer, 'async-shared-topic-detail', [self.topic.id],
+                                        **{'If-None-Match': etag})
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(access_log.buffer), 0)
+
+
+class RequestMetricsTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+        self.user = User.objects.create_user(username='alice')
+        self.staff = User.objects.create_user(username='ops', is_staff=True)
+        topic = Topic.objects.create(user=self.user, name='Topic')
+        Card.objects.create(topic=topic, name='Card')
+        self.client.force_authenticate(self.user)
+
+    def test_server_timing_reports_queries_and_stages(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('topic-list'))
+        timing = dict(part.strip().split(';', 1) for part in response['Server-Timing'].split(','))
+        self.assertEqual(set(timing), {'db', 'app', 'render', 'total'})
+        self.assertIn(f'desc="{len(queries)} queries"', timing['db'])
+
+    def test_async_views_report_their_queries(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        # Thread-sensitive ORM calls run on this thread, so its connection sees them all
+        with CaptureQueriesContext(connection) as queries:
+            response = async_to_sync(AsyncClient().get)(reverse('async-topic-list'), headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(queries)
+        self.assertIn(f'desc="{len(queries)} queries"', response['Server-Timing'])
+
+    def test_instrumentation_queries_are_not_counted(self):
+        def queries(**headers):
+            timing = self.client.get(reverse('card-list'), **headers)['Server-Timing']
+            return timing.split('desc="', 1)[1].split('"', 1)[0]
+
+        expected = queries()
+        with override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6):  # EXPLAIN and store every query
+            self.assertEqual(queries(), expected)
+        self.assertTrue(SlowQuery.objects.exclude(plan='').exists())
+
+        # Profiling only trusts a JWT, not a forced login
+        self.client.force_authenticate(None)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.staff)}')
+        expected = queries()
+        self.assertEqual(queries(HTTP_X_PROFILE='1'), expected)
+        self.assertTrue(RequestProfile.objects.exists())
+
+    def test_metrics_endpoint_is_staff_only_prometheus_text(self):
+        self.client.get(reverse('topic-list'))
+        self.client.get(reverse('topic-list'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('trackreso_request_duration_seconds_bucket{view="topic-list",method="GET",le="+Inf"} 2', body)
+        self.assertIn('trackreso_request_duration_seconds_count{view="topic-list",method="GET"} 2', body)
+        self.assertIn('trackreso_responses_total{view="topic-list",method="GET",status="200"} 2', body)
+        self.assertIn('# TYPE trackreso_db_queries histogram', body)
+        self.assertIn('trackreso_response_cache_total{outcome="hits"}', body)
+
+    @override_settings(METRICS_SAMPLE_RATE=0)
+    def test_unsampled_requests_are_not_measured(self):
+        response = self.client.get(reverse('topic-list'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('view="topic-list"', metrics.registry.export())
+
+
+@override_settings(SLOW_QUERY_THRESHOLD_MS=1e-6)  # Every query is slow
+class SlowQueryTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        slow_queries._explained.clear()
+        self.user = User.objects.create_user(username='alice')
+        topic = Topic.objects.create(user=self.user, name='Topic')
+        Card.objects.create(topic=topic, name='Card')
+        self.client.force_authenticate(self.user)
+
+    def test_normalizes_literals_and_lists(self):
+        self.assertEqual(
+            slow_queries.normalize("SELECT *  FROM t\n WHERE a = 'x''y' AND b IN (%s, %s, 3) LIMIT 21"),
+            "SELECT * FROM t WHERE a = ? AND b IN (...) LIMIT ?"
+        )
+
+    def test_captures_view_sql_and_plan(self):
+        self.client.get(reverse('topic-list'))
+        captured = SlowQuery.objects.filter(sql__contains='FROM "api_topic"')
+        self.assertTrue(captured.exists())
+        query = captured.first()
+        self.assertEqual(query.view, 'TopicViewSet.list')
+        self.assertNotIn("'", query.sql)
+        self.assertIn('api_topic', query.plan)
+
+    def test_plans_once_per_interval_and_keeps_the_newest_rows(self):
+        with override_settings(SLOW_QUERY_MAX_ROWS=5):
+            for _ in range(6):
+                self.client.get(reverse('card-list'))
+        self.assertEqual(SlowQuery.objects.count(), 5)
+        for fingerprint in SlowQuery.objects.values_list('fingerprint', flat=True).distinct():
+            self.assertLessEqual(SlowQuery.objects.filter(fingerprint=fingerprint).exclude(plan='').count(), 1)
+
+    async def test_samples_sync_and_async_views_under_an_async_handler(self):
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        for name, view in (('card-list', 'CardViewSet.list'), ('async-topic-list', 'TopicListView.get')):
+            with self.subTest(name):
+                response = await AsyncClient().get(reverse(name), headers=headers)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(await SlowQuery.objects.filter(view=view).exclude(plan='').aexists())
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_off_without_threshold(self):
+        self.client.get(reverse('topic-list'))
+        self.assertFalse(SlowQuery.objects.exists())
+
+    def test_report_groups_by_fingerprint(self):
+        # The card list is not served from the response cache
+        self.client.get(reverse('card-list'))
+        self.client.get(reverse('card-list'))
+        out = StringIO()
+        call_command('report_slow_queries', '--json', '--order', 'count', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(len({entry['fingerprint'] for entry in report}), len(report))
+        cards = next(entry for entry in report if 'FROM "api_card"' in entry['sql'])
+        self.assertEqual(cards['count'], 2)
+        self.assertEqual(cards['views'], ['CardViewSet.list'])
+        self.assertTrue(cards['plan'])
+
+
+class RequestProfileTests(ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.staff = User.objects.create_user(username='ops', is_staff=True)
+        self.user = User.objects.create_user(username='alice')
+        Topic.objects.create(user=self.staff, name='Topic')
+
+    def get_as(self, user, url, **headers):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(user)}', **headers)
+        return self.client.get(url)
+
+    def test_staff_requests_with_the_flag_are_profiled(self):
+        response = self.get_as(self.staff, reverse('topic-list'), HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile = RequestProfile.objects.get(pk=response['X-Profile-Id'])
+        self.assertEqual((profile.view, profile.status_code, profile.user), ('TopicViewSet.list', 200, self.staff))
+
+        listed = self.get_as(self.staff, reverse('profile-list'))
+        self.assertEqual([entry['id'] for entry in listed.data], [profile.pk])
+        download = self.get_as(self.staff, reverse('profile-download', args=[profile.pk]))
+        self.assertEqual(download['Content-Type'], 'application/octet-stream')
+        self.assertTrue(any(name == 'list' for _, _, name in marshal.loads(download.content)))
+        report = self.get_as(self.staff, reverse('profile-report', args=[profile.pk]) + '?sort=tottime&limit=5')
+        self.assertIn('function calls', report.content.decode())
+
+    def test_flags_from_other_users_and_unflagged_requests_are_not_profiled(self):
+        with patch.object(profiling.cProfile, 'Profile') as profiler:
+            self.get_as(self.user, reverse('topic-list') + '?profile=1')
+            response = self.get_as(self.staff, reverse('topic-list'))
+        profiler.assert_not_called()
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(self.get_as(self.user, reverse('profile-list')).status_code, 403)
+
+    @override_settings(PROFILE_MAX_ROWS=2)
+    def test_old_and_surplus_profiles_are_pruned(self):
+        old = RequestProfile.objects.create(
+            user=self.staff, method='GET', path='/', status_code=200, duration_ms=1, stats=b'',
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        ids = [int(self.get_as(self.staff, reverse('topic-list') + '?profile=1')['X-Profile-Id']) for _ in range(3)]
+        self.assertEqual(sorted(RequestProfile.objects.values_list('id', flat=True)), ids[1:])
+        self.assertFalse(RequestProfile.objects.filter(pk=old.pk).exists())
+
+
+def seed_world(n, prefix):
+    """
+    An account with ``n`` of everything: own topics (the first shared with
+    every peer), accepted peers, pending requests, topics shared with it,
+    and a few cards per topic
+    """
+    owner = User.objects.create_user(username=f'{prefix}-owner', password='pw', is_staff=True)
+    peers = [User.objects.create_user(username=f'{prefix}-peer-{i}') for i in range(n)]
+    requesters = [User.objects.create_user(username=f'{prefix}-requester-{i}') for i in range(n + 1)]
+    stranger = User.objects.create_user(username=f'{prefix}-stranger')
+    relationships = [
+        PeerRelationship.objects.create(requester=owner, addressee=peer, status='accepted') for peer in peers
+    ]
+    pending = [PeerRelationship.objects.create(requester=user, addressee=owner) for user in requesters]
+    topics = [Topic.objects.create(user=owner, name=f'Topic {i}') for i in range(n + 1)]
+    shared = [Topic.objects.create(user=peer, name=f'Shared {i}') for i, peer in enumerate(peers)]
+    for topic in topics + shared:
+        for i in range(3):
+            Card.objects.create(topic=topic, name=f'{topic.name} card {i}', note='searchable note', progress=i * 40)
+    for peer in peers:
+        TopicShare.objects.create(topic=topics[0], owner=owner, peer=peer)
+    for topic in shared:
+        TopicShare.objects.create(topic=topic, owner=topic.user, peer=owner)
+    ShareAccessDaily.objects.bulk_create([
+        ShareAccessDaily(topic_share=share, day=timezone.localdate(), count=3)
+        for share in TopicShare.objects.filter(topic=topics[0])
+    ])
+    profiler = cProfile.Profile()
+    profiler.runcall(sorted, range(10))
+    profile = RequestProfile.objects.create(
+        user=owner, method='GET', path='/api/topics/', status_code=200, duration_ms=1.0,
+        stats=profiling.dump(profiler)
+    )
+    return SimpleNamespace(
+        owner=owner, peers=peers, stranger=stranger, relationships=relationships, pending=pending,
+        topics=topics, shared=shared, profile=profile,
+        card=Card.objects.filter(topic=topics[1]).first(),
+        cards=list(Card.objects.filter(topic=topics[1]).values_list('id', flat=True)),
+    )
+
+
+# (route name, method, url kwargs, request body, expected status) for every
+# route in api/urls.py; each is measured against a seeded account of N and 10N
+# rows and must stay within its budget at both sizes
+QUERY_BUDGET_CASES = [
+    ('api-root', 'get', lambda w: {}, None, 200),
+    ('topic-list', 'get', lambda w: {}, None, 200),
+    ('topic-list', 'post', lambda w: {}, lambda w: {'name': 'New'}, 201),
+    ('topic-summary', 'get', lambda w: {}, None, 200),
+    ('topic-detail', 'get', lambda w: {'pk': w.topics[0].pk}, None, 200),
+    ('topic-detail', 'put', lambda w: {'pk': w.topics[1].pk}, lambda w: {'name': 'Renamed'}, 200),
+    ('topic-detail', 'patch', lambda w: {'pk': w.topics[1].pk}, lambda w: {'collapsed': True}, 200),
+    ('topic-detail', 'delete', lambda w: {'pk': w.topics[0].pk}, None, 204),
+    ('topic-cards', 'get', lambda w: {'pk': w.topics[1].pk}, None, 200),
+    ('topic-shares', 'get', lambda w: {'pk': w.topics[0].pk}, None, 200),
+    ('topic-share', 'post', lambda w: {'pk': w.topics[1].pk}, lambda w: {'peer_id': w.peers[0].pk}, 201),
+    ('topic-revoke-share', 'delete', lambda w: {'pk': w.topics[0].pk, 'peer_id': w.peers[0].pk}, None, 200),
+    ('topic-stats', 'get', lambda w: {'pk': w.topics[0].pk}, None, 200),
+    ('card-list', 'get', lambda w: {}, None, 200),
+    ('card-list', 'post', lambda w: {}, lambda w: {'topic': w.topics[1].pk, 'name': 'New'}, 201),
+    ('card-bulk', 'post', lambda w: {}, lambda w: {
+        'create': [{'topic': w.topics[1].pk, 'name': 'Bulk'}],
+        'update': [{'id': w.cards[1], 'progress': 100}],
+        'delete': [w.cards[2]],
+    }, 200),
+    ('card-detail', 'get', lambda w: {'pk': w.card.pk}, None, 200),
+    ('card-detail', 'put', lambda w: {'pk': w.card.pk}, lambda w: {'topic': w.topics[1].pk, 'name': 'Renamed'}, 200),
+    ('card-detail', 'patch', lambda w: {'pk': w.card.pk}, lambda w: {'starred': True}, 200),
+    ('card-detail', 'delete', lambda w: {'pk': w.card.pk}, None, 204),
+    ('peer-list', 'get', lambda w: {}, None, 200),
+    ('peer-list', 'post', lambda w: {}, lambda w: {'addressee': w.stranger.pk}, 405),
+    ('peer-request', 'post', lambda w: {}, lambda w: {'user_id': w.stranger.pk}, 201),
+    ('peer-requests', 'get', lambda w: {}, None, 200),
+    ('peer-search', 'post', lambda w: {}, lambda w: {'query': 'stranger'}, 200),
+    ('peer-detail', 'get', lambda w: {'pk': w.relationships[0].pk}, None, 200),
+    ('peer-detail', 'put', lambda w: {'pk': w.relationships[0].pk}, lambda w: {'status': 'accepted'}, 200),
+    ('peer-detail', 'patch', lambda w: {'pk': w.relationships[0].pk}, lambda w: {'status': 'accepted'}, 200),
+    ('peer-detail', 'delete', lambda w: {'pk': w.relationships[0].pk}, None, 204),
+    ('peer-accept', 'post', lambda w: {'pk': w.pending[0].pk}, None, 200),
+    ('peer-reject', 'post', lambda w: {'pk': w.pending[0].pk}, None, 200),
+    ('shared-topic-list', 'get', lambda w: {}, None, 200),
+    ('shared-topic-summary', 'get', lambda w: {}, None, 200),
+    ('shared-topic-detail', 'get', lambda w: {'pk': w.shared[0].pk}, None, 200),
+    ('shared-topic-leave', 'post', lambda w: {'pk': w.shared[0].pk}, None, 200),
+    ('register', 'post', lambda w: {}, lambda w: {'username': f'{w.owner.username}-new', 'password': 'pw'}, 201),
+    ('user_profile', 'get', lambda w: {}, None, 200),
+    ('dashboard', 'get', lambda w: {}, None, 200),
+    ('export', 'get', lambda w: {}, None, 200),
+    ('import', 'post', lambda w: {}, lambda w: b'\n'.join([
+        b'{"type": "topic", "id": 1, "name": "Imported"}',
+        b'{"type": "card", "topic": 1, "name": "One"}',
+        b'{"type": "card", "topic": 1, "name": "Two"}',
+    ]), 201),
+    ('sync', 'get', lambda w: {}, None, 200),
+    ('card-search', 'get', lambda w: {}, None, 200),
+    ('metrics', 'get', lambda w: {}, None, 200),
+    ('profile-list', 'get', lambda w: {}, None, 200),
+    ('profile-download', 'get', lambda w: {'pk': w.profile.pk}, None, 200),
+    ('profile-report', 'get', lambda w: {'pk': w.profile.pk}, None, 200),
+    ('async-topic-list', 'get', lambda w: {}, None, 200),
+    ('async-topic-detail', 'get', lambda w: {'pk': w.topics[0].pk}, None, 200),
+    ('async-shared-topic-list', 'get', lambda w: {}, None, 200),
+    ('async-shared-topic-detail', 'get', lambda w: {'pk': w.shared[0].pk}, None, 200),
+    ('async-peer-list', 'get', lambda w: {}, None, 200),
+    ('async-peer-requests', 'get', lambda w: {}, None, 200),
+    ('token_obtain_pair', 'post', lambda w: {}, lambda w: {'username': w.owner.username, 'password': 'pw'}, 200),
+    ('token_refresh', 'post', lambda w: {}, lambda w: {'refresh': str(RefreshToken.for_user(w.owner))}, 200),
+    ('rest_framework:login', 'get', lambda w: {}, None, 200),
+    ('rest_framework:logout', 'post', lambda w: {}, None, 200),
+]
+QUERY_BUDGET_QUERY_PARAMS = {'sync': {}, 'card-search': {'q': 'searchable'}}
+# The test's own rollback savepoint, and the savepoints nested atomic blocks
+# add inside it, are not queries a request would run
+SAVEPOINT_STATEMENTS = ('SAVEPOINT', 'RELEASE SAVEPOINT', 'ROLLBACK TO SAVEPOINT')
+# Routes that cannot be measured per request
+QUERY_BUDGET_EXCLUDED = {
+    'events': "An endless Server-Sent Events stream; it queries once to authenticate",
+}
+
+
+class QueryBudgetTests(ApiTestCase):
+    """
+    Query counts of every API route must not grow with the data: each is
+    measured on an account seeded with N rows of everything and one with 10N,
+    cold caches both times, and must stay within the same budget at both.
+    """
+    N = 2
+    # Measured with cold caches and JWT authentication (one query for the user)
+    BUDGETS = {
+        ('api-root', 'get'): 1,
+        ('topic-list', 'get'): 4,
+        ('topic-list', 'post'): 6,
+        ('topic-summary', 'get'): 3,
+        ('topic-detail', 'get'): 4,
+        ('topic-detail', 'put'): 6,
+        ('topic-detail', 'patch'): 6,
+        ('topic-detail', 'delete'): 13,
+        ('topic-cards', 'get'): 3,
+        ('topic-shares', 'get'): 4,
+        ('topic-share', 'post'): 8,
+        ('topic-revoke-share', 'delete'): 6,
+        ('topic-stats', 'get'): 4,
+        ('card-list', 'get'): 2,
+        ('card-list', 'post'): 7,
+        ('card-bulk', 'post'): 15,
+        ('card-detail', 'get'): 2,
+        ('card-detail', 'put'): 8,
+        ('card-detail', 'patch'): 8,
+        ('card-detail', 'delete'): 11,
+        ('peer-list', 'get'): 3,
+        ('peer-list', 'post'): 1,
+        ('peer-request', 'post'): 10,
+        ('peer-requests', 'get'): 2,
+        ('peer-search', 'post'): 2,
+        ('peer-detail', 'get'): 3,
+        ('peer-detail', 'put'): 5,
+        ('peer-detail', 'patch'): 5,
+        ('peer-detail', 'delete'): 9,
+        ('peer-accept', 'post'): 7,
+        ('peer-reject', 'post'): 5,
+        ('shared-topic-list', 'get'): 5,
+        ('shared-topic-summary', 'get'): 4,
+        ('shared-topic-detail', 'get'): 5,
+        ('shared-topic-leave', 'post'): 7,
+        ('register', 'post'): 3,
+        ('user_profile', 'get'): 1,
+        ('dashboard', 'get'): 9,
+        ('export', 'get'): 3,
+        ('import', 'post'): 7,
+        ('sync', 'get'): 6,
+        ('card-search', 'get'): 2,
+        ('metrics', 'get'): 1,
+        ('profile-list', 'get'): 2,
+        ('profile-download', 'get'): 2,
+        ('profile-report', 'get'): 2,
+        ('async-topic-list', 'get'): 4,
+        ('async-topic-detail', 'get'): 4,
+        ('async-shared-topic-list', 'get'): 5,
+        ('async-shared-topic-detail', 'get'): 5,
+        ('async-peer-list', 'get'): 3,
+        ('async-peer-requests', 'get'): 3,
+        ('token_obtain_pair', 'post'): 1,
+        ('token_refresh', 'post'): 1,
+        ('rest_framework:login', 'get'): 0,
+        ('rest_framework:logout', 'post'): 0,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.small = seed_world(cls.N, 'small')
+        cls.large = seed_world(cls.N * 10, 'large')
+
+    def measure(self, world, name, method, kwargs, body):
+        for backend in caches.all():
+            backend.clear()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(world.owner)}')
+        url = reverse(name, kwargs=kwargs(world))
+        data = body(world) if body else None
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            if isinstance(data, bytes):
+                response = self.client.generic(method.upper(), url, data, content_type='application/x-ndjson')
+            elif method == 'get':
+                response = self.client.get(url, QUERY_BUDGET_QUERY_PARAMS.get(name, {}))
+            else:
+                response = getattr(self.client, method)(url, data, format='json')
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+            transaction.set_rollback(True)
+        return response, [
+            query['sql'] for query in queries.captured_queries if not query['sql'].startswith(SAVEPOINT_STATEMENTS)
+        ]
+
+    def test_every_route_has_a_budget(self):
+        def names(patterns, namespace=''):
+            for pattern in patterns:
+                if hasattr(pattern, 'url_patterns'):
+                    yield from names(pattern.url_patterns, f'{pattern.namespace}:' if pattern.namespace else namespace)
+                elif pattern.name:
+                    yield namespace + pattern.name
+        covered = {name for name, *_ in QUERY_BUDGET_CASES} | set(QUERY_BUDGET_EXCLUDED)
+        self.assertEqual(set(names(api_urls.urlpatterns)) - covered, set())
+        self.assertEqual({(name, method) for name, method, *_ in QUERY_BUDGET_CASES}, set(self.BUDGETS))
+
+    def test_query_counts_stay_within_budget_at_n_and_10n(self):
+        for name, method, kwargs, body, expected in QUERY_BUDGET_CASES:
+            with self.subTest(f'{method.upper()} {name}'):
+                budget = self.BUDGETS[(name, method)]
+                measured = {}
+                for label, world in (('N', self.small), ('10N', self.large)):
+                    response, queries = self.measure(world, name, method, kwargs, body)
+                    self.assertEqual(response.status_code, expected, getattr(response, 'data', None))
+                    measured[label] = queries
+                for label, queries in measured.items():
+                    if len(queries) > budget or len(queries) > len(measured['N']):
+                        self.fail(
+                            f"{method.upper()} {name} ran {len(queries)} queries at {label} "
+                            f"({len(measured['N'])} at N, budget {budget}):\n" + '\n'.join(queries)
+                        )
+
+
+class GenerateDatasetTests(ApiTestCase):
+    def generate(self, **options):
+        call_command('generate_dataset', users=6, topics=3, cards=4, peers=3, share_fraction=1.0,
+                     batch_size=5, stdout=StringIO(), **options)
+
+    def test_writes_what_the_signals_would(self):
+        self.generate()
+        topics = Topic.objects.filter(user__username__startswith='dataset-')
+        self.assertEqual(topics.count(), 18)
+        self.assertEqual(Card.objects.filter(topic__in=topics).count(), 72)
+        self.assertEqual(counters.recount(list(topics), dry_run=True), [])
+
+        for relationship in PeerRelationship.objects.all():
+            self.assertEqual(relationship.edges.count(), 2 if relationship.status == 'accepted' else 0)
+        self.assertTrue(TopicShare.objects.exists())
+        for share in TopicShare.objects.all():
+            self.assertEqual(share.topic.user_id, share.owner_id)
+            self.assertTrue(PeerEdge.objects.filter(user_id=share.owner_id, peer_id=share.peer_id).exists())
+
+        self.client.force_authenticate(User.objects.get(username='dataset-0'))
+        self.assertTrue(self.client.get(reverse('card-search'), {'q': 'python'}).data['results'])
+
+    def test_refuses_to_generate_twice_and_deletes(self):
+        self.generate()
+        with self.assertRaises(CommandError):
+            self.generate()
+        call_command('generate_dataset', '--delete', stdout=StringIO())
+        self.assertFalse(User.objects.filter(username__startswith='dataset-').exists())
+        self.assertFalse(Topic.objects.exists())
+
+
+class LoadBenchmarkTests(APITransactionTestCase):
+    # The client threads open their own connections and see committed rows only
+
+    def test_reports_each_endpoint_as_json(self):
+        call_command('generate_dataset', users=3, topics=2, cards=3, peers=2, stdout=StringIO())
+        out = StringIO()
+        call_command('bench_load', '--json', '--duration', '0.2', '--concurrency', '2',
+                     '--endpoints', 'topics,search,async-topics', stdout=out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['target'], 'client')
+        self.assertEqual(report['dataset']['users'], 3)
+        self.assertEqual(list(report['endpoints']), ['topics', 'search', 'async-topics'])
+        for result in report['endpoints'].values():
+            self.assertGreater(result['requests'], 0)
+            self.assertEqual(result['errors'], 0, result['statuses'])
+            self.assertIsNotNone(result['p99_ms'])
@@ -0,0 +1,226 @@
+import gzip
+import json
+import zlib
+from datetime import datetime
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Card, Topic
+from .signals import batch_topic_changes, count_cards
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# Account exports are NDJSON: a header line, then every topic, then every card.
+# Cards refer to topics by their exported id, which the import maps to new ids.
+EXPORT_VERSION = 1
+EXPORT_CHUNK_SIZE = 2000
+TOPIC_FIELDS = ['id', 'name', 'collapsed', 'created_at']
+CARD_FIELDS = ['topic', 'name', 'resource', 'note', 'progress', 'starred', 'collapsed', 'created_at']
+STREAM_BUFFER_SIZE = 64 * 1024
+
+
+class TransferError(ValueError):
+    """An import stream that cannot be loaded, with the line it failed on"""
+
+
+def _dumps(record):
+    if orjson is not None:
+        return orjson.dumps(record) + b'\n'
+    return json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode() + b'\n'
+
+
+def _row(kind, row):
+    row['created_at'] = row['created_at'].isoformat()
+    return {'type': kind, **row}
+
+
+def export_lines(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield ``user``'s topics and cards as NDJSON lines, reading ``chunk_size`` rows at a time"""
+    yield _dumps({'type': 'export', 'version': EXPORT_VERSION, 'user': user.username,
+                  'exported_at': timezone.now().isoformat()})
+    topics = Topic.objects.filter(user=user).order_by('id').values(*TOPIC_FIELDS)
+    for row in topics.iterator(chunk_size=chunk_size):
+        yield _dumps(_row('topic', row))
+    cards = Card.objects.filter(topic__user=user).order_by('topic_id', 'id').values(*CARD_FIELDS)
+    for row in cards.iterator(chunk_size=chunk_size):
+        yield _dumps(_row('card', row))
+
+
+def export_stream(user, compress=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield the export in ~64 KB blocks, gzip-compressed on the fly when ``compress`` is set"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+    buffer = []
+    size = 0
+    for line in export_lines(user, chunk_size):
+        buffer.append(line)
+        size += len(line)
+        if size >= STREAM_BUFFER_SIZE:
+            block = b''.join(buffer)
+            buffer, size = [], 0
+            block = compressor.compress(block) if compressor else block
+            if block:
+                yield block
+    block = b''.join(buffer)
+    if compressor:
+        block = compressor.compress(block) + compressor.flush()
+    if block:
+        yield block
+
+
+def open_import(fileobj):
+    """Wrap a binary stream, transparently decompressing it if it is gzip"""
+    head = fileobj.peek(2)[:2] if hasattr(fileobj, 'peek') else b''
+    if head == b'\x1f\x8b':
+        return gzip.GzipFile(fileobj=fileobj)
+    return fileobj
+
+
+def _text(record, field, line_number, max_length=None, default=''):
+    value = record.get(field, default)
+    if not isinstance(value, str) or (max_length and len(value) > max_length):
+        raise TransferError(f"line {line_number}: {field} must be a string" + (f" of at most {max_length} characters" if max_length else ''))
+    return value
+
+
+def _flag(record, field, line_number, default):
+    value = record.get(field, default)
+    if not isinstance(value, bool):
+        raise TransferError(f"line {line_number}: {field} must be a boolean")
+    return value
+
+
+def _timestamp(record, line_number):
+    value = record.get('created_at')
+    if value is None:
+        return timezone.now()
+    try:
+        parsed = datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise TransferError(f"line {line_number}: created_at must be an ISO 8601 datetime")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+
+def _topic(user, record, line_number):
+    return Topic(
+        user=user,
+        name=_text(record, 'name', line_number, max_length=255, default=None),
+        collapsed=_flag(record, 'collapsed', line_number, False),
+        created_at=_timestamp(record, line_number),
+    )
+
+
+def _card(topic_id, record, line_number, now):
+    progress = record.get('progress', 0)
+    if not isinstance(progress, int) or isinstance(progress, bool) or not -2 ** 31 <= progress < 2 ** 31:
+        raise TransferError(f"line {line_number}: progress must be a 32-bit integer")
+    return Card(
+        topic_id=topic_id,
+        name=_text(record, 'name', line_number, max_length=255, default=None),
+        resource=_text(record, 'resource', line_number),
+        note=_text(record, 'note', line_number),
+        progress=progress,
+        starred=_flag(record, 'starred', line_number, False),
+        collapsed=_flag(record, 'collapsed', line_number, True),
+        created_at=_timestamp(record, line_number),
+        updated_at=now,
+    )
+
+
+def _create(model, rows, batch_size):
+    """
+    bulk_create ``rows``, which keep their exported created_at (see
+    models.CreatedAtField) and get their new ids. No signals run: callers
+    record counters and changes themselves.
+    """
+    return model.objects.bulk_create(rows, batch_size=batch_size)
+
+
+def _restamp(topic_ids, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Stamp imported topics and their cards with the commit time. An import can
+    take longer than the sync cursor overlap, and rows stamped when they were
+    inserted would be older than the cursors handed out while it ran.
+    """
+    now = timezone.now()
+    for start in range(0, len(topic_ids), chunk_size):
+        chunk = topic_ids[start:start + chunk_size]
+        Topic.objects.filter(pk__in=chunk).update(updated_at=now)
+        Card.objects.filter(topic_id__in=chunk).update(updated_at=now)
+
+
+def import_lines(user, lines, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Load an export into ``user``'s account as new topics and cards.
+
+    Lines are parsed one at a time and inserted ``chunk_size`` rows per
+    bulk_create, so memory holds one batch plus the topic id map. Everything
+    runs in one transaction: a bad line rolls the whole import back.
+    """
+    topic_ids = {}  # exported topic id -> new topic id
+    pending_topics, pending_keys, pending_cards = [], [], []
+    seen_keys = set()
+    topic_count = card_count = 0
+    now = timezone.now()
+
+    def flush_topics():
+        for key, topic in zip(pending_keys, _create(Topic, pending_topics, chunk_size)):
+            topic_ids[key] = topic.pk
+        pending_topics.clear()
+        pending_keys.clear()
+
+    def flush_cards():
+        count_cards(_create(Card, pending_cards, chunk_size))
+        pending_cards.clear()
+
+    with batch_topic_changes() as changed:
+        for line_number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line) if orjson is None else orjson.loads(line)
+            except ValueError:
+                raise TransferError(f"line {line_number}: invalid JSON")
+            if not isinstance(record, dict):
+                raise TransferError(f"line {line_number}: expected an object")
+
+            kind = record.get('type')
+            if kind == 'export':
+                if record.get('version') != EXPORT_VERSION:
+                    raise TransferError(f"line {line_number}: unsupported export version {record.get('version')!r}")
+            elif kind == 'topic':
+                key = record.get('id')
+                if not isinstance(key, (int, str)) or key in seen_keys:
+                    raise TransferError(f"line {line_number}: missing or duplicate topic id {key!r}")
+                seen_keys.add(key)
+                pending_topics.append(_topic(user, record, line_number))
+                pending_keys.append(key)
+                topic_count += 1
+                if len(pending_topics) >= chunk_size:
+                    flush_topics()
+            elif kind == 'card':
+                if pending_topics:
+                    flush_topics()
+                key = record.get('topic')
+                if not isinstance(key, (int, str)) or key not in topic_ids:
+                    raise TransferError(f"line {line_number}: card refers to unknown topic {key!r}")
+                pending_cards.append(_card(topic_ids[key], record, line_number, now))
+                card_count += 1
+                if len(pending_cards) >= chunk_size:
+                    flush_cards()
+            else:
+                raise TransferError(f"line {line_number}: unknown record type {kind!r}")
+
+        if pending_topics:
+            flush_topics()
+        if pending_cards:
+            flush_cards()
+        if topic_count:
+            imported = list(topic_ids.values())
+            changed.update(imported)
+            transaction.on_commit(lambda: _restamp(imported, chunk_size))
+
+    return {'topics': topic_count, 'cards': card_count}
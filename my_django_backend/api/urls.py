@@ -1,7 +1,12 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import TopicViewSet, CardViewSet, CreateuserView, PeerViewSet, SharedTopicViewSet, UserProfileView
+from .views import (
+    TopicViewSet, CardViewSet, CreateuserView, PeerViewSet, SharedTopicViewSet, UserProfileView, DashboardView,
+    ExportView, ImportView, SyncView, CardSearchView, MetricsView,
+    RequestProfileListView, RequestProfileDownloadView, RequestProfileReportView, event_stream
+)
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'topics', TopicViewSet, basename='topic')   # /api/topics/
@@ -13,6 +18,23 @@ urlpatterns = [
     *router.urls,  # expands to topics/, cards/, peers/, shared-topics/, etc.
     path('user/register/', CreateuserView.as_view(), name='register'),
     path('user/profile/', UserProfileView.as_view(), name='user_profile'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),  # /api/dashboard/
+    path('export/', ExportView.as_view(), name='export'),  # /api/export/
+    path('import/', ImportView.as_view(), name='import'),  # /api/import/
+    path('sync/', SyncView.as_view(), name='sync'),  # /api/sync/
+    path('search/', CardSearchView.as_view(), name='card-search'),  # /api/search/
+    path('metrics/', MetricsView.as_view(), name='metrics'),  # /api/metrics/ (Prometheus, staff only)
+    path('profiles/', RequestProfileListView.as_view(), name='profile-list'),  # /api/profiles/ (staff only)
+    path('profiles/<int:pk>/', RequestProfileDownloadView.as_view(), name='profile-download'),
+    path('profiles/<int:pk>/report/', RequestProfileReportView.as_view(), name='profile-report'),
+    path('events/', event_stream, name='events'),  # /api/events/ (Server-Sent Events, ASGI only; 501 under WSGI)
+    # Async versions of the hot reads, for ASGI deployments (see api/async_views.py)
+    path('async/topics/', async_views.TopicListView.as_view(), name='async-topic-list'),
+    path('async/topics/<int:pk>/', async_views.TopicDetailView.as_view(), name='async-topic-detail'),
+    path('async/shared-topics/', async_views.SharedTopicListView.as_view(), name='async-shared-topic-list'),
+    path('async/shared-topics/<int:pk>/', async_views.SharedTopicDetailView.as_view(), name='async-shared-topic-detail'),
+    path('async/peers/', async_views.PeerListView.as_view(), name='async-peer-list'),
+    path('async/peers/requests/', async_views.PeerRequestListView.as_view(), name='async-peer-requests'),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api-auth/', include('rest_framework.urls')),  # optional DRF login/logout UI
@@ -1,21 +1,41 @@
+import gzip
+
 from rest_framework.response import Response
 from rest_framework import status, viewsets, generics
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.exceptions import NotFound
+from rest_framework.views import APIView
+from rest_framework.permissions import IsAuthenticated, IsAdminUser, AllowAny
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Sum
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from datetime import timedelta
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiResponse
 from drf_spectacular.types import OpenApiTypes
-from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccess
+from .models import Topic, Card, PeerRelationship, TopicShare, ShareAccessDaily, RequestProfile
 from .serializers import (
     TopicSerializer, CardSerializer, UserSerializer, UserPublicSerializer,
-    PeerRelationshipSerializer, TopicShareSerializer, SharedTopicSerializer
+    PeerRelationshipSerializer, TopicShareSerializer, SharedTopicSerializer, CardBulkSerializer,
+    TopicSummarySerializer, SharedTopicSummarySerializer, SyncTopicSerializer, SyncShareSerializer,
+    RequestProfileSerializer, project_queryset
 )
+from .pagination import TopicCursorPagination, CardCursorPagination, TopicCardsPagination
+from .etags import ConditionalReadMixin, conditional_response
+from . import access_log, authz, cache, events, metrics, profiling, sync, transfer
+from .search import search_cards, search_users
+from .cache import CachedReadMixin
+from .readers import ValuesReadMixin, serialize_many
+from .async_views import authenticate
 
 @extend_schema_view(
     list=extend_schema(
         summary="List all topics",
-        description="Retrieve all learning topics created by the authenticated user",
+        description="Retrieve all learning topics created by the authenticated user. "
+                    "Pass page_size or cursor to page through them newest first, and fields or omit "
+                    "(e.g. fields=id,name,cards.progress or omit=cards.note) to select fields.",
         responses={200: TopicSerializer(many=True)}
     ),
     create=extend_schema(
@@ -37,24 +57,102 @@ from .serializers import (
         summary="Delete topic",
         description="Delete a topic and all its associated cards",
         responses={204: None}
+    ),
+    cards=extend_schema(
+        summary="List topic cards",
+        description="Page through the cards of a topic in creation order",
+        responses={200: CardSerializer(many=True)}
+    ),
+    summary=extend_schema(
+        summary="Summarize topics",
+        description="Card, starred and completed counts and average progress of each topic, without the cards",
+        responses={200: TopicSummarySerializer(many=True)}
+    ),
+    stats=extend_schema(
+        summary="Get topic view statistics",
+        description="Daily view counts of a shared topic, read from the daily rollups",
+        parameters=[OpenApiParameter('days', OpenApiTypes.INT, description="Number of days to report (default 30, max 365)")]
     )
 )
-class TopicViewSet(viewsets.ModelViewSet):
+class TopicViewSet(ConditionalReadMixin, CachedReadMixin, ValuesReadMixin, viewsets.ModelViewSet):
     queryset = Topic.objects.all()
     serializer_class = TopicSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = TopicCursorPagination
+    cache_scopes = [cache.TOPICS]
 
     def get_queryset(self):
-        return Topic.objects.filter(user=self.request.user).prefetch_related('cards')
+        queryset = Topic.objects.filter(user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            # Loads only the topic and card columns selected by ?fields=/?omit=
+            queryset = project_queryset(queryset, self.get_serializer())
+        return queryset
 
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
+    @action(detail=True, methods=['get'])
+    def cards(self, request, pk=None):
+        """Get a page of cards for this topic"""
+        topic = self.get_object()
+        paginator = TopicCardsPagination()
+        serializer = CardSerializer(many=True, context=self.get_serializer_context())
+        cards = project_queryset(Card.objects.filter(topic=topic), serializer.child)
+        page = paginator.paginate_queryset(cards, request, view=self)
+        serializer = CardSerializer(page, many=True, context=self.get_serializer_context())
+        return paginator.get_paginated_response(serializer.data)
+    
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Get per-topic card totals for the sidebar"""
+        return conditional_response(
+            request, cache.cached_response, 'topic-summary', self.cache_scopes, self.build_summary
+        )
+
+    def build_summary(self, request):
+        # Stored counters: no card rows are read
+        topics = self.get_queryset()
+        return Response(TopicSummarySerializer(topics, many=True).data)
+    
+    @action(detail=True, methods=['get'])
+    def stats(self, request, pk=None):
+        """Get daily view counts of this topic across all its shares"""
+        topic = self.get_object()
+        try:
+            days = min(max(int(request.query_params.get('days', 30)), 1), 365)
+        except ValueError:
+            return Response(
+                {'error': 'days must be an integer'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        since = timezone.localdate() - timedelta(days=days - 1)
+        
+        # Rollup rows only: the cost grows with days and shares, not with views
+        rollups = ShareAccessDaily.objects.filter(topic_share__topic=topic, day__gte=since)
+        daily = rollups.values('day', 'access_type').annotate(count=Sum('count')).order_by('day', 'access_type')
+        by_peer = rollups.values(
+            'topic_share__peer_id', 'topic_share__peer__username'
+        ).annotate(count=Sum('count')).order_by('-count')
+        
+        return Response({
+            'topic': topic.id,
+            'since': since,
+            'total': sum(row['count'] for row in daily),
+            'daily': list(daily),
+            'by_peer': [
+                {'peer': {'id': row['topic_share__peer_id'], 'username': row['topic_share__peer__username']}, 'count': row['count']}
+                for row in by_peer
+            ],
+        })
+    
     @action(detail=True, methods=['get'])
     def shares(self, request, pk=None):
         """Get list of peers who have access to this topic"""
         topic = self.get_object()
-        shares = TopicShare.objects.filter(topic=topic, is_active=True)
+        # Each share nests the topic with its cards: one query for them all, not one per share
+        shares = TopicShare.objects.filter(topic=topic, is_active=True).select_related(
+            'topic', 'owner', 'peer'
+        ).prefetch_related('topic__cards')
         serializer = TopicShareSerializer(shares, many=True)
         return Response(serializer.data)
     
@@ -67,14 +165,8 @@ class TopicViewSet(viewsets.ModelViewSet):
         try:
             peer = User.objects.get(id=peer_id)
             
-            # Check if they are peers
-            peer_relationship = PeerRelationship.objects.filter(
-                Q(requester=request.user, addressee=peer) | 
-                Q(requester=peer, addressee=request.user),
-                status='accepted'
-            ).first()
-            
-            if not peer_relationship:
+            # Check if they are peers against the cached peer set
+            if not authz.is_peer(request.user.id, peer.id):
                 return Response(
                     {'error': 'User is not in your peer list'}, 
                     status=status.HTTP_400_BAD_REQUEST
@@ -121,12 +213,16 @@ class TopicViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class CardViewSet(viewsets.ModelViewSet):
+class CardViewSet(ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = CardSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = CardCursorPagination
 
     def get_queryset(self):
-        return Card.objects.filter(topic__user=self.request.user)
+        queryset = Card.objects.filter(topic__user=self.request.user)
+        if self.action in ('list', 'retrieve'):
+            queryset = project_queryset(queryset, self.get_serializer())
+        return queryset
 
     def update(self, request, *args, **kwargs):
         return super().update(request, *args, **kwargs)
@@ -134,6 +230,18 @@ class CardViewSet(viewsets.ModelViewSet):
     def partial_update(self, request, *args, **kwargs):
         return super().partial_update(request, *args, **kwargs)
 
+    @extend_schema(
+        summary="Bulk card changes",
+        description="Create, update and delete many cards in one transaction",
+        request=CardBulkSerializer,
+    )
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """Apply mixed create/update/delete operations to many cards at once"""
+        serializer = CardBulkSerializer(data=request.data, context=self.get_serializer_context())
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.save())
+
 class CreateuserView(generics.CreateAPIView):
     queryset = User.objects.all()
     serializer_class = UserSerializer
@@ -155,20 +263,27 @@ class UserProfileView(generics.RetrieveAPIView):
     def get_object(self):
         return self.request.user
 
-class PeerViewSet(viewsets.ModelViewSet):
+class PeerViewSet(ConditionalReadMixin, CachedReadMixin, ValuesReadMixin, viewsets.ModelViewSet):
     serializer_class = PeerRelationshipSerializer
     permission_classes = [IsAuthenticated]
+    cache_scopes = [cache.PEERS]
     
     def get_queryset(self):
         """Get all peer relationships for the current user"""
         return PeerRelationship.objects.filter(
-            Q(requester=self.request.user) | Q(addressee=self.request.user),
-            status='accepted'
+            edges__user=self.request.user
+        ).select_related('requester', 'addressee')
+    
+    def create(self, request, *args, **kwargs):
+        """Relationships are only created by a peer request, which names the addressee"""
+        return Response(
+            {'error': 'Send peer requests to /api/peers/request/'},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED
         )
     
     @action(detail=False, methods=['post'])
     def search(self, request):
-        """Search for users by username"""
+        """Search for users by username, prefix matches first; accepts limit and offset for paging"""
         query = request.data.get('query', '').strip()
         if len(query) < 2:
             return Response(
@@ -176,19 +291,17 @@ class PeerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Exclude current user and existing peers
-        existing_peer_ids = PeerRelationship.objects.filter(
-            Q(requester=request.user) | Q(addressee=request.user)
-        ).values_list('requester_id', 'addressee_id')
-        
-        excluded_ids = set([request.user.id])
-        for req_id, addr_id in existing_peer_ids:
-            excluded_ids.add(req_id)
-            excluded_ids.add(addr_id)
+        try:
+            limit = int(request.data.get('limit', 10))
+            offset = int(request.data.get('offset', 0))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'limit and offset must be integers'}, 
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        users = User.objects.filter(
-            username__icontains=query
-        ).exclude(id__in=excluded_ids)[:10]
+        # Ranked, index-backed search that excludes the user and existing peers in SQL
+        users = search_users(request.user, query, limit=limit, offset=offset)
         
         serializer = UserPublicSerializer(users, many=True)
         return Response(serializer.data)
@@ -201,11 +314,12 @@ class PeerViewSet(viewsets.ModelViewSet):
         try:
             addressee = User.objects.get(id=addressee_id)
             
-            # Check if relationship already exists
-            existing = PeerRelationship.objects.filter(
-                Q(requester=request.user, addressee=addressee) |
-                Q(requester=addressee, addressee=request.user)
-            ).first()
+            # Check if relationship already exists, one (requester, addressee)
+            # unique index probe per direction
+            existing = (
+                PeerRelationship.objects.filter(requester=request.user, addressee=addressee).exists() or
+                PeerRelationship.objects.filter(requester=addressee, addressee=request.user).exists()
+            )
             
             if existing:
                 return Response(
@@ -274,7 +388,7 @@ class PeerViewSet(viewsets.ModelViewSet):
         pending_requests = PeerRelationship.objects.filter(
             addressee=request.user,
             status='pending'
-        )
+        ).select_related('requester', 'addressee')
         serializer = PeerRelationshipSerializer(pending_requests, many=True)
         return Response(serializer.data)
     
@@ -284,17 +398,26 @@ class PeerViewSet(viewsets.ModelViewSet):
             peer_relationship = self.get_object()
             
             # Determine the other user in the relationship
-            if peer_relationship.requester == request.user:
-                other_user = peer_relationship.addressee
+            if peer_relationship.requester_id == request.user.id:
+                other_user_id = peer_relationship.addressee_id
             else:
-                other_user = peer_relationship.requester
+                other_user_id = peer_relationship.requester_id
             
             # Deactivate all topic shares between these users
-            TopicShare.objects.filter(
-                Q(owner=request.user, peer=other_user) |
-                Q(owner=other_user, peer=request.user),
+            pair = [request.user.id, other_user_id]
+            shares = TopicShare.objects.filter(
+                owner_id__in=pair,
+                peer_id__in=pair,
                 is_active=True
-            ).update(is_active=False)
+            )
+            revoked = list(shares.values_list('id', 'topic_id', 'peer_id'))
+            shares.update(is_active=False, updated_at=timezone.now())
+            # The bulk update skips TopicShare signals, so drop both users' shared views here
+            cache.invalidate(pair, [cache.SHARED])
+            authz.invalidate_shared_topics(pair)
+            sync.record_deleted(sync.TOPIC, {topic_id: {peer_id} for _, topic_id, peer_id in revoked})
+            for share_id, topic_id, _ in revoked:
+                events.publish(pair, events.SHARE_REVOKED, share=share_id, topic=topic_id)
             
             # Delete the peer relationship
             peer_relationship.delete()
@@ -310,35 +433,49 @@ class PeerViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
-class SharedTopicViewSet(viewsets.ReadOnlyModelViewSet):
+class SharedTopicViewSet(ConditionalReadMixin, CachedReadMixin, ValuesReadMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = SharedTopicSerializer
     permission_classes = [IsAuthenticated]
+    cache_scopes = [cache.SHARED]
     
     def get_queryset(self):
         """Get topics shared with the current user"""
-        shared_topic_ids = TopicShare.objects.filter(
-            peer=self.request.user,
-            is_active=True
-        ).values_list('topic_id', flat=True)
+        shared_topic_ids = authz.shared_topic_ids(self.request.user.id)
         
-        return Topic.objects.filter(id__in=shared_topic_ids).select_related('user').prefetch_related('cards')
+        queryset = Topic.objects.filter(id__in=shared_topic_ids)
+        if self.action in ('list', 'retrieve'):
+            return project_queryset(queryset, self.get_serializer())
+        return queryset
     
     def retrieve(self, request, *args, **kwargs):
         """Get a specific shared topic and log access"""
-        topic = self.get_object()
+        # Check the share before the ETag, so a revoked peer never gets a 304
+        pk = str(kwargs.get('pk', ''))
+        if not (pk.isdigit() and authz.can_view_shared_topic(request.user.id, int(pk))):
+            raise NotFound('No Topic matches the given query.')
+        response = super().retrieve(request, *args, **kwargs)
         
-        # Log access
-        topic_share = TopicShare.objects.get(
-            topic=topic,
-            peer=request.user,
-            is_active=True
-        )
-        ShareAccess.objects.create(
-            topic_share=topic_share,
-            access_type='view_topic'
-        )
+        # Log access through the buffered access log so reads stay write-free
+        if response.status_code in (status.HTTP_200_OK, status.HTTP_304_NOT_MODIFIED):
+            access_log.record(int(pk), request.user.id, 'view_topic')
         
-        return super().retrieve(request, *args, **kwargs)
+        return response
+    
+    @extend_schema(
+        summary="Summarize shared topics",
+        description="Card, starred and completed counts and average progress of each shared topic, without the cards",
+        responses={200: SharedTopicSummarySerializer(many=True)}
+    )
+    @action(detail=False, methods=['get'])
+    def summary(self, request):
+        """Get per-topic card totals of the topics shared with me"""
+        return conditional_response(
+            request, cache.cached_response, 'shared-topic-summary', self.cache_scopes, self.build_summary
+        )
+
+    def build_summary(self, request):
+        topics = self.get_queryset().select_related('user')
+        return Response(SharedTopicSummarySerializer(topics, many=True).data)
     
     @action(detail=True, methods=['post'])
     def leave(self, request, pk=None):
@@ -362,3 +499,267 @@ class SharedTopicViewSet(viewsets.ReadOnlyModelViewSet):
                 status=status.HTTP_404_NOT_FOUND
             )
 
+
+@extend_schema(
+    summary="Get dashboard data",
+    description="Retrieve the user's topics, peers, pending peer requests and shared topics in a single response",
+)
+class DashboardView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return conditional_response(
+            request, cache.cached_response, 'dashboard', cache.ALL_SCOPES, self.build_response
+        )
+
+    def build_response(self, request):
+        """Return every collection the dashboard needs from a fixed number of queries"""
+        user = request.user
+
+        topics = Topic.objects.filter(user=user).prefetch_related('cards')
+        peers = PeerRelationship.objects.filter(
+            edges__user=user
+        ).select_related('requester', 'addressee')
+        pending_requests = PeerRelationship.objects.filter(
+            addressee=user,
+            status='pending'
+        ).select_related('requester', 'addressee')
+
+        shared_topic_ids = authz.shared_topic_ids(user.id)
+        shared_topics = Topic.objects.filter(
+            id__in=shared_topic_ids
+        ).select_related('user').prefetch_related('cards')
+
+        return Response({
+            'topics': serialize_many(TopicSerializer, topics),
+            'peers': serialize_many(PeerRelationshipSerializer, peers),
+            'requests': serialize_many(PeerRelationshipSerializer, pending_requests),
+            'shared': serialize_many(SharedTopicSerializer, shared_topics),
+        })
+
+
+@extend_schema(
+    summary="Export account",
+    description="Stream all of the user's topics and cards as NDJSON (gzip-compressed with ?gzip=1)",
+    parameters=[OpenApiParameter('gzip', OpenApiTypes.BOOL, description="Compress the stream with gzip")],
+    responses={200: OpenApiTypes.BINARY}
+)
+class ExportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        filename = f"trackreso-{request.user.username}.ndjson" + ('.gz' if compress else '')
+        response = StreamingHttpResponse(
+            transfer.export_stream(request.user, compress=compress),
+            content_type='application/gzip' if compress else 'application/x-ndjson'
+        )
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+@extend_schema(
+    summary="Import account data",
+    description="Load an NDJSON export (optionally gzip-compressed) into the user's account as new topics and cards",
+    request={'application/x-ndjson': OpenApiTypes.BINARY},
+    responses={201: OpenApiTypes.OBJECT}
+)
+class ImportView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        # Read the body line by line instead of through request.data
+        stream = request.stream
+        if stream is None:
+            return Response({'error': 'Empty import'}, status=status.HTTP_400_BAD_REQUEST)
+        if request.content_type in ('application/gzip', 'application/x-gzip') or request.headers.get('Content-Encoding') == 'gzip':
+            stream = gzip.GzipFile(fileobj=stream)
+
+        try:
+            counts = transfer.import_lines(request.user, stream)
+        except (transfer.TransferError, OSError, EOFError) as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(counts, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(
+    summary="Sync changes",
+    description="Return the topics, cards, topic shares and peer relationships created, updated or deleted "
+                "since a cursor from an earlier sync, and the cursor to send next. Without since, return "
+                "everything. A deleted topic's cards are deleted too.",
+    parameters=[OpenApiParameter('since', OpenApiTypes.STR, description="Cursor returned by the previous sync")],
+    responses={200: OpenApiTypes.OBJECT, 410: OpenApiResponse(description="Cursor expired, sync without one")}
+)
+class SyncView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            cursor, changed, deleted = sync.changes(request.user, request.query_params.get('since') or None)
+        except sync.CursorExpired as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_410_GONE)
+        except sync.SyncError as exc:
+            return Response({'error': str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'cursor': cursor,
+            'topics': serialize_many(SyncTopicSerializer, changed['topics']),
+            'cards': serialize_many(CardSerializer, changed['cards']),
+            'shares': serialize_many(SyncShareSerializer, changed['shares']),
+            'peers': serialize_many(
+                PeerRelationshipSerializer, changed['peers'].select_related('requester', 'addressee')
+            ),
+            'deleted': deleted,
+        })
+
+
+
+@extend_schema(
+    summary="Search cards",
+    description="Full-text search over the names, resources and notes of the cards in the user's own topics "
+                "and in topics shared with them, best matches first. Each result has an HTML snippet with the "
+                "matching words in <mark> tags; the last word of q also matches as a prefix.",
+    parameters=[
+        OpenApiParameter('q', OpenApiTypes.STR, description="Words to search for"),
+        OpenApiParameter('limit', OpenApiTypes.INT, description="Results per page (at most 50)"),
+        OpenApiParameter('offset', OpenApiTypes.INT, description="Results to skip"),
+    ],
+    responses={
+        200: OpenApiTypes.OBJECT,
+        501: OpenApiResponse(description="The database has no full-text index (not SQLite or PostgreSQL)"),
+    }
+)
+class CardSearchView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if len(query) < 2:
+            return Response(
+                {'error': 'Query must be at least 2 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            limit = int(request.query_params.get('limit', 20))
+            offset = int(request.query_params.get('offset', 0))
+        except (TypeError, ValueError):
+            return Response(
+                {'error': 'limit and offset must be integers'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results, more = search_cards(request.user, query, limit=limit, offset=offset)
+        return Response({
+            'results': results,
+            'next_offset': max(offset, 0) + len(results) if more else None,
+        })
+
+
+@extend_schema(
+    summary="Request metrics",
+    description="Per-view latency and SQL query histograms, SQL, app (view less SQL) and render time, "
+                "response counts and response cache hits of this worker process, in the Prometheus text format. "
+                "Staff only.",
+    responses={200: OpenApiTypes.STR}
+)
+class MetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(metrics.registry.export(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@extend_schema(
+    summary="List request profiles",
+    description="Stored profiles of requests that staff users sent with an X-Profile: 1 header or ?profile=1, "
+                "newest first. Staff only.",
+    responses={200: RequestProfileSerializer(many=True)}
+)
+class RequestProfileListView(generics.ListAPIView):
+    serializer_class = RequestProfileSerializer
+    permission_classes = [IsAdminUser]
+
+    def get_queryset(self):
+        return RequestProfile.objects.select_related('user').defer('stats')
+
+
+@extend_schema(
+    summary="Download a request profile",
+    description="The profile's cProfile stats, as written by dump_stats(): open them with pstats or snakeviz. "
+                "Staff only.",
+    responses={200: OpenApiTypes.BINARY}
+)
+class RequestProfileDownloadView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        profile = RequestProfile.objects.filter(pk=pk).first()
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        response = HttpResponse(profiling.raw_stats(profile), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="profile-{profile.pk}.prof"'
+        return response
+
+
+@extend_schema(
+    summary="Request profile report",
+    description="pstats' text report of a stored profile. Staff only.",
+    parameters=[
+        OpenApiParameter('sort', OpenApiTypes.STR, description="pstats sort key (default: cumulative)"),
+        OpenApiParameter('limit', OpenApiTypes.INT, description="Functions to list (default: 50)"),
+    ],
+    responses={200: OpenApiTypes.STR}
+)
+class RequestProfileReportView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, pk):
+        profile = RequestProfile.objects.filter(pk=pk).first()
+        if profile is None:
+            return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+        sort = request.query_params.get('sort', 'cumulative')
+        try:
+            limit = int(request.query_params.get('limit', 50))
+            text = profiling.report(profile, sort=sort, limit=limit)
+        except (TypeError, ValueError, KeyError):
+            return Response({'error': 'Invalid sort or limit'}, status=status.HTTP_400_BAD_REQUEST)
+        return HttpResponse(text, content_type='text/plain; charset=utf-8')
+
+async def _event_messages(user_id):
+    subscription = events.get_broker().subscribe(user_id)
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT', 15)
+    try:
+        # Subscribed: anything that changes from here on is pushed, so clients
+        # catch up with /api/sync/ when they see "ready"
+        yield b'retry: 3000\n\n' + events.format_event({'type': 'ready'})
+        while True:
+            event = await subscription.get(heartbeat)
+            yield b': keep-alive\n\n' if event is None else events.format_event(event)
+    finally:
+        await subscription.close()
+
+
+async def event_stream(request):
+    """
+    Server-Sent Events for the signed-in user: peer requests, shares being
+    activated or revoked, and changes to their own and shared topics.
+    Needs an ASGI server; each open stream only waits on its event queue.
+    Under WSGI the stream would be drained synchronously and pin a worker
+    without ever sending a byte, so it is refused there.
+    """
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Method not allowed'}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': 'Event streams need the ASGI server (my_django_backend.asgi:application)'},
+            status=status.HTTP_501_NOT_IMPLEMENTED
+        )
+    user = await authenticate(request, allow_query_token=True)
+    if user is None:
+        return JsonResponse({'error': 'Authentication credentials were not provided'}, status=status.HTTP_401_UNAUTHORIZED)
+    return StreamingHttpResponse(
+        _event_messages(user.id),
+        content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -0,0 +1,19 @@
+# gunicorn loads this file from the working directory (see Procfile).
+#
+# Each worker buffers shared-topic access events in memory (api/access_log.py).
+# Flush them whenever a worker stops: gracefully, on restart after
+# max_requests, or when the arbiter aborts it for exceeding the timeout. Only
+# a SIGKILL (or the OOM killer) loses the buffer; see AccessLogBuffer.
+
+
+def _flush_access_log():
+    from api import access_log
+    access_log.flush()
+
+
+def worker_exit(server, worker):
+    _flush_access_log()
+
+
+def worker_abort(worker):
+    _flush_access_log()
@@ -45,12 +45,27 @@ REST_FRAMEWORK = {
         'rest_framework.throttling.AnonRateThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
-        'user': '1000/hour',  # Allow 1000 requests per hour per user (much more reasonable)
-        'anon': '100/hour',   # Allow 100 requests per hour for anonymous users
+        'user': config('THROTTLE_USER_RATE', default='1000/hour'),  # Allow 1000 requests per hour per user (much more reasonable)
+        'anon': config('THROTTLE_ANON_RATE', default='100/hour'),   # Allow 100 requests per hour for anonymous users
     },
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    # orjson produces the same bytes as DRF's JSONRenderer/JSONParser, faster
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# MessagePack, negotiated with Accept / Content-Type: application/msgpack
+if config('API_MSGPACK', default=True, cast=bool):
+    REST_FRAMEWORK['DEFAULT_RENDERER_CLASSES'].insert(1, 'api.renderers.MessagePackRenderer')
+    REST_FRAMEWORK['DEFAULT_PARSER_CLASSES'].insert(1, 'api.parsers.MessagePackParser')
+
 # DRF Spectacular settings for API documentation
 SPECTACULAR_SETTINGS = {
     'TITLE': 'TrackReso API',
@@ -96,12 +111,15 @@ MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',  # FIRST: CORS should be on top
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',  # WhiteNoise comes just after SecurityMiddleware
+    'api.metrics.RequestMetricsMiddleware',  # After WhiteNoise, so static files are not timed
+    'api.slow_queries.SlowQueryMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.profiling.ProfilingMiddleware',  # Last, around the view; only for flagged staff requests
 ]
 
 
@@ -153,6 +171,93 @@ else:
 
 
 
+# Caching
+# The 'responses' cache holds per-user API responses (see api/cache.py).
+# Point REDIS_URL at a Redis server to share it between workers; with several
+# workers and no Redis, responses are not cached at all. Entries only
+# expire after RESPONSE_CACHE_TIMEOUT there, so the server must bound the size
+# itself: set maxmemory and maxmemory-policy allkeys-lru, which
+# `manage.py check --deploy` verifies (api/checks.py).
+REDIS_URL = config('REDIS_URL', default='')
+
+if REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'responses',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        'responses': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'responses',
+            'OPTIONS': {
+                'MAX_ENTRIES': config('RESPONSE_CACHE_MAX_ENTRIES', default=5000, cast=int),
+            },
+        },
+    }
+
+# Fan-out of /api/events/ pushes (see api/events.py). The in-process broker
+# only reaches streams served by the same worker; Redis reaches all of them.
+EVENT_BROKER = config(
+    'EVENT_BROKER',
+    default='api.events.RedisBroker' if REDIS_URL else 'api.events.InProcessBroker'
+)
+EVENTS_HEARTBEAT = config('EVENTS_HEARTBEAT', default=15, cast=int)  # seconds between keep-alive comments
+EVENTS_QUEUE_SIZE = config('EVENTS_QUEUE_SIZE', default=100, cast=int)  # per stream, then a resync event
+
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE_TIMEOUT = config('RESPONSE_CACHE_TIMEOUT', default=300, cast=int)  # seconds
+
+# Worker processes of the app server. gunicorn reads the same variable, so set
+# it rather than --workers: process-local caches are only trusted with one
+# worker (api.cache.is_shared).
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+
+# Cached peer and shared-topic id sets used for permission checks (see api/authz.py).
+# Without REDIS_URL and with several workers they are not cached at all, and
+# `manage.py check --deploy` fails (api.E001).
+AUTHZ_CACHE_ALIAS = 'default'
+AUTHZ_CACHE_TIMEOUT = config('AUTHZ_CACHE_TIMEOUT', default=600, cast=int)  # seconds
+
+
+# Shared-topic access log buffering (see api/access_log.py)
+ACCESS_LOG_BATCH_SIZE = config('ACCESS_LOG_BATCH_SIZE', default=100, cast=int)
+ACCESS_LOG_FLUSH_INTERVAL = config('ACCESS_LOG_FLUSH_INTERVAL', default=10, cast=int)  # seconds
+ACCESS_LOG_MAX_BUFFER = config('ACCESS_LOG_MAX_BUFFER', default=1000, cast=int)
+
+# Delta sync cursors (see api/sync.py); clients with older cursors sync from scratch.
+# A write is only guaranteed to be synced if it commits within the overlap and
+# the app servers' clocks agree to well within it (keep them on NTP).
+SYNC_CURSOR_OVERLAP = config('SYNC_CURSOR_OVERLAP', default=10, cast=int)  # seconds
+SYNC_TOMBSTONE_DAYS = config('SYNC_TOMBSTONE_DAYS', default=30, cast=int)
+
+# Request metrics (see api/metrics.py): the fraction of requests timed and
+# counted for /api/metrics/ and the Server-Timing header; 0 turns it off
+METRICS_SAMPLE_RATE = config('METRICS_SAMPLE_RATE', default=1.0, cast=float)
+
+# Slow query capture (see api/slow_queries.py); a threshold of 0 turns it off.
+# EXPLAIN ANALYZE runs the query a second time, so it is opt-in.
+SLOW_QUERY_THRESHOLD_MS = config('SLOW_QUERY_THRESHOLD_MS', default=200, cast=float)
+SLOW_QUERY_EXPLAIN_ANALYZE = config('SLOW_QUERY_EXPLAIN_ANALYZE', default=False, cast=bool)
+SLOW_QUERY_EXPLAIN_INTERVAL = config('SLOW_QUERY_EXPLAIN_INTERVAL', default=60, cast=int)  # seconds between plans of one query
+SLOW_QUERY_MAX_ROWS = config('SLOW_QUERY_MAX_ROWS', default=1000, cast=int)
+
+# Staff request profiles (see api/profiling.py): kept for this many days, and
+# at most this many in total
+PROFILE_RETENTION_DAYS = config('PROFILE_RETENTION_DAYS', default=7, cast=int)
+PROFILE_MAX_ROWS = config('PROFILE_MAX_ROWS', default=50, cast=int)
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 